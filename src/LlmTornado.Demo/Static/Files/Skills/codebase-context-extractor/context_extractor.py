@@ -7,15 +7,40 @@ A comprehensive tool for extracting and analyzing context from large codebases.
 import os
 import sys
 import argparse
+import heapq
+import io
 import json
 import yaml
+from array import array
 from pathlib import Path
-from typing import Dict, List, Set, Optional, Any, Tuple
-from collections import defaultdict
-from dataclasses import dataclass, asdict
+from typing import BinaryIO, Dict, List, Set, Optional, Any, Tuple, Iterable, Iterator, TextIO
+from collections import defaultdict, deque
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, asdict, fields, is_dataclass, replace
 import re
 import ast
-import fnmatch
+import bisect
+import codecs
+import inspect
+import pickle
+import random
+import signal
+import threading
+import tokenize
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import islice
+
+from utils import (
+    ArchiveReader, CacheManager, CFamilyScanner, DirectoryWalker, ExcludeMatcher, FileMetrics, GitObjectReader,
+    MetricsCalculator, ModuleIndex, NearDuplicateIndex, PythonComplexityVisitor, ProgressReporter, SegmentStore,
+    WorkspaceModuleIndex, bytes_digest, content_digest, is_archive, iter_file_tree, similarity_signature,
+)
+
+try:
+    import orjson
+except ImportError:  # optional fast JSON backend
+    orjson = None
 
 
 @dataclass
@@ -25,9 +50,12 @@ class CodeEntity:
     type: str  # 'function', 'class', 'method', 'variable', 'module'
     file_path: str
     line_number: int
-    docstring: Optional[str] = None
+    docstring: Optional[str] = None  # summary line; see docstring_span for the full text
     signature: Optional[str] = None
     dependencies: List[str] = None
+    complexity: Optional[int] = None
+    docstring_span: Optional[List[int]] = None  # [start, end) byte range in file_path
+    source_span: Optional[List[int]] = None
     
     def __post_init__(self):
         if self.dependencies is None:
@@ -43,6 +71,9 @@ class FileContext:
     imports: List[str]
     entities: List[CodeEntity]
     summary: Optional[str] = None
+    metrics: Optional[FileMetrics] = None
+    degraded: Optional[str] = None  # reason analysis was skipped, e.g. 'size' or 'timeout'
+    duplicate_of: Optional[str] = None  # path of the identical file that was analyzed instead
     
     def __post_init__(self):
         if self.imports is None:
@@ -51,6 +82,15 @@ class FileContext:
             self.entities = []
 
 
+@dataclass
+class DuplicateGroup:
+    """Files with identical ('exact') or near-identical ('near') content"""
+    kind: str
+    representative: str
+    duplicates: List[str]
+    similarity: float
+
+
 @dataclass
 class CodebaseContext:
     """Represents complete codebase context"""
@@ -61,6 +101,7 @@ class CodebaseContext:
     files: List[FileContext]
     dependency_graph: Dict[str, List[str]]
     entry_points: List[str]
+    duplicate_groups: List[DuplicateGroup] = None
     
     def __post_init__(self):
         if self.files is None:
@@ -69,17 +110,353 @@ class CodebaseContext:
             self.dependency_graph = {}
         if self.entry_points is None:
             self.entry_points = []
+        if self.duplicate_groups is None:
+            self.duplicate_groups = []
+
+
+class ImportGraph(Mapping):
+    """
+    Dependency graph read from stored file contexts instead of copied.
+    
+    Maps the path of each file with imports to its imports, in file order,
+    like the ``dependency_graph`` of an in-memory context. Every lookup
+    scans ``files``; ``items`` does so once for the whole graph.
+    """
+    
+    def __init__(self, files: Sequence['FileContext']):
+        self.files = files
+    
+    def __getitem__(self, path: str) -> List[str]:
+        for file_context in self.files:
+            if file_context.path == path and file_context.imports:
+                return list(file_context.imports)
+        raise KeyError(path)
+    
+    def __iter__(self) -> Iterator[str]:
+        return (file_context.path for file_context in self.files if file_context.imports)
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+    
+    def items(self) -> Iterator[Tuple[str, List[str]]]:
+        return ((file_context.path, list(file_context.imports))
+                for file_context in self.files if file_context.imports)
+
+
+@dataclass
+class DiskBackedCodebaseContext(CodebaseContext):
+    """
+    CodebaseContext whose ``files`` live in an on-disk ``SegmentStore``.
+    
+    Per-file contexts are loaded on demand, so iteration and indexing work
+    as for a list while resident memory stays bounded by the store's LRU.
+    Duplicate groups are kept in a second store under ``DUPLICATES_DIR``
+    and the dependency graph is an ``ImportGraph`` over the file store.
+    """
+    
+    METADATA_FILE = 'context.pickle'
+    DUPLICATES_DIR = 'duplicates'
+    STORED_FIELDS = ('files', 'dependency_graph', 'duplicate_groups')
+    
+    def save(self) -> None:
+        """Flush the stores and persist the remaining fields next to them"""
+        self.files.flush()
+        self.duplicate_groups.flush()
+        metadata = {f.name: getattr(self, f.name) for f in fields(self)
+                    if f.name not in self.STORED_FIELDS}
+        with open(self.files.directory / self.METADATA_FILE, 'wb') as f:
+            pickle.dump(metadata, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def close(self) -> None:
+        """Save the context and release the stores' file handles"""
+        self.save()
+        self.files.close()
+        self.duplicate_groups.close()
+    
+    @classmethod
+    def create(cls, directory: str) -> Tuple[SegmentStore, SegmentStore]:
+        """Empty file and duplicate group stores for a new context in directory"""
+        return SegmentStore(directory), SegmentStore(str(Path(directory) / cls.DUPLICATES_DIR))
+    
+    @classmethod
+    def open(cls, directory: str) -> 'DiskBackedCodebaseContext':
+        """Reopen a context saved by ``save`` or ``close``"""
+        with open(Path(directory) / cls.METADATA_FILE, 'rb') as f:
+            metadata = pickle.load(f)
+        files = SegmentStore.open(directory)
+        return cls(files=files, dependency_graph=ImportGraph(files),
+                   duplicate_groups=SegmentStore.open(str(Path(directory) / cls.DUPLICATES_DIR)),
+                   **metadata)
+
+
+@dataclass
+class Estimate:
+    """Point estimate with a confidence interval"""
+    value: float
+    low: float
+    high: float
+    confidence: float = 0.95
+
+
+@dataclass
+class SummaryContext(CodebaseContext):
+    """Codebase context estimated from a stratified sample of files"""
+    sampled_files: int = 0
+    total_bytes: int = 0
+    line_estimate: Optional[Estimate] = None
+    entity_estimate: Optional[Estimate] = None
+
+
+@dataclass
+class RootSummary:
+    """Per-root statistics of a workspace"""
+    name: str
+    path: str
+    total_files: int = 0
+    total_lines: int = 0
+    languages: Dict[str, int] = None
+    
+    def __post_init__(self):
+        if self.languages is None:
+            self.languages = {}
+
+
+@dataclass
+class WorkspaceContext(CodebaseContext):
+    """Unified context of several roots; file paths are prefixed with the root name"""
+    roots: List[RootSummary] = None
+    
+    def __post_init__(self):
+        super().__post_init__()
+        if self.roots is None:
+            self.roots = []
+
+
+@dataclass
+class QueryResult:
+    """An entity matched by a query, with the file it belongs to"""
+    file: str
+    language: str
+    entity: CodeEntity
+
+
+@dataclass
+class QueryPage:
+    """One page of query results; pass ``next_cursor`` back to continue"""
+    results: List[QueryResult]
+    next_cursor: Optional[str] = None
+
+
+def _estimate_total(strata: List[Tuple[List[Tuple[int, int]], int, int]], known: float = 0,
+                    z: float = 1.96) -> Estimate:
+    """
+    Combined ratio estimate of a population total from stratified samples.
+    
+    Args:
+        strata: (sample of (bytes, value) pairs, population bytes, population size)
+            for each stratum
+        known: Exactly counted contribution outside the strata
+        z: Normal quantile for the interval (1.96 for 95%)
+    """
+    total = float(known)
+    variance = 0.0
+    pending = []  # strata that need the pooled residual variance
+    pooled_sq = pooled_bytes = 0.0
+    
+    for sample, population_bytes, population_size in strata:
+        n = len(sample)
+        if not n:
+            continue
+        sample_bytes = sum(x for x, _ in sample)
+        sample_value = sum(y for _, y in sample)
+        if sample_bytes:
+            ratio = sample_value / sample_bytes
+            total += ratio * population_bytes
+        else:
+            ratio = 0.0
+            total += sample_value / n * population_size
+        if n >= population_size:
+            continue
+        residuals = [y - ratio * x for x, y in sample] if sample_bytes else \
+            [y - sample_value / n for _, y in sample]
+        squares = sum(r * r for r in residuals)
+        pooled_sq += squares
+        pooled_bytes += sample_bytes
+        if n >= 2:
+            s2 = squares / (n - 1)
+            variance += population_size ** 2 * (1 - n / population_size) * s2 / n
+        else:
+            pending.append((population_bytes, population_size))
+    
+    # Single-file strata borrow the residual variance per byte of the whole sample,
+    # scaled to the stratum's mean file size: N^2 (1 - 1/N) * s2 with s2 ~ k * bytes / N
+    if pooled_bytes:
+        per_byte = pooled_sq / pooled_bytes
+        for population_bytes, population_size in pending:
+            variance += (population_size - 1) * population_bytes * per_byte
+    
+    margin = z * variance ** 0.5
+    return Estimate(value=round(total, 1), low=round(max(known, total - margin), 1),
+                    high=round(total + margin, 1))
+
+
+@dataclass
+class AnalysisBudget:
+    """Per-file limits applied while analyzing (None or 0 disables a limit)"""
+    max_file_bytes: Optional[int] = 2 * 1024 * 1024
+    timeout_seconds: Optional[float] = 10.0
+
+
+class AnalysisTimeout(Exception):
+    """Raised when analyzing a single file exceeds its time budget"""
+
+
+@contextmanager
+def _time_budget(seconds: Optional[float]):
+    """
+    Interrupt the enclosed block with AnalysisTimeout after `seconds`.
+    
+    Uses SIGALRM, which also interrupts long-running regex matches. Where
+    that is unavailable (Windows, non-main threads) the block runs unbounded.
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or \
+            threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def _expire(signum, frame):
+        raise AnalysisTimeout()
+    
+    previous = signal.signal(signal.SIGALRM, _expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# Extractor used by the analysis tasks of a worker process, set once per
+# process by the pool initializer
+_worker_extractor = None
+
+
+def _init_analysis_worker(extractor: 'CodebaseExtractor') -> None:
+    """Pool initializer: keep the extractor for the tasks of this worker"""
+    global _worker_extractor
+    _worker_extractor = extractor
+
+
+def _analyze_batch(task: str, batch: List[Tuple[Path, Optional[bytes], str]]) -> List[Any]:
+    """Run an extractor method over (file_path, data, relative_path) items in a worker"""
+    method = getattr(_worker_extractor, task)
+    return [method(file_path, data, relative_path) for file_path, data, relative_path in batch]
+
+
+def count_lines(file_path: Path, chunk_size: int = 1 << 20) -> int:
+    """Count lines by scanning raw bytes, without decoding the file"""
+    try:
+        with open(file_path, 'rb') as f:
+            return count_stream_lines(f, chunk_size)
+    except OSError as e:
+        print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        return 0
+
+
+def count_stream_lines(stream: BinaryIO, chunk_size: int = 1 << 20) -> int:
+    """Count lines of a binary stream chunk by chunk"""
+    lines = 0
+    last = b'\n'
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        lines += chunk.count(b'\n')
+        last = chunk[-1:]
+    return lines if last == b'\n' else lines + 1
+
+
+DOCSTRING_SUMMARY_CHARS = 120
+
+# Line endings recognized by the Python tokenizer
+_LINE_BREAK = re.compile(rb'\r\n?|\n')
+
+
+def summarize_docstring(docstring: Optional[str]) -> Optional[str]:
+    """First non-empty line of a docstring, truncated to DOCSTRING_SUMMARY_CHARS"""
+    if not docstring:
+        return docstring
+    first_line = next((line.strip() for line in docstring.splitlines() if line.strip()), '')
+    if len(first_line) > DOCSTRING_SUMMARY_CHARS:
+        first_line = first_line[:DOCSTRING_SUMMARY_CHARS - 3].rstrip() + '...'
+    return first_line
+
+
+def source_encoding(readline) -> str:
+    """Encoding of source from its BOM or coding declaration (PEP 263)
+    
+    Sources without one, or with an invalid one, are UTF-8.
+    """
+    try:
+        encoding, _ = tokenize.detect_encoding(readline)
+    except SyntaxError:
+        return 'utf-8'
+    return encoding
+
+
+def read_span(file_path: str, span: Optional[List[int]], data: Optional[bytes] = None) -> Optional[str]:
+    """Read exactly the bytes of a [start, end) span from a file, or from its contents in ``data``
+    
+    The bytes are decoded with the file's declared source encoding.
+    """
+    if not span:
+        return None
+    start, end = span
+    if data is not None:
+        encoding = source_encoding(io.BytesIO(data).readline)
+        return data[start:end].decode(encoding, errors='ignore')
+    try:
+        with open(file_path, 'rb') as f:
+            encoding = source_encoding(f.readline)
+            f.seek(start)
+            return f.read(end - start).decode(encoding, errors='ignore')
+    except OSError as e:
+        print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        return None
+
+
+def load_docstring(entity: CodeEntity, data: Optional[bytes] = None) -> Optional[str]:
+    """Full docstring of an entity, read from its source file (or ``data``) on demand"""
+    literal = read_span(entity.file_path, entity.docstring_span, data)
+    if literal is None:
+        return entity.docstring
+    try:
+        value = ast.literal_eval(literal.strip())
+    except (ValueError, SyntaxError):
+        return entity.docstring
+    return inspect.cleandoc(value) if isinstance(value, str) else entity.docstring
+
+
+def load_source(entity: CodeEntity, data: Optional[bytes] = None) -> Optional[str]:
+    """Source of an entity's definition, read from its source file (or ``data``) on demand"""
+    return read_span(entity.file_path, entity.source_span, data)
 
 
 class LanguageAnalyzer:
-    """Base class for language-specific analysis"""
+    """Base class for language-specific analysis
+    
+    ``data`` supplies the raw file contents directly (e.g. an archive
+    member) instead of reading ``file_path``.
+    """
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, data: Optional[bytes] = None):
         self.file_path = file_path
+        self.data = data
         self.content = self._read_file()
     
     def _read_file(self) -> str:
         """Read file content"""
+        if self.data is not None:
+            # Same decoding and newline translation as reading in text mode
+            text = self.data.decode('utf-8', errors='ignore')
+            return text.replace('\r\n', '\n').replace('\r', '\n')
         try:
             with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 return f.read()
@@ -98,25 +475,87 @@ class LanguageAnalyzer:
     def get_line_count(self) -> int:
         """Get line count"""
         return len(self.content.splitlines())
+    
+    def extract_metrics(self, entities: List[CodeEntity]) -> FileMetrics:
+        """Compute file metrics and per-function complexity in one token pass"""
+        functions = [e for e in entities if e.type in ('function', 'method')]
+        complexity, comment_lines, per_function = CFamilyScanner(self.content).scan(
+            e.line_number for e in functions)
+        for entity in functions:
+            entity.complexity = per_function.get(entity.line_number)
+        return MetricsCalculator.build_metrics(self.get_line_count(), complexity, comment_lines)
 
 
 class PythonAnalyzer(LanguageAnalyzer):
-    """Python code analyzer"""
+    """Python code analyzer
+    
+    The file is read once as bytes: the decoded text is parsed, and the raw
+    bytes give the byte offsets recorded in docstring and source spans.
+    """
+    
+    def _read_file(self) -> str:
+        """Read the file as bytes and decode it like the interpreter does
+        
+        The encoding comes from a BOM or coding declaration, falling back to
+        UTF-8 with undecodable bytes dropped.
+        """
+        raw = self.data
+        if raw is None:
+            try:
+                with open(self.file_path, 'rb') as f:
+                    raw = f.read()
+            except OSError as e:
+                print(f"Error reading {self.file_path}: {e}", file=sys.stderr)
+                raw = b''
+        self._raw = raw
+        self._encoding = source_encoding(io.BytesIO(raw).readline)
+        self._errors = 'strict'
+        try:
+            text = raw.decode(self._encoding)
+        except (LookupError, UnicodeDecodeError):
+            self._encoding, self._errors = 'utf-8', 'ignore'
+            text = raw.decode('utf-8', errors='ignore')
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+    
+    def _parse(self) -> Optional[ast.Module]:
+        """Parse the file once and share the tree between extractors"""
+        if not hasattr(self, '_tree'):
+            try:
+                self._tree = ast.parse(self.content)
+                self._syntax_error = None
+            except SyntaxError as e:
+                self._tree = None
+                self._syntax_error = e
+        return self._tree
+    
+    def _complexity(self) -> Optional[PythonComplexityVisitor]:
+        """Run the complexity visitor once over the shared tree"""
+        if not hasattr(self, '_visitor'):
+            tree = self._parse()
+            self._visitor = None
+            if tree is not None:
+                self._visitor = PythonComplexityVisitor()
+                self._visitor.visit(tree)
+        return self._visitor
     
     def extract_imports(self) -> List[str]:
         """Extract Python imports"""
         imports = []
-        try:
-            tree = ast.parse(self.content)
+        tree = self._parse()
+        if tree is not None:
             for node in ast.walk(tree):
                 if isinstance(node, ast.Import):
                     for alias in node.names:
                         imports.append(alias.name)
                 elif isinstance(node, ast.ImportFrom):
-                    module = node.module or ''
+                    # Keep the leading dots of relative imports so they can be resolved
+                    module = '.' * (node.level or 0) + (node.module or '')
                     for alias in node.names:
-                        imports.append(f"{module}.{alias.name}" if module else alias.name)
-        except SyntaxError:
+                        if node.module:
+                            imports.append(f"{module}.{alias.name}")
+                        else:
+                            imports.append(f"{module}{alias.name}")
+        else:
             # Fallback to regex if AST parsing fails
             import_pattern = r'(?:from\s+(\S+)\s+)?import\s+(.+)'
             for match in re.finditer(import_pattern, self.content):
@@ -125,48 +564,116 @@ class PythonAnalyzer(LanguageAnalyzer):
                 imports.extend([imp.strip().split()[0] for imp in match.group(2).split(',')])
         return imports
     
+    def _line_offsets(self) -> List[int]:
+        """Byte offset of the start of each line in the file's bytes
+        
+        Lines end at CRLF, CR or LF, as for the tokenizer, so the offsets
+        agree with ast line numbers whatever the file's line endings. The
+        first line starts after a UTF-8 BOM.
+        """
+        if not hasattr(self, '_offsets'):
+            self._offsets = [len(codecs.BOM_UTF8) if self._raw.startswith(codecs.BOM_UTF8) else 0]
+            self._offsets.extend(match.end() for match in _LINE_BREAK.finditer(self._raw))
+        return self._offsets
+    
+    def _byte_column(self, lineno: int, col_offset: int) -> int:
+        """File byte offset within a line of an ast column
+        
+        ast columns count UTF-8 bytes of the decoded line, which differ from
+        the file's bytes in other encodings or where bytes were dropped.
+        """
+        offsets = self._line_offsets()
+        line = self._raw[offsets[lineno - 1]:offsets[lineno] if lineno < len(offsets) else None]
+        encoding = 'utf-8' if self._encoding == 'utf-8-sig' else self._encoding
+        if line.isascii() or (encoding == 'utf-8' and self._errors == 'strict'):
+            return col_offset
+        
+        text = line.decode(encoding, errors=self._errors)
+        chars = len(text.encode('utf-8')[:col_offset].decode('utf-8', errors='ignore'))
+        decoder = codecs.getincrementaldecoder(encoding)(errors=self._errors)
+        decoded = 0
+        for position in range(len(line)):
+            if decoded >= chars:
+                return position
+            decoded += len(decoder.decode(line[position:position + 1]))
+        return len(line)
+    
+    def _span(self, lineno: int, col_offset: int, node: ast.AST) -> Optional[List[int]]:
+        """Byte range from a line/column position to the end of a node"""
+        offsets = self._line_offsets()
+        end_lineno = getattr(node, 'end_lineno', None)
+        if end_lineno is None or end_lineno > len(offsets):
+            return None
+        return [offsets[lineno - 1] + self._byte_column(lineno, col_offset),
+                offsets[end_lineno - 1] + self._byte_column(end_lineno, node.end_col_offset)]
+    
+    def _documentation(self, node: ast.AST) -> Dict[str, Any]:
+        """Docstring summary plus byte ranges for loading the full text later"""
+        docstring = ast.get_docstring(node, clean=False)
+        expr = node.body[0]
+        # Decorators share the definition's indentation; include them in the source
+        first_line = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        return {
+            'docstring': summarize_docstring(inspect.cleandoc(docstring)) if docstring else None,
+            'docstring_span': self._span(expr.lineno, expr.col_offset, expr) if docstring else None,
+            'source_span': self._span(first_line, node.col_offset, node),
+        }
+    
     def extract_entities(self) -> List[CodeEntity]:
         """Extract Python entities (classes, functions, methods)"""
         entities = []
-        try:
-            tree = ast.parse(self.content)
-            
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    entities.append(CodeEntity(
-                        name=node.name,
-                        type='function',
-                        file_path=self.file_path,
-                        line_number=node.lineno,
-                        docstring=ast.get_docstring(node),
-                        signature=self._get_function_signature(node)
-                    ))
-                elif isinstance(node, ast.ClassDef):
-                    entities.append(CodeEntity(
-                        name=node.name,
-                        type='class',
-                        file_path=self.file_path,
-                        line_number=node.lineno,
-                        docstring=ast.get_docstring(node),
-                        signature=self._get_class_signature(node)
-                    ))
-                    
-                    # Extract methods
-                    for item in node.body:
-                        if isinstance(item, ast.FunctionDef):
-                            entities.append(CodeEntity(
-                                name=f"{node.name}.{item.name}",
-                                type='method',
-                                file_path=self.file_path,
-                                line_number=item.lineno,
-                                docstring=ast.get_docstring(item),
-                                signature=self._get_function_signature(item)
-                            ))
-        except SyntaxError as e:
-            print(f"Syntax error in {self.file_path}: {e}", file=sys.stderr)
+        tree = self._parse()
+        if tree is None:
+            print(f"Syntax error in {self.file_path}: {self._syntax_error}", file=sys.stderr)
+            return entities
+        
+        complexity = self._complexity().functions
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef):
+                entities.append(CodeEntity(
+                    name=node.name,
+                    type='function',
+                    file_path=self.file_path,
+                    line_number=node.lineno,
+                    signature=self._get_function_signature(node),
+                    complexity=complexity.get(node),
+                    **self._documentation(node)
+                ))
+            elif isinstance(node, ast.ClassDef):
+                entities.append(CodeEntity(
+                    name=node.name,
+                    type='class',
+                    file_path=self.file_path,
+                    line_number=node.lineno,
+                    signature=self._get_class_signature(node),
+                    **self._documentation(node)
+                ))
+                
+                # Extract methods
+                for item in node.body:
+                    if isinstance(item, ast.FunctionDef):
+                        entities.append(CodeEntity(
+                            name=f"{node.name}.{item.name}",
+                            type='method',
+                            file_path=self.file_path,
+                            line_number=item.lineno,
+                            signature=self._get_function_signature(item),
+                            complexity=complexity.get(item),
+                            **self._documentation(item)
+                        ))
         
         return entities
     
+    def extract_metrics(self, entities: List[CodeEntity]) -> FileMetrics:
+        """Compute file metrics from the already-parsed AST"""
+        visitor = self._complexity()
+        if visitor is None:
+            return super().extract_metrics(entities)
+        
+        comment_lines = sum(1 for line in self.content.splitlines() if line.lstrip().startswith('#'))
+        return MetricsCalculator.build_metrics(
+            self.get_line_count(), visitor.total, comment_lines + visitor.docstring_lines)
+    
     def _get_function_signature(self, node: ast.FunctionDef) -> str:
         """Get function signature as string"""
         args = []
@@ -302,6 +809,123 @@ class GenericAnalyzer(LanguageAnalyzer):
         return entities
 
 
+class ContextIndex:
+    """
+    Inverted index over the entities of a CodebaseContext.
+    
+    Entities are numbered in file order and kept as (file, entity) index
+    pairs. Posting lists by language, entity type and lower-cased name let
+    queries start from the most selective filter and check the others
+    against compact per-entity arrays, so entities are only loaded from
+    ``context.files`` once they match.
+    """
+    
+    GLOB_CHARS = frozenset('*?[')
+    
+    def __init__(self, context: CodebaseContext):
+        self.context = context
+        self._file_of = array('I')
+        self._entity_of = array('I')
+        self._type_of = array('B')
+        self._file_starts = array('I')
+        self._paths: List[str] = []
+        self._file_languages: List[str] = []
+        self._types: List[str] = []
+        self._by_language: Dict[str, array] = defaultdict(lambda: array('I'))
+        self._by_type: Dict[str, array] = defaultdict(lambda: array('I'))
+        self._by_name: Dict[str, array] = defaultdict(lambda: array('I'))
+        
+        type_codes: Dict[str, int] = {}
+        for file_index, fc in enumerate(context.files):
+            self._file_starts.append(len(self._file_of))
+            self._paths.append(fc.path)
+            self._file_languages.append(fc.language)
+            for entity_index, entity in enumerate(fc.entities):
+                entity_id = len(self._file_of)
+                if entity.type not in type_codes:
+                    type_codes[entity.type] = len(self._types)
+                    self._types.append(entity.type)
+                self._file_of.append(file_index)
+                self._entity_of.append(entity_index)
+                self._type_of.append(type_codes[entity.type])
+                self._by_language[fc.language].append(entity_id)
+                self._by_type[entity.type].append(entity_id)
+                self._by_name[entity.name.lower()].append(entity_id)
+        self._file_starts.append(len(self._file_of))
+    
+    def __len__(self) -> int:
+        return len(self._file_of)
+    
+    def _name_postings(self, name: str) -> List[array]:
+        name = name.lower()
+        if not self.GLOB_CHARS.intersection(name):
+            return [self._by_name[name]] if name in self._by_name else []
+        matcher = ExcludeMatcher([name])
+        return [ids for key, ids in self._by_name.items() if matcher.matches(key)]
+    
+    def iter_ids(self, language: Optional[str] = None, entity_type: Optional[str] = None,
+                 path_glob: Optional[str] = None, name: Optional[str] = None,
+                 start: int = 0) -> Iterable[int]:
+        """Yield matching entity ids in ascending order, starting at ``start``"""
+        # Each filter contributes a sorted candidate stream and its size
+        candidates: List[Tuple[int, Iterable[int]]] = []
+        type_code = None
+        if language is not None:
+            ids = self._by_language.get(language, array('I'))
+            candidates.append((len(ids), self._tail(ids, start)))
+        if entity_type is not None:
+            ids = self._by_type.get(entity_type, array('I'))
+            candidates.append((len(ids), self._tail(ids, start)))
+            type_code = self._types.index(entity_type) if entity_type in self._types else -1
+        
+        name_ids = None
+        if name is not None:
+            postings = self._name_postings(name)
+            size = sum(len(ids) for ids in postings)
+            name_ids = set().union(*postings) if postings else set()
+            candidates.append((size, heapq.merge(*(self._tail(ids, start) for ids in postings))))
+        
+        file_ok = None
+        if path_glob is not None:
+            matcher = ExcludeMatcher([path_glob])
+            matched_files = [i for i, path in enumerate(self._paths) if matcher.matches(path)]
+            file_ok = set(matched_files)
+            size = sum(self._file_starts[i + 1] - self._file_starts[i] for i in matched_files)
+            candidates.append((size, self._file_ranges(matched_files, start)))
+        
+        if not candidates:
+            candidates.append((len(self), range(start, len(self))))
+        _, driver = min(candidates, key=lambda candidate: candidate[0])
+        
+        for entity_id in driver:
+            file_index = self._file_of[entity_id]
+            if language is not None and self._file_languages[file_index] != language:
+                continue
+            if type_code is not None and self._type_of[entity_id] != type_code:
+                continue
+            if file_ok is not None and file_index not in file_ok:
+                continue
+            if name_ids is not None and entity_id not in name_ids:
+                continue
+            yield entity_id
+    
+    @staticmethod
+    def _tail(ids: array, start: int) -> Iterable[int]:
+        return islice(ids, bisect.bisect_left(ids, start), None)
+    
+    def _file_ranges(self, file_indices: List[int], start: int) -> Iterable[int]:
+        for file_index in file_indices:
+            end = self._file_starts[file_index + 1]
+            if end > start:
+                yield from range(max(start, self._file_starts[file_index]), end)
+    
+    def result(self, entity_id: int) -> QueryResult:
+        """Load the entity with the given id"""
+        fc = self.context.files[self._file_of[entity_id]]
+        return QueryResult(file=fc.path, language=fc.language,
+                           entity=fc.entities[self._entity_of[entity_id]])
+
+
 class CodebaseExtractor:
     """Main codebase context extractor"""
     
@@ -340,116 +964,386 @@ class CodebaseExtractor:
         '*.min.css',
     ]
     
+    ENTRY_POINT_STEMS = {'main', '__main__', 'index', 'app'}
+    MAX_SUMMARY_ENTRY_POINTS = 50
+    EXACT_LINE_COUNT_BYTES = 32 * 1024 * 1024
+    NEAR_DUPLICATE_THRESHOLD = 0.8
+    # Most files sent to a worker process in one task
+    BATCH_FILES = 64
+    
     def __init__(self, target_path: str, exclude_patterns: List[str] = None,
-                 include_tests: bool = False):
+                 include_tests: bool = False, budget: Optional[AnalysisBudget] = None,
+                 jobs: int = 1, detect_duplicates: bool = True,
+                 progress: Optional[ProgressReporter] = None, store_dir: Optional[str] = None):
         self.target_path = Path(target_path)
         self.exclude_patterns = self.DEFAULT_EXCLUDE_PATTERNS + (exclude_patterns or [])
         self.include_tests = include_tests
+        self.budget = budget or AnalysisBudget()
+        self.jobs = max(1, jobs)
+        self.detect_duplicates = detect_duplicates
+        self.progress = progress or ProgressReporter.human()
+        self.store_dir = store_dir
         
         if not include_tests:
             self.exclude_patterns.extend(['*/test/*', '*/tests/*', '*_test.py', '*_test.go'])
     
+    @classmethod
+    def for_target(cls, target_path: str, **kwargs) -> 'CodebaseExtractor':
+        """Extractor for a directory, a single file or a source archive"""
+        if is_archive(target_path):
+            return ArchiveExtractor(target_path, **kwargs)
+        return cls(target_path, **kwargs)
+    
+    def __getstate__(self):
+        # Cached directory listings hold os.DirEntry objects, which cannot be
+        # sent to worker processes; they are rebuilt on demand
+        state = self.__dict__.copy()
+        state.pop('_walker', None)
+        state.pop('_exclude_matcher', None)
+        state.pop('_entries', None)
+        state.pop('_index', None)
+        state['progress'] = None
+        return state
+    
+    @property
+    def exclude_matcher(self) -> ExcludeMatcher:
+        """Compiled matcher for the exclude patterns"""
+        if getattr(self, '_exclude_matcher', None) is None:
+            self._exclude_matcher = ExcludeMatcher(self.exclude_patterns)
+        return self._exclude_matcher
+    
+    @property
+    def walker(self) -> DirectoryWalker:
+        """Directory walker applying the exclude patterns, with cached listings"""
+        if getattr(self, '_walker', None) is None:
+            self._walker = DirectoryWalker(self.exclude_matcher)
+        return self._walker
+    
     def _should_exclude(self, path: Path) -> bool:
         """Check if path should be excluded"""
-        path_str = str(path)
-        for pattern in self.exclude_patterns:
-            if fnmatch.fnmatch(path_str, pattern):
-                return True
-        return False
+        return self.exclude_matcher.matches(str(path))
     
     def _get_language(self, file_path: Path) -> Optional[str]:
         """Detect programming language from file extension"""
         return self.LANGUAGE_EXTENSIONS.get(file_path.suffix.lower())
     
-    def _get_analyzer(self, file_path: Path) -> Optional[LanguageAnalyzer]:
+    def _get_analyzer(self, file_path: Path, data: Optional[bytes] = None) -> Optional[LanguageAnalyzer]:
         """Get appropriate analyzer for file"""
         language = self._get_language(file_path)
         
         if language == 'Python':
-            return PythonAnalyzer(str(file_path))
+            return PythonAnalyzer(str(file_path), data)
         elif language in ['JavaScript', 'TypeScript']:
-            return JavaScriptAnalyzer(str(file_path))
+            return JavaScriptAnalyzer(str(file_path), data)
         elif language:
-            return GenericAnalyzer(str(file_path))
+            return GenericAnalyzer(str(file_path), data)
         
         return None
     
     def _collect_files(self) -> List[Path]:
         """Collect all relevant source files"""
         files = []
+        # The tree is walked afresh, so listings and indexes of earlier walks may be stale
+        self.walker.clear_cache()
+        ModuleIndex.clear_cache()
         
         if self.target_path.is_file():
             return [self.target_path]
         
-        for root, dirs, filenames in os.walk(self.target_path):
-            # Filter directories
-            dirs[:] = [d for d in dirs if not self._should_exclude(Path(root) / d)]
-            
-            for filename in filenames:
-                file_path = Path(root) / filename
-                
-                if self._should_exclude(file_path):
-                    continue
-                
-                if self._get_language(file_path):
-                    files.append(file_path)
+        self._entries = {}
+        for entry in self.walker.walk_files(str(self.target_path)):
+            file_path = Path(entry.path)
+            if self._get_language(file_path):
+                files.append(file_path)
+                self._entries[entry.path] = entry
         
         return files
     
+    def _file_size(self, file_path: Path) -> int:
+        """File size, from the walker's cached stat when available"""
+        entry = getattr(self, '_entries', {}).get(str(file_path))
+        if entry is not None:
+            return DirectoryWalker.size(entry)
+        try:
+            return file_path.stat().st_size
+        except OSError:
+            return 0
+    
+    def _relative_path(self, file_path: Path) -> str:
+        """Path of a collected file as reported in contexts"""
+        return str(file_path.relative_to(self.target_path))
+    
+    def iter_file_tree(self, max_depth: int = 3,
+                       collapse_threshold: Optional[int] = None) -> Iterable[str]:
+        """Stream a file tree of the target, honoring the exclude patterns"""
+        self.walker.clear_cache()
+        return iter_file_tree(str(self.target_path), max_depth=max_depth, walker=self.walker,
+                              collapse_threshold=collapse_threshold)
+    
     def extract_full_context(self) -> CodebaseContext:
-        """Extract complete codebase context"""
-        files = self._collect_files()
-        file_contexts = []
+        """
+        Extract complete codebase context.
+        
+        With ``store_dir`` set, file contexts and duplicate groups are written
+        to on-disk segment stores as they are produced and a
+        ``DiskBackedCodebaseContext`` is returned, whose dependency graph is
+        read back from the stored imports instead of being held in memory.
+        """
+        if self.store_dir:
+            file_contexts, duplicate_groups = DiskBackedCodebaseContext.create(self.store_dir)
+        else:
+            file_contexts, duplicate_groups = [], []
         languages = defaultdict(int)
         total_lines = 0
         dependency_graph = defaultdict(list)
         
-        print(f"Analyzing {len(files)} files...", file=sys.stderr)
-        
-        for i, file_path in enumerate(files, 1):
-            if i % 10 == 0:
-                print(f"Progress: {i}/{len(files)}", file=sys.stderr)
-            
-            analyzer = self._get_analyzer(file_path)
-            if not analyzer:
+        for file_context in self._iter_file_contexts(duplicate_groups):
+            if not file_context:
                 continue
             
-            language = self._get_language(file_path)
-            languages[language] += 1
-            
-            imports = analyzer.extract_imports()
-            entities = analyzer.extract_entities()
-            lines = analyzer.get_line_count()
-            total_lines += lines
-            
-            file_context = FileContext(
-                path=str(file_path.relative_to(self.target_path)),
-                language=language,
-                lines_of_code=lines,
-                imports=imports,
-                entities=entities
-            )
-            
+            languages[file_context.language] += 1
+            total_lines += file_context.lines_of_code
             file_contexts.append(file_context)
             
             # Build dependency graph
-            for imp in imports:
-                dependency_graph[file_context.path].append(imp)
+            if not self.store_dir:
+                for imp in file_context.imports:
+                    dependency_graph[file_context.path].append(imp)
         
         # Detect entry points
         entry_points = self._detect_entry_points(file_contexts)
         
-        return CodebaseContext(
+        context_type = DiskBackedCodebaseContext if self.store_dir else CodebaseContext
+        context = context_type(
             root_path=str(self.target_path),
             total_files=len(file_contexts),
             total_lines=total_lines,
             languages=dict(languages),
             files=file_contexts,
-            dependency_graph=dict(dependency_graph),
-            entry_points=entry_points
+            dependency_graph=ImportGraph(file_contexts) if self.store_dir else dict(dependency_graph),
+            entry_points=entry_points,
+            duplicate_groups=duplicate_groups
         )
+        if self.store_dir:
+            context.save()
+        return context
+    
+    def _iter_file_contexts(self, duplicate_groups: Optional[List[DuplicateGroup]] = None
+                            ) -> Iterable[Optional[FileContext]]:
+        """
+        Analyze every collected file in order.
+        
+        When `duplicate_groups` is given, duplicates are analyzed once and
+        their groups appended to it; otherwise every file is analyzed.
+        """
+        files = self._collect_files()
+        print(f"Analyzing {len(files)} files...", file=sys.stderr)
+        if duplicate_groups is None:
+            return self._analyze_files(files)
+        return self._analyze_deduplicated(files, duplicate_groups)
+    
+    def analyze_file(self, file_path: Path, data: Optional[bytes] = None,
+                     relative_path: Optional[str] = None) -> Optional[FileContext]:
+        """
+        Analyze a single file within the configured budget.
+        
+        Files over the size budget, or whose analysis runs past the time
+        budget, are recorded with line counts only and flagged as degraded.
+        ``data`` supplies the file contents instead of reading them from disk,
+        and ``relative_path`` the path reported in the context.
+        """
+        return self._analyze_file(file_path, data, relative_path)[0]
+    
+    def _analyze_and_fingerprint(self, file_path: Path, data: Optional[bytes] = None,
+                                 relative_path: Optional[str] = None
+                                 ) -> Tuple[Optional[FileContext], Optional[Tuple[int, ...]]]:
+        """Analyze a file and compute its near-duplicate signature from the same content"""
+        file_context, analyzer = self._analyze_file(file_path, data, relative_path)
+        if file_context is None or analyzer is None or file_context.degraded:
+            return file_context, None
+        return file_context, similarity_signature(analyzer.content)
+    
+    def _analyze_file(self, file_path: Path, data: Optional[bytes] = None,
+                      relative_path: Optional[str] = None
+                      ) -> Tuple[Optional[FileContext], Optional[LanguageAnalyzer]]:
+        language = self._get_language(file_path)
+        if not language:
+            return None, None
+        
+        relative_path = relative_path or self._relative_path(file_path)
+        max_bytes = self.budget.max_file_bytes
+        try:
+            size = len(data) if data is not None else file_path.stat().st_size
+            oversized = bool(max_bytes) and size > max_bytes
+        except OSError:
+            oversized = False
+        
+        if oversized:
+            lines = count_stream_lines(io.BytesIO(data)) if data is not None else count_lines(file_path)
+            return self._oversized_context(relative_path, language, lines), None
+        
+        analyzer = None
+        try:
+            with _time_budget(self.budget.timeout_seconds):
+                analyzer = self._get_analyzer(file_path, data)
+                imports = analyzer.extract_imports()
+                entities = analyzer.extract_entities()
+                metrics = analyzer.extract_metrics(entities)
+        except AnalysisTimeout:
+            print(f"Analysis of {relative_path} exceeded {self.budget.timeout_seconds}s, "
+                  f"recording line count only", file=sys.stderr)
+            if analyzer:
+                lines = analyzer.get_line_count()
+            else:
+                lines = count_stream_lines(io.BytesIO(data)) if data is not None else count_lines(file_path)
+            return FileContext(path=relative_path, language=language, lines_of_code=lines,
+                               imports=[], entities=[], degraded='timeout'), None
+        
+        return FileContext(
+            path=relative_path,
+            language=language,
+            lines_of_code=analyzer.get_line_count(),
+            imports=imports,
+            entities=entities,
+            metrics=metrics
+        ), analyzer
+    
+    def _oversized_context(self, relative_path: str, language: str, lines: int) -> FileContext:
+        """Context of a file over the size budget, with its line count only"""
+        print(f"Skipping analysis of {relative_path}: larger than {self.budget.max_file_bytes} bytes",
+              file=sys.stderr)
+        return FileContext(path=relative_path, language=language, lines_of_code=lines,
+                           imports=[], entities=[], degraded='size')
+    
+    @staticmethod
+    def _duplicate_copy(file_context: FileContext, path: str, file_path: Path) -> FileContext:
+        """Context of a byte-identical copy of an analyzed file, with its entities moved to the copy"""
+        return FileContext(
+            path=path,
+            language=file_context.language,
+            lines_of_code=file_context.lines_of_code,
+            imports=file_context.imports,
+            entities=[replace(entity, file_path=str(file_path)) for entity in file_context.entities],
+            metrics=file_context.metrics,
+            degraded=file_context.degraded,
+            duplicate_of=file_context.path
+        )
+    
+    def _analyze_files(self, files: List[Path], task=None, phase: str = 'analyze') -> Iterable[Any]:
+        """
+        Run `task` (analyze_file by default) over files in order, in worker
+        processes when jobs > 1, reporting progress as files complete.
+        
+        Reported paths are computed here and passed to the task, so workers
+        need no per-file state of the extractor. Workers receive the
+        extractor once, when the pool starts, and files in batches.
+        """
+        task = task or self.analyze_file
+        progress = self.progress
+        sizes = [self._file_size(file_path) for file_path in files]
+        progress.start(len(files), sum(sizes), phase=phase)
+        
+        if self.jobs == 1 or len(files) < 2:
+            for file_path, size in zip(files, sizes):
+                progress.file_started(str(file_path))
+                result = task(file_path, relative_path=self._relative_path(file_path))
+                progress.file_finished(str(file_path), size)
+                yield result
+            progress.finish()
+            return
+        
+        # One batch per worker is running at a time, and a new one is sent as
+        # soon as any finishes. Finished batches are buffered until they can
+        # be yielded in order, up to `ahead` batches past the oldest running
+        # one, so a file that runs to its time budget stalls only its batch.
+        batch_size = max(1, min(self.BATCH_FILES, len(files) // (self.jobs * 4)))
+        batch_count = (len(files) + batch_size - 1) // batch_size
+        ahead = self.jobs * 4
+        
+        def batch(index: int) -> Tuple[List[Path], List[int]]:
+            return (files[index * batch_size:(index + 1) * batch_size],
+                    sizes[index * batch_size:(index + 1) * batch_size])
+        
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_analysis_worker,
+                                 initargs=(self,)) as executor:
+            running: Dict[Future, int] = {}
+            finished: Dict[int, List[Any]] = {}
+            submitted = next_batch = 0
+            while next_batch < batch_count:
+                while len(running) < self.jobs and submitted < min(batch_count, next_batch + ahead):
+                    paths, _ = batch(submitted)
+                    progress.batch_started([str(file_path) for file_path in paths])
+                    future = executor.submit(_analyze_batch, task.__name__, [
+                        (file_path, None, self._relative_path(file_path)) for file_path in paths])
+                    running[future] = submitted
+                    submitted += 1
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    paths, batch_sizes = batch(index)
+                    finished[index] = future.result()
+                    progress.batch_finished([str(file_path) for file_path in paths], sum(batch_sizes))
+                
+                while next_batch in finished:
+                    yield from finished.pop(next_batch)
+                    next_batch += 1
+        progress.finish()
+    
+    def _analyze_deduplicated(self, files: List[Path],
+                              duplicate_groups: List['DuplicateGroup']) -> Iterable[Optional[FileContext]]:
+        """
+        Analyze each unique file content once and fan the result out to every path.
+        
+        Byte-identical files are grouped by content hash before analysis and
+        only the first copy is analyzed. Near duplicates are found from MinHash
+        signatures computed during analysis. Both kinds of group are appended
+        to `duplicate_groups`.
+        """
+        if not self.detect_duplicates:
+            yield from self._analyze_files(files)
+            return
+        
+        # Only the copies of repeated content are kept once hashing is done
+        first_copy: Dict[Any, int] = {}
+        unique: List[Path] = []
+        repeated: Dict[int, List[Path]] = {}
+        for file_path in files:
+            digest = content_digest(file_path)
+            key = (digest, self._get_language(file_path)) if digest else (str(file_path), None)
+            index = first_copy.setdefault(key, len(unique))
+            if index == len(unique):
+                unique.append(file_path)
+            else:
+                repeated.setdefault(index, []).append(file_path)
+        del first_copy
+        near_duplicates = NearDuplicateIndex(threshold=self.NEAR_DUPLICATE_THRESHOLD)
+        
+        results = self._analyze_files(unique, task=self._analyze_and_fingerprint)
+        for index, (file_context, signature) in enumerate(results):
+            members = repeated.pop(index, ())
+            yield file_context
+            if not file_context:
+                continue
+            if signature:
+                near_duplicates.add(file_context.path, signature)
+            if not members:
+                continue
+            
+            copies = []
+            for duplicate in members:
+                copy = self._duplicate_copy(file_context, self._relative_path(duplicate), duplicate)
+                copies.append(copy.path)
+                yield copy
+            duplicate_groups.append(DuplicateGroup(
+                kind='exact', representative=file_context.path, duplicates=copies, similarity=1.0))
+        
+        for members, similarity in near_duplicates.groups():
+            duplicate_groups.append(DuplicateGroup(
+                kind='near', representative=members[0], duplicates=members[1:],
+                similarity=round(similarity, 2)))
     
-    def _detect_entry_points(self, file_contexts: List[FileContext]) -> List[str]:
+    def _detect_entry_points(self, file_contexts: Iterable[FileContext]) -> List[str]:
         """Detect likely entry points"""
         entry_points = []
         
@@ -466,33 +1360,127 @@ class CodebaseExtractor:
         
         return entry_points
     
-    def extract_targeted_context(self, focus: str) -> Dict[str, Any]:
-        """Extract context focused on specific entity"""
+    def extract_summary(self, sample_size: int = 200, seed: int = 0) -> 'SummaryContext':
+        """
+        Estimate codebase statistics from a stratified sample of files.
+        
+        Language counts come from the file list and sizes from stat calls.
+        Only a sample per (top-level directory, language) stratum plus likely
+        entry points is analyzed; line and entity totals are extrapolated from
+        the sample by byte volume and reported with 95% confidence intervals.
+        """
         files = self._collect_files()
+        sizes = {file_path: self._file_size(file_path) for file_path in files}
+        total_bytes = sum(sizes.values())
+        
+        languages = defaultdict(int)
+        strata = defaultdict(list)
+        for file_path in files:
+            language = self._get_language(file_path)
+            languages[language] += 1
+            parts = Path(self._relative_path(file_path)).parts
+            top_level = parts[0] if len(parts) > 1 else ''
+            strata[(top_level, language)].append(file_path)
+        
+        # Entry points are always analyzed and counted exactly
+        certain = sorted(
+            (f for f in files if f.stem.lower() in self.ENTRY_POINT_STEMS),
+            key=lambda f: (len(f.parts), str(f))
+        )[:self.MAX_SUMMARY_ENTRY_POINTS]
+        certain_set = set(certain)
+        
+        rng = random.Random(seed)
+        population = len(files) - len(certain)
+        sampled = {}
+        for key, members in strata.items():
+            members = [f for f in members if f not in certain_set]
+            if not members:
+                continue
+            if population <= sample_size:
+                take = len(members)
+            else:
+                take = min(len(members), max(1, round(sample_size * len(members) / population)))
+            sampled[key] = rng.sample(members, take)
+        
+        to_analyze = certain + [f for members in sampled.values() for f in members]
+        print(f"Sampling {len(to_analyze)} of {len(files)} files...", file=sys.stderr)
+        analyzed = {}
+        for index, file_context in enumerate(self._analyze_files(to_analyze, phase='sample')):
+            if file_context:
+                analyzed[to_analyze[index]] = file_context
+        
+        def stratum_inputs(value):
+            inputs = []
+            for key, members in strata.items():
+                members = [f for f in members if f not in certain_set]
+                sample = [(sizes[f], value(analyzed[f])) for f in sampled.get(key, []) if f in analyzed]
+                inputs.append((sample, sum(sizes[f] for f in members), len(members)))
+            known = sum(value(analyzed[f]) for f in certain if f in analyzed)
+            return inputs, known
+        
+        if total_bytes <= self.EXACT_LINE_COUNT_BYTES:
+            # Small enough to count newlines everywhere
+            exact = sum(analyzed[f].lines_of_code if f in analyzed else count_lines(f) for f in files)
+            line_estimate = Estimate(value=exact, low=exact, high=exact)
+        else:
+            line_estimate = _estimate_total(*stratum_inputs(lambda fc: fc.lines_of_code))
+        entity_estimate = _estimate_total(*stratum_inputs(lambda fc: len(fc.entities)))
+        
+        file_contexts = [analyzed[f] for f in to_analyze if f in analyzed]
+        return SummaryContext(
+            root_path=str(self.target_path),
+            total_files=len(files),
+            total_lines=round(line_estimate.value),
+            languages=dict(languages),
+            files=file_contexts,
+            dependency_graph={fc.path: list(fc.imports) for fc in file_contexts if fc.imports},
+            entry_points=self._detect_entry_points(file_contexts),
+            sampled_files=len(file_contexts),
+            total_bytes=total_bytes,
+            line_estimate=line_estimate,
+            entity_estimate=entity_estimate
+        )
+    
+    def extract_targeted_context(self, focus: str, include_source: bool = False) -> Dict[str, Any]:
+        """
+        Extract context focused on specific entity.
+        
+        With ``include_source``, each match also carries its full docstring
+        and definition source, read from the recorded byte ranges.
+        """
         results = {
             'focus': focus,
             'matches': [],
             'related_files': []
         }
+        pending = []
         
-        for file_path in files:
-            analyzer = self._get_analyzer(file_path)
-            if not analyzer:
+        for file_context in self._iter_file_contexts():
+            if not file_context:
                 continue
             
-            entities = analyzer.extract_entities()
-            
-            for entity in entities:
+            for entity in file_context.entities:
                 if focus.lower() in entity.name.lower():
-                    results['matches'].append({
+                    match = {
                         'entity': asdict(entity),
-                        'file': str(file_path.relative_to(self.target_path)),
-                        'imports': analyzer.extract_imports()
-                    })
-                    results['related_files'].append(str(file_path.relative_to(self.target_path)))
+                        'file': file_context.path,
+                        'imports': file_context.imports
+                    }
+                    if include_source:
+                        pending.append((match, entity))
+                    results['matches'].append(match)
+                    results['related_files'].append(file_context.path)
         
+        if pending:
+            self._load_sources(pending)
         return results
     
+    def _load_sources(self, pending: List[Tuple[Dict[str, Any], CodeEntity]]) -> None:
+        """Add the full docstring and source of each matched entity to its match"""
+        for match, entity in pending:
+            match['docstring'] = load_docstring(entity)
+            match['source'] = load_source(entity)
+    
     def extract_dependency_graph(self) -> Dict[str, Any]:
         """Extract dependency information"""
         context = self.extract_full_context()
@@ -511,19 +1499,95 @@ class CodebaseExtractor:
                 'lines': file_ctx.lines_of_code
             })
         
-        # Build edges
+        # Build edges, resolving imports against an index of the analyzed files
+        index = self.build_module_index(context)
+        resolved_graph = defaultdict(list)
         for source, targets in context.dependency_graph.items():
             for target in targets:
+                resolved = index.resolve(target, source)
                 graph['edges'].append({
                     'from': source,
-                    'to': target
+                    'to': target,
+                    'resolved': resolved
                 })
+                if resolved and resolved != source:
+                    resolved_graph[source].append(resolved)
         
-        # Detect circular dependencies
-        graph['circular_dependencies'] = self._find_circular_deps(context.dependency_graph)
+        # Detect circular dependencies between project files
+        graph['circular_dependencies'] = self._find_circular_deps(dict(resolved_graph))
         
         return graph
     
+    def build_module_index(self, context: CodebaseContext) -> ModuleIndex:
+        """Index the analyzed files for import resolution"""
+        return ModuleIndex.from_root(str(self.target_path), (fc.path for fc in context.files))
+    
+    def build_index(self, context: Optional[CodebaseContext] = None) -> ContextIndex:
+        """
+        Build (or rebuild) the entity index used by ``query``.
+        
+        Pass an already extracted context to index it; otherwise the full
+        context is extracted once and reused by later queries.
+        """
+        self._index = ContextIndex(context if context is not None else self.extract_full_context())
+        return self._index
+    
+    @property
+    def index(self) -> ContextIndex:
+        """Entity index, built on first use"""
+        if getattr(self, '_index', None) is None:
+            self.build_index()
+        return self._index
+    
+    def iter_query(self, language: Optional[str] = None, entity_type: Optional[str] = None,
+                   path_glob: Optional[str] = None, name: Optional[str] = None,
+                   cursor: Optional[str] = None) -> Iterable[QueryResult]:
+        """Stream every entity matching the filters; see ``query``"""
+        index = self.index
+        for entity_id in index.iter_ids(language, entity_type, path_glob, name,
+                                        start=self._decode_cursor(cursor)):
+            yield index.result(entity_id)
+    
+    def query(self, language: Optional[str] = None, entity_type: Optional[str] = None,
+              path_glob: Optional[str] = None, name: Optional[str] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> QueryPage:
+        """
+        Look up entities in the indexed context.
+        
+        Args:
+            language: Language of the containing file, e.g. 'Python'
+            entity_type: 'class', 'function', 'method', ...
+            path_glob: fnmatch pattern for the file's relative path
+            name: Case-insensitive entity name, optionally with glob wildcards
+            limit: Maximum number of results in the page
+            cursor: ``next_cursor`` of the previous page
+        
+        Returns:
+            A page of results in file order, with a cursor for the next page
+            (None on the last page)
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        index = self.index
+        ids = index.iter_ids(language, entity_type, path_glob, name,
+                             start=self._decode_cursor(cursor))
+        page = list(islice(ids, limit + 1))
+        next_cursor = str(page[limit]) if len(page) > limit else None
+        return QueryPage(results=[index.result(entity_id) for entity_id in page[:limit]],
+                         next_cursor=next_cursor)
+    
+    @staticmethod
+    def _decode_cursor(cursor: Optional[str]) -> int:
+        if cursor is None:
+            return 0
+        try:
+            position = int(cursor)
+        except ValueError:
+            raise ValueError(f"Invalid query cursor: {cursor!r}") from None
+        if position < 0:
+            raise ValueError(f"Invalid query cursor: {cursor!r}")
+        return position
+    
     def _find_circular_deps(self, dep_graph: Dict[str, List[str]]) -> List[List[str]]:
         """Find circular dependencies"""
         circles = []
@@ -549,136 +1613,769 @@ class CodebaseExtractor:
         return circles
 
 
-class OutputFormatter:
-    """Format extraction results"""
+class WorkspaceExtractor(CodebaseExtractor):
+    """
+    Analyze several sibling roots as one workspace.
+    
+    Files from every root go through a single analysis run, so a file
+    reached through more than one root is analyzed once and byte-identical
+    copies across roots share one analysis. Paths in the resulting context
+    are prefixed with the root's name, and imports resolving into another
+    root become cross-root dependency edges.
+    """
+    
+    def __init__(self, roots: List[str], **kwargs):
+        if not roots:
+            raise ValueError("A workspace needs at least one root")
+        super().__init__(roots[0], **kwargs)
+        self.roots = [Path(root) for root in roots]
+        self.root_names = self._unique_names(self.roots)
+        self._root_of: Dict[str, Tuple[Path, str]] = {}
+    
+    def __getstate__(self):
+        # Workers are handed reported paths with each task; sending the
+        # per-file root map along with every submission would be quadratic
+        state = super().__getstate__()
+        state.pop('_root_of', None)
+        return state
     
     @staticmethod
-    def format_markdown(context: CodebaseContext) -> str:
-        """Format as Markdown"""
-        lines = [
-            f"# Codebase Context: {Path(context.root_path).name}",
-            "",
-            "## Overview",
-            f"- **Total Files**: {context.total_files}",
-            f"- **Total Lines**: {context.total_lines:,}",
-            f"- **Languages**: {', '.join(f'{lang} ({count})' for lang, count in context.languages.items())}",
-            "",
-            "## Entry Points",
+    def _unique_names(roots: List[Path]) -> List[str]:
+        """Directory names of the roots, suffixed where they collide"""
+        names = []
+        for root in roots:
+            base = root.resolve().name or 'root'
+            name, counter = base, 2
+            while name in names:
+                name = f"{base}-{counter}"
+                counter += 1
+            names.append(name)
+        return names
+    
+    def _collect_files(self) -> List[Path]:
+        files = []
+        seen = set()
+        self.walker.clear_cache()
+        ModuleIndex.clear_cache()
+        self._entries = {}
+        self._root_of = {}
+        for root, name in zip(self.roots, self.root_names):
+            for entry in self.walker.walk_files(str(root)):
+                file_path = Path(entry.path)
+                if not self._get_language(file_path):
+                    continue
+                # Overlapping or symlinked roots reach some files twice
+                real_path = os.path.realpath(entry.path)
+                if real_path in seen:
+                    continue
+                seen.add(real_path)
+                files.append(file_path)
+                self._entries[entry.path] = entry
+                self._root_of[entry.path] = (root, name)
+        return files
+    
+    def _relative_path(self, file_path: Path) -> str:
+        root, name = self._root_of[str(file_path)]
+        return str(Path(name) / file_path.relative_to(root))
+    
+    def iter_file_tree(self, max_depth: int = 3,
+                       collapse_threshold: Optional[int] = None) -> Iterable[str]:
+        """Stream the file tree of each root in turn"""
+        self.walker.clear_cache()
+        for root in self.roots:
+            yield from iter_file_tree(str(root), max_depth=max_depth, walker=self.walker,
+                                      collapse_threshold=collapse_threshold)
+    
+    def extract_full_context(self) -> WorkspaceContext:
+        """Extract a unified context of all roots, with per-root statistics"""
+        context = super().extract_full_context()
+        
+        summaries = {name: RootSummary(name=name, path=str(root))
+                     for root, name in zip(self.roots, self.root_names)}
+        languages = {name: defaultdict(int) for name in summaries}
+        for fc in context.files:
+            name = Path(fc.path).parts[0]
+            summaries[name].total_files += 1
+            summaries[name].total_lines += fc.lines_of_code
+            languages[name][fc.language] += 1
+        for name, summary in summaries.items():
+            summary.languages = dict(languages[name])
+        
+        values = {f.name: getattr(context, f.name) for f in fields(CodebaseContext)}
+        values['root_path'] = os.path.commonpath([str(root.resolve()) for root in self.roots])
+        return WorkspaceContext(roots=list(summaries.values()), **values)
+    
+    def build_module_index(self, context: CodebaseContext) -> WorkspaceModuleIndex:
+        """Index the analyzed files of every root for import resolution"""
+        return WorkspaceModuleIndex.from_files(
+            {name: str(root) for root, name in zip(self.roots, self.root_names)},
+            (fc.path for fc in context.files))
+    
+    def extract_dependency_graph(self) -> Dict[str, Any]:
+        """Dependency graph of the workspace, flagging and counting cross-root edges"""
+        graph = super().extract_dependency_graph()
+        
+        counts = defaultdict(int)
+        for edge in graph['edges']:
+            source_root = Path(edge['from']).parts[0]
+            target_root = Path(edge['resolved']).parts[0] if edge['resolved'] else None
+            edge['cross_root'] = bool(target_root) and target_root != source_root
+            if edge['cross_root']:
+                counts[(source_root, target_root)] += 1
+        
+        graph['cross_root_edges'] = [
+            {'from_root': source, 'to_root': target, 'imports': count}
+            for (source, target), count in sorted(counts.items())
         ]
+        return graph
+
+
+class StreamingExtractor(CodebaseExtractor):
+    """
+    Base for sources whose files are read as one stream of members, such
+    as archives and git revisions, rather than walked on disk.
+    
+    Subclasses yield ``(file_path, key, open_member)`` tuples from
+    ``_iter_members``: ``key`` identifies the content if known without
+    reading it (or None), and ``open_member()`` returns ``(size, stream)``.
+    Members with a key already seen, or whose analysis is cached under that
+    key, are never read.
+    """
+    
+    def _iter_members(self) -> Iterable[Tuple[Path, Optional[str], Any]]:
+        raise NotImplementedError
+    
+    def _member_totals(self) -> Tuple[int, int]:
+        """(files, bytes) to be streamed, or zeros when not known in advance"""
+        return 0, 0
+    
+    def _load_cached(self, key: Any) -> Optional[Tuple[FileContext, Any]]:
+        """Previously stored analysis for a content key"""
+        return None
+    
+    def _store_cached(self, key: Any, result: Tuple[FileContext, Any]) -> None:
+        """Keep an analysis for later runs"""
+    
+    @staticmethod
+    def _rebase(file_context: FileContext, relative_path: str, file_path: Path) -> FileContext:
+        """An analysis of the same content, moved to another path"""
+        if file_context.path == relative_path:
+            return file_context
+        entities = [replace(entity, file_path=str(file_path)) for entity in file_context.entities]
+        return replace(file_context, path=relative_path, entities=entities)
+    
+    def _wanted(self, name: str) -> bool:
+        return self._get_language(Path(name)) is not None
+    
+    def _load_sources(self, pending: List[Tuple[Dict[str, Any], CodeEntity]]) -> None:
+        """
+        Load sources from the member contents: entity paths are virtual.
+        
+        Only members holding a match are read, in one more pass over the
+        source that stops once every match is loaded.
+        """
+        by_path: Dict[str, List[Tuple[Dict[str, Any], CodeEntity]]] = defaultdict(list)
+        for match, entity in pending:
+            by_path[entity.file_path].append((match, entity))
+        
+        for file_path, _, open_member in self._iter_members():
+            wanted = by_path.pop(str(file_path), None)
+            if wanted is None:
+                continue
+            _, stream = open_member()
+            data = stream.read()
+            for match, entity in wanted:
+                match['docstring'] = load_docstring(entity, data)
+                match['source'] = load_source(entity, data)
+            if not by_path:
+                break
+    
+    def _iter_file_contexts(self, duplicate_groups: Optional[List[DuplicateGroup]] = None
+                            ) -> Iterable[Optional[FileContext]]:
+        dedupe = duplicate_groups is not None and self.detect_duplicates
+        progress = self.progress
+        total_files, total_bytes = self._member_totals()
+        if total_files:
+            print(f"Analyzing {total_files} files...", file=sys.stderr)
+        else:
+            print(f"Analyzing files streamed from {self.target_path.name}...", file=sys.stderr)
+        progress.start(total_files, total_bytes)
+        
+        representatives: Dict[Any, FileContext] = {}
+        copies: Dict[str, List[str]] = {}
+        near_duplicates = NearDuplicateIndex(threshold=self.NEAR_DUPLICATE_THRESHOLD)
+        
+        def settle(file_path: Path, size: int, key: Any, outcome: Any) -> Optional[FileContext]:
+            if outcome is None:
+                representative = representatives[key]
+                file_context = self._duplicate_copy(representative, self._relative_path(file_path), file_path)
+                copies[representative.path].append(file_context.path)
+            else:
+                result = outcome.result()[0] if isinstance(outcome, Future) else outcome
+                file_context, signature = result
+                if file_context and key is not None:
+                    if not file_context.degraded:
+                        self._store_cached(key, result)
+                    if dedupe:
+                        representatives[key] = file_context
+                        copies[file_context.path] = []
+                if file_context and signature:
+                    near_duplicates.add(file_context.path, signature)
+            progress.file_finished(str(file_path), size)
+            return file_context
+        
+        # Results are settled in stream order, so a copy always follows its
+        # representative; with jobs > 1 a bounded window of members is
+        # analyzed in worker processes
+        executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_analysis_worker,
+                                       initargs=(self,)) if self.jobs > 1 else None
+        window = self.jobs * 4 if executor else 0
+        pending = deque()
+        seen = set()
+        max_bytes = self.budget.max_file_bytes
+        try:
+            for file_path, key, open_member in self._iter_members():
+                progress.file_started(str(file_path))
+                relative_path = self._relative_path(file_path)
+                language = self._get_language(file_path)
+                key = (key, language) if key is not None else None
+                size, outcome = 0, None
+                
+                cached = None
+                if key is not None and not (dedupe and key in seen):
+                    cached = self._load_cached(key)
+                if cached is not None:
+                    outcome = (self._rebase(cached[0], relative_path, file_path), cached[1])
+                elif key is None or not (dedupe and key in seen):
+                    size, stream = open_member()
+                    if max_bytes and size > max_bytes:
+                        outcome = (self._oversized_context(relative_path, language,
+                                                           count_stream_lines(stream)), None)
+                    else:
+                        data = stream.read()
+                        if key is None and dedupe:
+                            key = (bytes_digest(data), language)
+                        if not (dedupe and key in seen):
+                            if executor:
+                                outcome = executor.submit(_analyze_batch, '_analyze_and_fingerprint',
+                                                          [(file_path, data, relative_path)])
+                            else:
+                                outcome = self._analyze_and_fingerprint(file_path, data)
+                
+                # Without an outcome the member is a copy of an earlier one
+                if dedupe and key is not None:
+                    seen.add(key)
+                pending.append((file_path, size, key, outcome))
+                while len(pending) > window:
+                    yield settle(*pending.popleft())
+            while pending:
+                yield settle(*pending.popleft())
+        finally:
+            if executor:
+                executor.shutdown()
+        progress.finish()
+        
+        if duplicate_groups is not None:
+            for representative, paths in copies.items():
+                if paths:
+                    duplicate_groups.append(DuplicateGroup(
+                        kind='exact', representative=representative, duplicates=paths, similarity=1.0))
+            for members, similarity in near_duplicates.groups():
+                duplicate_groups.append(DuplicateGroup(
+                    kind='near', representative=members[0], duplicates=members[1:],
+                    similarity=round(similarity, 2)))
+    
+    def extract_summary(self, sample_size: int = 200, seed: int = 0) -> 'SummaryContext':
+        raise ValueError("Summary mode samples files on disk; use full mode instead")
+    
+    def iter_file_tree(self, max_depth: int = 3,
+                       collapse_threshold: Optional[int] = None) -> Iterable[str]:
+        raise ValueError("Hierarchy mode needs a directory")
+
+
+class ArchiveExtractor(StreamingExtractor):
+    """
+    Analyze a .zip or tar archive without extracting it.
+    
+    Members are streamed from the archive in a single pass. Exclude patterns
+    and language detection are applied to member names first, and only the
+    remaining members are read and handed to the analyzers as bytes.
+    Paths in the context are member paths.
+    """
+    
+    def __init__(self, target_path: str, **kwargs):
+        super().__init__(target_path, **kwargs)
+        self.reader = ArchiveReader(str(self.target_path), self.exclude_matcher)
+    
+    def _member_totals(self) -> Tuple[int, int]:
+        # Zip archives list their members up front; tar members are only
+        # known while streaming
+        listing = self.reader.listing(self._wanted)
+        if listing is None:
+            return 0, 0
+        return len(listing), sum(size for _, size in listing)
+    
+    def _iter_members(self) -> Iterable[Tuple[Path, Optional[str], Any]]:
+        for name, size, stream in self.reader.members(self._wanted):
+            yield Path(self.reader.virtual_path(name)), None, lambda: (size, stream)
+
+
+class GitRevisionExtractor(StreamingExtractor):
+    """
+    Analyze a revision of a local git repository straight from its object
+    store, without checking it out.
+    
+    Trees and blobs are read through one persistent ``git cat-file --batch``
+    process. Blob names double as cache keys: analyses are kept in a
+    CacheManager (by default inside the repository's .git directory), so
+    files unchanged between revisions are not read or analyzed again.
+    Entries are also keyed by CACHE_VERSION and the analysis budget, so
+    they are not reused after the analyzers or settings change.
+    """
+    
+    # Bump when analyzers or FileContext change, to retire cached analyses
+    CACHE_VERSION = 1
+    CACHE_EXPIRY_HOURS = 24 * 30
+    
+    def __init__(self, target_path: str, rev: str, cache_dir: Optional[str] = None, **kwargs):
+        super().__init__(target_path, **kwargs)
+        self.rev = rev
+        self.objects = GitObjectReader(str(self.target_path))
+        self.commit = self.objects.rev_parse(rev)
+        self.cache = CacheManager(cache_dir or os.path.join(self.objects.git_dir(), 'context-cache'),
+                                  expiry_hours=self.CACHE_EXPIRY_HOURS)
+        self.cache_hits = 0
+        self.cache_mode = (f"analysis-v{self.CACHE_VERSION}:{self.budget.max_file_bytes or 0}:"
+                           f"{self.budget.timeout_seconds or 0}")
+    
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('objects', None)
+        return state
+    
+    def _excluded_directory(self, path: str) -> bool:
+        return self._should_exclude(Path(os.path.join(str(self.target_path), *path.split('/')) + os.sep))
+    
+    def _iter_members(self) -> Iterable[Tuple[Path, Optional[str], Any]]:
+        for path, blob in self.objects.iter_tree(self.commit, prune=self._excluded_directory):
+            file_path = self.target_path.joinpath(*path.split('/'))
+            if not self._get_language(file_path) or self._should_exclude(file_path):
+                continue
+            yield file_path, blob, lambda blob=blob: self.objects.open(blob)[1:]
+    
+    def _load_cached(self, key: Any) -> Optional[Tuple[FileContext, Any]]:
+        blob, language = key
+        cached = self.cache.get(blob, f"{self.cache_mode}:{language}")
+        if cached is not None:
+            self.cache_hits += 1
+        return cached
+    
+    def _store_cached(self, key: Any, result: Tuple[FileContext, Any]) -> None:
+        blob, language = key
+        self.cache.set(blob, f"{self.cache_mode}:{language}", result)
+    
+    def _iter_file_contexts(self, duplicate_groups: Optional[List[DuplicateGroup]] = None
+                            ) -> Iterable[Optional[FileContext]]:
+        self.cache_hits = 0
+        yield from super()._iter_file_contexts(duplicate_groups)
+        print(f"Analyzed {self.rev} ({self.commit[:12]}): {self.cache_hits} files reused from cache",
+              file=sys.stderr)
+    
+    def close(self) -> None:
+        """Stop the git object reader"""
+        self.objects.close()
+
+
+class ContextEncoder:
+    """Serialize context dataclasses without the deep copy made by ``asdict``
+    
+    Dataclasses are converted one level at a time while the encoder walks
+    the structure, so no intermediate copy of the whole context is built.
+    When ``orjson`` is installed it is used automatically.
+    """
+    
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+    
+    @staticmethod
+    def _default(obj: Any) -> Any:
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return {f.name: getattr(obj, f.name) for f in fields(obj)}
+        if isinstance(obj, Mapping):
+            return dict(obj.items())
+        if isinstance(obj, (set, frozenset, SegmentStore)):
+            return list(obj)
+        return str(obj)
+    
+    def write(self, data: Any, out: TextIO) -> None:
+        """Encode data to a text handle
+        
+        Contexts whose files are not held in a list (such as a
+        ``DiskBackedCodebaseContext``) are written one entry at a time,
+        as are their other stored fields.
+        """
+        if isinstance(data, CodebaseContext) and not isinstance(data.files, list):
+            self._write_streamed(data, out)
+        else:
+            self._write_value(data, out)
+        out.write("\n")
+    
+    def _write_streamed(self, context: CodebaseContext, out: TextIO) -> None:
+        # Mirrors the layout of an indent=2 (or compact) dump of the whole object
+        if self.compact:
+            field_sep, item_sep, key_sep = ',', ',', ':'
+            open_obj, close_obj, open_nested, close_nested = '{', '}', '', ''
+        else:
+            field_sep, item_sep, key_sep = ',\n  ', ',\n    ', ': '
+            open_obj, close_obj, open_nested, close_nested = '{\n  ', '\n}', '\n    ', '\n  '
+        
+        out.write(open_obj)
+        for position, field in enumerate(fields(context)):
+            if position:
+                out.write(field_sep)
+            out.write(json.dumps(field.name) + key_sep)
+            value = getattr(context, field.name)
+            if isinstance(value, Mapping) and not isinstance(value, dict):
+                brackets = '{}'
+                entries = ((self._encode_nested(key, 2) + key_sep, item) for key, item in value.items())
+            elif isinstance(value, Sequence) and not isinstance(value, (list, tuple, str)):
+                brackets = '[]'
+                entries = (('', item) for item in value)
+            else:
+                out.write(self._encode_nested(value, 1))
+                continue
+            
+            out.write(brackets[0])
+            empty = True
+            for prefix, item in entries:
+                out.write(open_nested if empty else item_sep)
+                out.write(prefix + self._encode_nested(item, 2))
+                empty = False
+            out.write(brackets[1] if empty else close_nested + brackets[1])
+        out.write(close_obj)
+    
+    def _encode_nested(self, value: Any, level: int) -> str:
+        buffer = io.StringIO()
+        self._write_value(value, buffer)
+        text = buffer.getvalue()
+        return text if self.compact else text.replace('\n', '\n' + '  ' * level)
+    
+    def _write_value(self, data: Any, out: TextIO) -> None:
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if not self.compact:
+                option |= orjson.OPT_INDENT_2
+            out.write(orjson.dumps(data, default=self._default, option=option).decode('utf-8'))
+        elif self.compact:
+            json.dump(data, out, separators=(',', ':'), default=self._default)
+        else:
+            json.dump(data, out, indent=2, default=self._default)
+    
+    def encode(self, data: Any) -> str:
+        """Encode data to a string"""
+        buffer = io.StringIO()
+        self.write(data, buffer)
+        return buffer.getvalue()
+
+
+class _ContextDumper(getattr(yaml, 'CDumper', yaml.Dumper)):
+    """YAML dumper that represents context dataclasses directly"""
+    
+    def ignore_aliases(self, data: Any) -> bool:
+        return True
+
+
+def _represent_dataclass(dumper: yaml.Dumper, obj: Any) -> yaml.Node:
+    return dumper.represent_dict({f.name: getattr(obj, f.name) for f in fields(obj)})
+
+
+def _represent_segment_store(dumper: yaml.Dumper, store: SegmentStore) -> yaml.Node:
+    return dumper.represent_list(store)
+
+
+def _represent_import_graph(dumper: yaml.Dumper, graph: ImportGraph) -> yaml.Node:
+    return dumper.represent_dict(graph)
+
+
+_ContextDumper.add_representer(SegmentStore, _represent_segment_store)
+_ContextDumper.add_representer(ImportGraph, _represent_import_graph)
+
+for _context_type in (CodeEntity, FileContext, CodebaseContext, FileMetrics, Estimate, DuplicateGroup,
+                      RootSummary):
+    _ContextDumper.add_multi_representer(_context_type, _represent_dataclass)
+
+
+class _Descending:
+    """Inverts ordering so heapq's min-heap can act as a bounded max-heap"""
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __lt__(self, other: '_Descending') -> bool:
+        return other.value < self.value
+
+
+def _smallest_unique(items: Iterable[str], k: int) -> List[str]:
+    """Return the k smallest distinct items in sorted order using a bounded heap"""
+    heap: List[_Descending] = []
+    members: Set[str] = set()
+    
+    for item in items:
+        if item in members:
+            continue
+        if len(heap) < k:
+            heapq.heappush(heap, _Descending(item))
+            members.add(item)
+        elif item < heap[0].value:
+            evicted = heapq.heapreplace(heap, _Descending(item))
+            members.discard(evicted.value)
+            members.add(item)
+    
+    return sorted(entry.value for entry in heap)
+
+
+class OutputFormatter:
+    """Format extraction results
+    
+    The ``write_*`` methods stream output to a text handle line by line;
+    the ``format_*`` methods are string-returning wrappers around them.
+    """
+    
+    TOP_ENTITIES = 20
+    TOP_IMPORTS = 30
+    TOP_COMPLEXITY = 10
+    
+    @staticmethod
+    def write_markdown(context: CodebaseContext, out: TextIO) -> None:
+        """Write Markdown to a text handle"""
+        out.write(f"# Codebase Context: {Path(context.root_path).name}\n\n")
+        out.write("## Overview\n")
+        out.write(f"- **Total Files**: {context.total_files}\n")
+        out.write(f"- **Total Lines**: {context.total_lines:,}\n")
+        out.write(f"- **Languages**: {', '.join(f'{lang} ({count})' for lang, count in context.languages.items())}\n")
+        if isinstance(context, SummaryContext):
+            OutputFormatter._write_estimates(context, out, "- **{}**: {}\n")
+        if isinstance(context, WorkspaceContext):
+            out.write("\n## Workspace Roots\n")
+            for root in context.roots:
+                out.write(f"- **{root.name}** (`{root.path}`): {root.total_files} files, "
+                          f"{root.total_lines:,} lines\n")
+        out.write("\n## Entry Points\n")
         
         for entry in context.entry_points:
-            lines.append(f"- `{entry}`")
+            out.write(f"- `{entry}`\n")
         
-        lines.extend(["", "## File Structure", ""])
+        degraded = [fc for fc in context.files if fc.degraded]
+        if degraded:
+            out.write("\n## Degraded Files\n")
+            out.write("Analysis was skipped for these files; only line counts are reported.\n")
+            for fc in degraded:
+                out.write(f"- `{fc.path}` ({fc.degraded}, {fc.lines_of_code} lines)\n")
         
-        # Group files by directory
-        files_by_dir = defaultdict(list)
-        for fc in context.files:
+        out.write("\n## File Structure\n\n")
+        
+        # Duplicates are listed once under their group
+        hidden = {path for group in context.duplicate_groups for path in group.duplicates}
+        # One pass records each directory's runs of consecutive files; walks
+        # keep a directory's files together, so this holds about one run per
+        # directory, and files are streamed again in directory order (loaded
+        # on demand from disk-backed contexts)
+        runs = defaultdict(list)
+        previous = None
+        for index, fc in enumerate(context.files):
             dir_name = str(Path(fc.path).parent)
-            files_by_dir[dir_name].append(fc)
+            if dir_name == previous:
+                runs[dir_name][-1][1] = index + 1
+            else:
+                runs[dir_name].append([index, index + 1])
+                previous = dir_name
         
-        for dir_name in sorted(files_by_dir.keys()):
-            lines.append(f"### {dir_name or '(root)'}")
-            for fc in files_by_dir[dir_name]:
-                lines.append(f"- **{Path(fc.path).name}** ({fc.language}, {fc.lines_of_code} lines)")
-                
-                if fc.entities:
-                    entity_summary = {}
-                    for entity in fc.entities:
-                        entity_summary[entity.type] = entity_summary.get(entity.type, 0) + 1
+        for dir_name in sorted(runs):
+            listed = False
+            for start, stop in runs[dir_name]:
+                for index in range(start, stop):
+                    fc = context.files[index]
+                    if fc.path in hidden:
+                        continue
+                    if not listed:
+                        out.write(f"### {dir_name or '(root)'}\n")
+                        listed = True
+                    out.write(f"- **{Path(fc.path).name}** ({fc.language}, {fc.lines_of_code} lines)\n")
                     
-                    summary_str = ', '.join(f"{count} {etype}{'s' if count > 1 else ''}"
-                                           for etype, count in entity_summary.items())
-                    lines.append(f"  - Contains: {summary_str}")
-            lines.append("")
+                    if fc.entities:
+                        entity_summary = {}
+                        for entity in fc.entities:
+                            entity_summary[entity.type] = entity_summary.get(entity.type, 0) + 1
+                        
+                        summary_str = ', '.join(f"{count} {etype}{'s' if count > 1 else ''}"
+                                               for etype, count in entity_summary.items())
+                        out.write(f"  - Contains: {summary_str}\n")
+            if listed:
+                out.write("\n")
+        del runs, hidden
         
-        lines.extend(["## Key Components", ""])
+        if context.duplicate_groups:
+            out.write("## Duplicate Groups\n\n")
+            for group in context.duplicate_groups:
+                similarity = "identical" if group.kind == 'exact' else f"~{group.similarity:.0%} similar"
+                out.write(f"- `{group.representative}` ({similarity}, "
+                          f"{len(group.duplicates)} other cop{'y' if len(group.duplicates) == 1 else 'ies'}): "
+                          f"{', '.join(f'`{path}`' for path in group.duplicates)}\n")
+            out.write("\n")
         
-        # List significant entities
-        all_entities = []
-        for fc in context.files:
-            all_entities.extend(fc.entities)
-        
-        # Group by type
-        by_type = defaultdict(list)
-        for entity in all_entities:
-            by_type[entity.type].append(entity)
+        out.write("## Key Components\n\n")
         
+        # List significant entities, keeping only the top N per type in a heap
         for entity_type in ['class', 'function', 'method']:
-            if entity_type in by_type:
-                lines.append(f"### {entity_type.title()}s")
-                for entity in sorted(by_type[entity_type], key=lambda e: e.name)[:20]:  # Top 20
-                    loc = f"{Path(entity.file_path).name}:{entity.line_number}"
-                    if entity.signature:
-                        lines.append(f"- `{entity.signature}` - {loc}")
-                    else:
-                        lines.append(f"- `{entity.name}` - {loc}")
-                    
-                    if entity.docstring:
-                        # First line of docstring
-                        first_line = entity.docstring.split('\n')[0].strip()
-                        if first_line:
-                            lines.append(f"  - {first_line}")
-                lines.append("")
+            top = heapq.nsmallest(
+                OutputFormatter.TOP_ENTITIES,
+                (entity for fc in context.files for entity in fc.entities
+                 if entity.type == entity_type),
+                key=lambda e: e.name
+            )
+            if not top:
+                continue
+            
+            out.write(f"### {entity_type.title()}s\n")
+            for entity in top:
+                loc = f"{Path(entity.file_path).name}:{entity.line_number}"
+                if entity.signature:
+                    out.write(f"- `{entity.signature}` - {loc}\n")
+                else:
+                    out.write(f"- `{entity.name}` - {loc}\n")
+                
+                if entity.docstring:
+                    # First line of docstring
+                    first_line = entity.docstring.split('\n', 1)[0].strip()
+                    if first_line:
+                        out.write(f"  - {first_line}\n")
+            out.write("\n")
         
-        lines.extend(["## Dependencies", ""])
+        hotspots = heapq.nlargest(
+            OutputFormatter.TOP_COMPLEXITY,
+            (entity for fc in context.files for entity in fc.entities
+             if entity.complexity and entity.complexity > 1),
+            key=lambda e: e.complexity
+        )
+        if hotspots:
+            out.write("## Complexity Hotspots\n\n")
+            for entity in hotspots:
+                loc = f"{Path(entity.file_path).name}:{entity.line_number}"
+                out.write(f"- `{entity.name}` - complexity {entity.complexity} - {loc}\n")
+            out.write("\n")
         
-        # Collect unique imports
-        all_imports = set()
-        for fc in context.files:
-            all_imports.update(fc.imports)
+        out.write("## Dependencies\n\n")
         
-        # Separate external and internal
-        external = [imp for imp in all_imports if not imp.startswith('.')]
+        # Smallest unique external imports, without materializing the full set
+        external = _smallest_unique(
+            (imp for fc in context.files for imp in fc.imports if not imp.startswith('.')),
+            OutputFormatter.TOP_IMPORTS
+        )
         
         if external:
-            lines.append("### External Dependencies")
-            for imp in sorted(external)[:30]:  # Top 30
-                lines.append(f"- `{imp}`")
-            lines.append("")
-        
-        return '\n'.join(lines)
+            out.write("### External Dependencies\n")
+            for imp in external:
+                out.write(f"- `{imp}`\n")
+            out.write("\n")
     
     @staticmethod
-    def format_json(data: Any) -> str:
-        """Format as JSON"""
-        if isinstance(data, CodebaseContext):
-            data = asdict(data)
-        return json.dumps(data, indent=2, default=str)
+    def write_json(data: Any, out: TextIO, compact: bool = False) -> None:
+        """Write JSON to a text handle"""
+        ContextEncoder(compact=compact).write(data, out)
     
     @staticmethod
-    def format_yaml(data: Any) -> str:
-        """Format as YAML"""
-        if isinstance(data, CodebaseContext):
-            data = asdict(data)
-        return yaml.dump(data, default_flow_style=False, sort_keys=False)
+    def write_yaml(data: Any, out: TextIO) -> None:
+        """Write YAML to a text handle"""
+        yaml.dump(data, out, Dumper=_ContextDumper, default_flow_style=False, sort_keys=False)
     
     @staticmethod
-    def format_text(context: CodebaseContext) -> str:
-        """Format as plain text"""
-        lines = [
-            f"Codebase Context: {Path(context.root_path).name}",
-            "=" * 60,
-            "",
-            f"Total Files: {context.total_files}",
-            f"Total Lines: {context.total_lines:,}",
-            f"Languages: {', '.join(context.languages.keys())}",
-            "",
-            "Entry Points:",
-        ]
+    def write_text(context: CodebaseContext, out: TextIO) -> None:
+        """Write plain text to a text handle"""
+        out.write(f"Codebase Context: {Path(context.root_path).name}\n")
+        out.write("=" * 60 + "\n\n")
+        out.write(f"Total Files: {context.total_files}\n")
+        out.write(f"Total Lines: {context.total_lines:,}\n")
+        out.write(f"Languages: {', '.join(context.languages.keys())}\n")
+        if isinstance(context, SummaryContext):
+            OutputFormatter._write_estimates(context, out, "{}: {}\n")
+        if isinstance(context, WorkspaceContext):
+            out.write("\nRoots:\n")
+            for root in context.roots:
+                out.write(f"  {root.name} ({root.path}): {root.total_files} files, {root.total_lines:,} lines\n")
+        out.write("\nEntry Points:\n")
         
         for entry in context.entry_points:
-            lines.append(f"  - {entry}")
+            out.write(f"  - {entry}\n")
         
-        lines.append("")
-        lines.append("Files:")
+        out.write("\nFiles:\n")
         
+        hidden = {path for group in context.duplicate_groups for path in group.duplicates}
         for fc in context.files:
-            lines.append(f"  {fc.path} ({fc.language}, {fc.lines_of_code} lines)")
+            if fc.path in hidden:
+                continue
+            degraded = f", degraded: {fc.degraded}" if fc.degraded else ""
+            out.write(f"  {fc.path} ({fc.language}, {fc.lines_of_code} lines{degraded})\n")
             if fc.entities:
-                lines.append(f"    Entities: {len(fc.entities)}")
+                out.write(f"    Entities: {len(fc.entities)}\n")
         
-        return '\n'.join(lines)
+        if context.duplicate_groups:
+            out.write("\nDuplicate Groups:\n")
+            for group in context.duplicate_groups:
+                out.write(f"  {group.representative} ({group.kind}, {group.similarity:.0%}): "
+                          f"{', '.join(group.duplicates)}\n")
+    
+    @staticmethod
+    def _write_estimates(context: 'SummaryContext', out: TextIO, template: str) -> None:
+        """Write sampling details and interval estimates of a summary"""
+        out.write(template.format("Sampled Files", f"{context.sampled_files} of {context.total_files}"))
+        for label, estimate in (("Estimated Lines", context.line_estimate),
+                                ("Estimated Entities", context.entity_estimate)):
+            if estimate is None:
+                continue
+            if estimate.low == estimate.high:
+                out.write(template.format(label, f"{estimate.value:,.0f} (exact)"))
+            else:
+                out.write(template.format(label, f"{estimate.value:,.0f} "
+                          f"({estimate.confidence:.0%} CI {estimate.low:,.0f}-{estimate.high:,.0f})"))
+    
+    @staticmethod
+    def write(data: Any, output_format: str, out: TextIO, compact: bool = False) -> None:
+        """Write data in the requested format, falling back to JSON for non-context results"""
+        if output_format == 'yaml':
+            OutputFormatter.write_yaml(data, out)
+        elif output_format == 'json' or not isinstance(data, CodebaseContext):
+            OutputFormatter.write_json(data, out, compact=compact)
+        elif output_format == 'markdown':
+            OutputFormatter.write_markdown(data, out)
+        else:  # text
+            OutputFormatter.write_text(data, out)
+    
+    @staticmethod
+    def _render(writer, data: Any) -> str:
+        buffer = io.StringIO()
+        writer(data, buffer)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def format_markdown(context: CodebaseContext) -> str:
+        """Format as Markdown"""
+        return OutputFormatter._render(OutputFormatter.write_markdown, context)
+    
+    @staticmethod
+    def format_json(data: Any, compact: bool = False) -> str:
+        """Format as JSON"""
+        return ContextEncoder(compact=compact).encode(data)
+    
+    @staticmethod
+    def format_yaml(data: Any) -> str:
+        """Format as YAML"""
+        return OutputFormatter._render(OutputFormatter.write_yaml, data)
+    
+    @staticmethod
+    def format_text(context: CodebaseContext) -> str:
+        """Format as plain text"""
+        return OutputFormatter._render(OutputFormatter.write_text, context)
 
 
 def main():
@@ -687,8 +2384,8 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     
-    parser.add_argument('--target-path', required=True,
-                       help='Path to the codebase to analyze')
+    parser.add_argument('--target-path', required=True, nargs='+',
+                       help='Path to the codebase to analyze; several paths analyze a workspace')
     parser.add_argument('--mode', required=True,
                        choices=['full', 'targeted', 'dependency', 'flow', 'api', 
                                'data', 'hierarchy', 'summary'],
@@ -698,11 +2395,37 @@ def main():
     parser.add_argument('--depth', type=int, help='Maximum traversal depth')
     parser.add_argument('--include-tests', action='store_true',
                        help='Include test files in analysis')
+    parser.add_argument('--include-source', action='store_true',
+                       help='Include full docstrings and source of matches in targeted mode')
     parser.add_argument('--language', help='Programming language (auto-detected if not specified)')
     parser.add_argument('--format', default='markdown',
                        choices=['markdown', 'json', 'yaml', 'text'],
                        help='Output format')
     parser.add_argument('--exclude', help='Patterns to exclude (comma-separated)')
+    parser.add_argument('--compact', action='store_true',
+                       help='Write JSON without indentation')
+    parser.add_argument('--collapse-threshold', type=int, default=100,
+                       help='Summarize directories with more children in hierarchy mode (0 disables)')
+    parser.add_argument('--sample-size', type=int, default=200,
+                       help='Number of files analyzed in depth by summary mode')
+    parser.add_argument('--no-dedupe', action='store_true',
+                       help='Analyze duplicate files separately instead of grouping them')
+    parser.add_argument('--progress-fd', type=int,
+                       help='Write progress events as JSON lines to this file descriptor')
+    parser.add_argument('--progress-interval', type=float, default=0.5,
+                       help='Minimum seconds between progress events')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Number of worker processes for file analysis')
+    parser.add_argument('--max-file-size', type=int, default=AnalysisBudget.max_file_bytes,
+                       help='Skip analysis of files larger than this many bytes (0 disables)')
+    parser.add_argument('--file-timeout', type=float, default=AnalysisBudget.timeout_seconds,
+                       help='Per-file analysis time budget in seconds (0 disables)')
+    parser.add_argument('--rev',
+                       help='Analyze this git revision of the repository at --target-path without checking it out')
+    parser.add_argument('--cache-dir',
+                       help='Analysis cache for --rev (default: context-cache inside the .git directory)')
+    parser.add_argument('--store-dir',
+                       help='Keep per-file contexts in an on-disk store in this directory (full mode)')
     
     args = parser.parse_args()
     
@@ -711,13 +2434,42 @@ def main():
     if args.exclude:
         exclude_patterns = [p.strip() for p in args.exclude.split(',')]
     
-    # Create extractor
-    extractor = CodebaseExtractor(
-        args.target_path,
+    progress = None
+    if args.progress_fd is not None:
+        progress_stream = os.fdopen(args.progress_fd, 'w', encoding='utf-8', closefd=False)
+        progress = ProgressReporter.to_stream(progress_stream, interval=args.progress_interval)
+    
+    options = dict(
         exclude_patterns=exclude_patterns,
-        include_tests=args.include_tests
+        include_tests=args.include_tests,
+        budget=AnalysisBudget(max_file_bytes=args.max_file_size,
+                              timeout_seconds=args.file_timeout),
+        jobs=args.jobs,
+        detect_duplicates=not args.no_dedupe,
+        progress=progress,
+        store_dir=args.store_dir
     )
     
+    # Archives and revisions are streamed, never walked or sampled on disk
+    streamed = args.rev or (len(args.target_path) == 1 and is_archive(args.target_path[0]))
+    if streamed and args.mode in ('summary', 'hierarchy'):
+        parser.error(f"{args.mode} mode needs a directory target, not an archive or --rev")
+    
+    # Create extractor; several roots are analyzed together as a workspace
+    if len(args.target_path) > 1:
+        if args.rev:
+            print("Error: --rev takes a single repository path", file=sys.stderr)
+            sys.exit(1)
+        extractor = WorkspaceExtractor(args.target_path, **options)
+    elif args.rev:
+        try:
+            extractor = GitRevisionExtractor(args.target_path[0], args.rev, cache_dir=args.cache_dir, **options)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        extractor = CodebaseExtractor.for_target(args.target_path[0], **options)
+    
     # Extract based on mode
     if args.mode == 'full':
         result = extractor.extract_full_context()
@@ -725,43 +2477,37 @@ def main():
         if not args.focus:
             print("Error: --focus is required for targeted mode", file=sys.stderr)
             sys.exit(1)
-        result = extractor.extract_targeted_context(args.focus)
+        result = extractor.extract_targeted_context(args.focus, include_source=args.include_source)
     elif args.mode == 'dependency':
         result = extractor.extract_dependency_graph()
     elif args.mode == 'summary':
-        context = extractor.extract_full_context()
-        # Create summary version
-        context.files = context.files[:10]  # Limit to first 10 files
-        result = context
+        result = extractor.extract_summary(sample_size=args.sample_size)
+    elif args.mode == 'hierarchy':
+        # The tree is streamed line by line rather than built as a result
+        lines = extractor.iter_file_tree(max_depth=args.depth or 3,
+                                         collapse_threshold=args.collapse_threshold or None)
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for line in lines:
+                out.write(line + "\n")
+        finally:
+            if args.output:
+                out.close()
+                print(f"Context written to {args.output}", file=sys.stderr)
+        return
     else:
         print(f"Mode '{args.mode}' not fully implemented yet", file=sys.stderr)
         sys.exit(1)
     
-    # Format output
+    # Write output incrementally instead of building it in memory
     formatter = OutputFormatter()
     
-    if args.format == 'markdown':
-        if isinstance(result, CodebaseContext):
-            output = formatter.format_markdown(result)
-        else:
-            output = formatter.format_json(result)
-    elif args.format == 'json':
-        output = formatter.format_json(result)
-    elif args.format == 'yaml':
-        output = formatter.format_yaml(result)
-    else:  # text
-        if isinstance(result, CodebaseContext):
-            output = formatter.format_text(result)
-        else:
-            output = json.dumps(result, indent=2, default=str)
-    
-    # Write output
     if args.output:
         with open(args.output, 'w', encoding='utf-8') as f:
-            f.write(output)
+            formatter.write(result, args.format, f, compact=args.compact)
         print(f"Context written to {args.output}", file=sys.stderr)
     else:
-        print(output)
+        formatter.write(result, args.format, sys.stdout, compact=args.compact)
 
 
 if __name__ == '__main__':
@@ -197,6 +197,910 @@ def test_output_formatters():
     print("✓ Output Formatter tests passed\n")
 
 
+def test_streaming_formatters():
+    """Test streaming output and bounded top-N sections."""
+    print("Testing Streaming Formatters...")
+    
+    import io
+    from context_extractor import FileContext, CodeEntity
+    
+    entities = [
+        CodeEntity(name=f"func_{i:03d}", type="function", file_path="big.py", line_number=i)
+        for i in range(100, 0, -1)
+    ]
+    context = CodebaseContext(
+        root_path="/test/project",
+        total_files=1,
+        total_lines=500,
+        languages={"Python": 1},
+        files=[
+            FileContext(
+                path="big.py",
+                language="Python",
+                lines_of_code=500,
+                imports=[f"pkg{i:02d}" for i in range(50, 0, -1)] * 2 + [".local"],
+                entities=entities
+            )
+        ],
+        dependency_graph={},
+        entry_points=[]
+    )
+    
+    buffer = io.StringIO()
+    OutputFormatter.write_markdown(context, buffer)
+    output = buffer.getvalue()
+    
+    assert output == OutputFormatter.format_markdown(context), "Writer and formatter should agree"
+    listed = [line for line in output.splitlines() if line.startswith("- `func_")]
+    assert len(listed) == OutputFormatter.TOP_ENTITIES, "Should list only the top entities"
+    assert listed[0].startswith("- `func_001`"), "Top entities should be sorted by name"
+    
+    imports = [line for line in output.splitlines() if line.startswith("- `pkg")]
+    assert imports == [f"- `pkg{i:02d}`" for i in range(1, OutputFormatter.TOP_IMPORTS + 1)], \
+        "Should list the smallest unique external imports"
+    assert "`.local`" not in output, "Should skip relative imports"
+    print("  ✓ Markdown streams with bounded top-N sections")
+    
+    print("✓ Streaming Formatter tests passed\n")
+
+
+def test_context_encoder():
+    """Test direct JSON/YAML serialization of context dataclasses."""
+    print("Testing Context Encoder...")
+    
+    import json
+    import yaml
+    from dataclasses import asdict
+    from context_extractor import FileContext, CodeEntity, ContextEncoder
+    
+    context = CodebaseContext(
+        root_path="/test/project",
+        total_files=1,
+        total_lines=10,
+        languages={"Python": 1},
+        files=[
+            FileContext(
+                path="app.py",
+                language="Python",
+                lines_of_code=10,
+                imports=["os"],
+                entities=[CodeEntity(name="run", type="function", file_path="app.py",
+                                     line_number=1, docstring="Run it")]
+            )
+        ],
+        dependency_graph={"app.py": ["os"]},
+        entry_points=["app.py"]
+    )
+    
+    expected = asdict(context)
+    assert json.loads(ContextEncoder().encode(context)) == expected, "Should match asdict output"
+    
+    compact = ContextEncoder(compact=True).encode(context)
+    assert json.loads(compact) == expected, "Compact output should decode identically"
+    assert "\n " not in compact, "Compact output should not be indented"
+    print("  ✓ JSON encoding matches asdict")
+    
+    assert yaml.safe_load(OutputFormatter.format_yaml(context)) == expected, "YAML should match asdict"
+    print("  ✓ YAML encoding matches asdict")
+    
+    print("✓ Context Encoder tests passed\n")
+
+
+def test_metrics_engine():
+    """Test AST and token based complexity metrics."""
+    print("Testing Metrics Engine...")
+    
+    from utils import MetricsCalculator
+    
+    # Keywords inside identifiers, strings and comments must not count
+    assert MetricsCalculator.calculate_complexity("def diff(format):\n    return 'if or for'\n") == 1, \
+        "Should ignore substrings of identifiers and strings"
+    assert MetricsCalculator.calculate_complexity(
+        "def f(a, b):\n    if a and b:\n        return 1\n    for x in a:\n        pass\n") == 4, \
+        "Should count if, boolean operator and loop"
+    print("  ✓ Python complexity is AST-based")
+    
+    js = """/*
+ * Block comment mentioning if and while
+ */
+function check(value) {
+    // inline comment: if
+    if (value && value.ok) {
+        return value.ready ? 1 : 2;
+    }
+    return 0;
+}
+
+function plain() {
+    return "if (x) { }";
+}
+"""
+    assert MetricsCalculator.count_comment_lines(js, 'JavaScript') == 4, \
+        "Should count block and line comments"
+    
+    test_file = Path('/tmp/test_metrics_file.js')
+    test_file.write_text(js)
+    analyzer = JavaScriptAnalyzer(str(test_file))
+    entities = analyzer.extract_entities()
+    metrics = analyzer.extract_metrics(entities)
+    test_file.unlink()
+    
+    by_name = {e.name: e.complexity for e in entities}
+    assert by_name['check'] == 4, "Should count if, && and ternary inside check"
+    assert by_name['plain'] == 1, "Should ignore keywords inside strings"
+    assert metrics.complexity == 4, "File complexity should sum decision points"
+    assert metrics.comment_lines == 4, "Should report comment lines"
+    print("  ✓ C-family complexity is per function")
+    
+    print("✓ Metrics Engine tests passed\n")
+
+
+def test_analysis_budget():
+    """Test per-file size and time budgets."""
+    print("Testing Analysis Budget...")
+    
+    import tempfile
+    from context_extractor import AnalysisBudget
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "small.py").write_text("def ok():\n    return 1\n")
+        (root / "large.py").write_text("".join(f"def f{i}(a, b):\n    return a or b\n" for i in range(5000)))
+        
+        extractor = CodebaseExtractor(tmp, budget=AnalysisBudget(max_file_bytes=1000))
+        context = extractor.extract_full_context()
+        by_path = {fc.path: fc for fc in context.files}
+        assert by_path["large.py"].degraded == "size", "Oversized file should be degraded"
+        assert by_path["large.py"].lines_of_code == 10000, "Degraded file should keep its line count"
+        assert not by_path["large.py"].entities, "Degraded file should not be analyzed"
+        assert by_path["small.py"].degraded is None, "Small file should be analyzed"
+        assert "## Degraded Files" in OutputFormatter.format_markdown(context), "Should flag degraded files"
+        print("  ✓ Size budget degrades large files")
+        
+        if hasattr(__import__('signal'), 'setitimer'):
+            extractor = CodebaseExtractor(tmp, budget=AnalysisBudget(max_file_bytes=None,
+                                                                      timeout_seconds=0.001))
+            large = extractor.analyze_file(root / "large.py")
+            assert large.degraded == "timeout", "Slow file should be degraded"
+            assert large.lines_of_code == 10000, "Timed out file should keep its line count"
+            print("  ✓ Time budget degrades slow files")
+    
+    print("✓ Analysis Budget tests passed\n")
+
+
+def test_summary_sampling():
+    """Test sampled summary mode estimates."""
+    print("Testing Summary Sampling...")
+    
+    import tempfile
+    from context_extractor import SummaryContext
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for package in ("core", "api", "web"):
+            (root / package).mkdir()
+            for i in range(20):
+                body = "".join(f"def f{j}():\n    return {j}\n" for j in range(i % 5 + 1))
+                (root / package / f"mod{i}.py").write_text(body)
+        (root / "web" / "app.js").write_text("function start() {\n  return 1;\n}\n")
+        (root / "main.py").write_text("def main():\n    pass\n")
+        
+        extractor = CodebaseExtractor(tmp)
+        extractor.EXACT_LINE_COUNT_BYTES = 0  # force estimation
+        summary = extractor.extract_summary(sample_size=12)
+        
+        assert isinstance(summary, SummaryContext), "Should return a summary context"
+        assert summary.total_files == 62, "File count should be exact"
+        assert summary.languages == {"Python": 61, "JavaScript": 1}, "Languages should be exact"
+        assert summary.sampled_files < summary.total_files, "Should analyze only a sample"
+        sampled = {fc.path for fc in summary.files}
+        assert "main.py" in sampled, "Entry points should always be analyzed"
+        assert any(path.endswith("app.js") for path in sampled), "Every stratum should be sampled"
+        
+        lines = summary.line_estimate
+        assert lines.low <= lines.value <= lines.high, "Interval should contain the estimate"
+        assert summary.entity_estimate.value > 0, "Should estimate entities"
+        print(f"  ✓ Estimated {lines.value:.0f} lines ({lines.low:.0f}-{lines.high:.0f}) "
+              f"from {summary.sampled_files} files")
+        
+        output = OutputFormatter.format_markdown(summary)
+        assert "Estimated Lines" in output, "Markdown should report estimates"
+        print("  ✓ Summary formatting reports estimates")
+    
+    print("✓ Summary Sampling tests passed\n")
+
+
+def test_duplicate_detection():
+    """Test exact and near duplicate grouping."""
+    print("Testing Duplicate Detection...")
+    
+    import tempfile
+    
+    source = (Path(__file__).parent / "examples" / "sample_project.py").read_text()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for name in ("vendor_a", "vendor_b", "fork"):
+            (root / name).mkdir()
+        (root / "vendor_a" / "service.py").write_text(source)
+        (root / "vendor_b" / "service.py").write_text(source)
+        (root / "fork" / "service.py").write_text(source.replace("Represents a user", "Models a user"))
+        
+        context = CodebaseExtractor(tmp).extract_full_context()
+        assert context.total_files == 3, "Duplicates should still count as files"
+        
+        by_path = {fc.path: fc for fc in context.files}
+        copy = by_path[str(Path("vendor_b") / "service.py")]
+        assert copy.duplicate_of == str(Path("vendor_a") / "service.py"), "Should point at the analyzed copy"
+        original = by_path[copy.duplicate_of]
+        assert [e.name for e in copy.entities] == [e.name for e in original.entities], \
+            "Exact duplicates should share the analyzed entities"
+        assert all(e.file_path == str(root / "vendor_b" / "service.py") for e in copy.entities), \
+            "Shared entities should point at the duplicate's path"
+        assert all(e.file_path == str(root / "vendor_a" / "service.py") for e in original.entities), \
+            "Fanning out should not move the original's entities"
+        
+        extractor = CodebaseExtractor(tmp)
+        hits = extractor.query(name="User", path_glob="vendor_b/*").results
+        assert hits and all(hit.file == str(Path("vendor_b") / "service.py") for hit in hits), \
+            "Query should find entities defined in a duplicated file"
+        assert copy.lines_of_code == by_path[copy.duplicate_of].lines_of_code, "Should fan out line counts"
+        
+        kinds = sorted(group.kind for group in context.duplicate_groups)
+        assert kinds == ["exact", "near"], "Should report one exact and one near group"
+        near = next(group for group in context.duplicate_groups if group.kind == "near")
+        assert str(Path("fork") / "service.py") in [near.representative] + near.duplicates, \
+            "Near duplicate should be grouped"
+        print(f"  ✓ Found {len(context.duplicate_groups)} duplicate groups")
+        
+        output = OutputFormatter.format_markdown(context)
+        assert "## Duplicate Groups" in output, "Markdown should list duplicate groups"
+        print("  ✓ Duplicate groups reported in output")
+    
+    print("✓ Duplicate Detection tests passed\n")
+
+
+def test_near_duplicate_buckets():
+    """Test that near-duplicate LSH skips empty bands and oversized buckets."""
+    print("Testing Near Duplicate Buckets...")
+    
+    from utils import NearDuplicateIndex, similarity_signature
+    
+    # Few shingles leave most bins empty; those bands must not collide
+    index = NearDuplicateIndex()
+    for i in range(20):
+        words = ' '.join(f"file{i}_word{j}" for j in range(70))
+        index.add(i, similarity_signature(words))
+    assert index.groups() == [], "Unrelated small files should not group"
+    empty_band = (1 << 32,) * 4
+    assert not any(chunk == empty_band for _, chunk in index._buckets), \
+        "Bands of empty bins should not be indexed"
+    print("  ✓ Empty-bin bands are not indexed")
+    
+    # A band shared by every file is skipped, true near duplicates still group
+    index = NearDuplicateIndex(bands=4, threshold=0.5, max_bucket=3)
+    shared = (1, 2, 3, 4)
+    for i in range(10):
+        index.add(i, shared + tuple(range(100 * i, 100 * i + 12)))
+    index.add('copy', shared + tuple(range(100 * 9, 100 * 9 + 12)))
+    assert len(index._buckets[(0, shared)]) == 11, "Shared band should collect every file"
+    groups = index.groups()
+    assert [sorted(map(str, members)) for members, _ in groups] == [['9', 'copy']], \
+        "Only the real near duplicates should group"
+    print("  ✓ Unrelated files in a shared bucket stay apart")
+    
+    # Many copies of one file share every band; they must still form one group
+    index = NearDuplicateIndex()
+    base = [f"word{j}" for j in range(300)]
+    for i in range(100):
+        words = list(base)
+        words[i + 100] = f"edit{i}"
+        index.add(i, similarity_signature(' '.join(words)))
+    assert max(len(members) for members in index._buckets.values()) > index.max_bucket, \
+        "Copies should overflow the bucket size"
+    groups = index.groups()
+    assert len(groups) == 1 and sorted(groups[0][0]) == list(range(100)), \
+        "Large groups of near duplicates should not be dropped"
+    print("  ✓ Oversized buckets link members through leaders")
+    
+    print("✓ Near Duplicate Buckets tests passed\n")
+
+
+def test_module_index():
+    """Test index-backed import resolution."""
+    print("Testing Module Index...")
+    
+    from utils import ModuleIndex
+    
+    files = [
+        "src/app/__init__.py",
+        "src/app/models.py",
+        "src/app/api/__init__.py",
+        "src/app/api/views.py",
+        "web/components/index.ts",
+        "web/components/Button.tsx",
+        "web/lib/http.js",
+        "web/main.ts",
+    ]
+    tsconfig = {"compilerOptions": {"baseUrl": "web", "paths": {"@ui/*": ["components/*"]}}}
+    index = ModuleIndex(files, tsconfig)
+    
+    assert index.resolve(".views", "src/app/api/__init__.py") == "src/app/api/views.py", \
+        "Should resolve relative Python imports"
+    assert index.resolve("..models.User", "src/app/api/views.py") == "src/app/models.py", \
+        "Should resolve parent-relative imports of attributes"
+    assert index.resolve("app.api.views", "src/app/models.py") == "src/app/api/views.py", \
+        "Should resolve absolute imports from the package root"
+    assert index.resolve("os.path", "src/app/models.py") is None, "Should leave stdlib unresolved"
+    assert ModuleIndex([*files, "src/app/api/models.py"]).resolve("models", "src/app/api/views.py") is None, \
+        "Sibling modules should not shadow absolute imports"
+    print("  ✓ Python imports resolve")
+    
+    import tempfile
+    from utils import DependencyResolver
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "main.py").write_text("import helpers\n")
+        assert DependencyResolver.resolve_import_path("helpers", "main.py", tmp) is None
+        (Path(tmp) / "helpers.py").write_text("")
+        ModuleIndex.clear_cache()
+        assert DependencyResolver.resolve_import_path("helpers", "main.py", tmp) == "helpers.py", \
+            "Cleared root cache should pick up new files"
+        CodebaseExtractor(tmp)._collect_files()
+        assert not ModuleIndex._root_cache, "Collecting files should clear the root cache"
+    print("  ✓ Root index cache is cleared")
+    
+    assert index.resolve("./components", "web/main.ts") == "web/components/index.ts", \
+        "Should resolve directory index files"
+    assert index.resolve("../lib/http", "web/components/Button.tsx") == "web/lib/http.js", \
+        "Should add extensions"
+    assert index.resolve("@ui/Button", "web/main.ts") == "web/components/Button.tsx", \
+        "Should resolve tsconfig path aliases"
+    assert index.resolve("lib/http", "web/main.ts") == "web/lib/http.js", "Should resolve from baseUrl"
+    assert index.resolve("react", "web/main.ts") is None, "Should leave packages unresolved"
+    assert index.resolve_node_path("web/components") == "web/components/index.ts", \
+        "Root-relative paths should resolve like Node files"
+    assert index.resolve_node_path("../web/main") is None, "Paths outside the root should not resolve"
+    print("  ✓ Node/TypeScript imports resolve")
+    
+    print("✓ Module Index tests passed\n")
+
+
+def test_file_tree():
+    """Test streamed file tree rendering with excludes and collapsing."""
+    print("Testing File Tree...")
+    
+    import tempfile
+    from utils import format_file_tree
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "src").mkdir()
+        (root / "src" / "app.py").write_text("print('hi')\n")
+        (root / "node_modules" / "left-pad").mkdir(parents=True)
+        (root / "generated").mkdir()
+        for i in range(30):
+            (root / "generated" / f"client_{i}.py").write_text("x = 1\n")
+        
+        extractor = CodebaseExtractor(tmp)
+        lines = list(extractor.iter_file_tree(max_depth=3, collapse_threshold=10))
+        tree = "\n".join(lines)
+        
+        assert "app.py" in tree, "Should list regular files"
+        assert "node_modules" not in tree, "Should apply the extractor's excludes"
+        assert "client_0.py" not in tree, "Should collapse large directories"
+        assert "30 entries collapsed (30 files, 0 dirs" in tree, "Should summarize collapsed directories"
+        print("  ✓ Excludes and collapsing applied")
+        
+        plain = format_file_tree(tmp, max_depth=3)
+        assert "client_29.py" in plain, "Should expand everything by default"
+        assert "\n".join(extractor.iter_file_tree(max_depth=3)) == "\n".join(
+            line for line in plain.split("\n") if "node_modules" not in line and "left-pad" not in line), \
+            "Extractor trees should not collapse unless asked"
+        print("  ✓ format_file_tree still returns a string")
+        
+        (root / "src" / "cli.py").write_text("print('cli')\n")
+        assert "cli.py" in "\n".join(extractor.iter_file_tree(max_depth=3)), "Trees should see new files"
+        assert any(path.name == "cli.py" for path in extractor._collect_files()), \
+            "Each walk should list directories afresh"
+        print("  ✓ Listings are rescanned on every walk")
+    
+    print("✓ File Tree tests passed\n")
+
+
+def test_progress_events():
+    """Test structured, time-throttled progress events."""
+    print("Testing Progress Events...")
+    
+    from utils import ProgressReporter
+    
+    now = [0.0]
+    events = []
+    reporter = ProgressReporter(events.append, interval=1.0, clock=lambda: now[0])
+    reporter.start(total_files=4, total_bytes=400)
+    
+    for i in range(4):
+        reporter.file_started(f"f{i}.py")
+        now[0] += 0.4
+        reporter.file_finished(f"f{i}.py", 100)
+    reporter.finish()
+    
+    kinds = [event["event"] for event in events]
+    assert kinds == ["start", "progress", "finish"], "Progress should be throttled by time"
+    progress = events[1]
+    assert progress["files_done"] == 3 and progress["bytes_done"] == 300, "Should report work done"
+    assert abs(progress["bytes_per_s"] - 250.0) < 1e-6, "Should report byte throughput"
+    assert abs(progress["eta_s"] - 0.4) < 1e-6, "ETA should follow remaining bytes"
+    print("  ✓ Events carry throughput and ETA")
+    
+    extractor_events = []
+    extractor = CodebaseExtractor(str(Path(__file__).parent / "examples"),
+                                  progress=ProgressReporter(extractor_events.append, interval=0))
+    extractor.extract_full_context()
+    assert extractor_events[0]["event"] == "start", "Extractor should start a phase"
+    assert extractor_events[-1]["event"] == "finish", "Extractor should finish the phase"
+    assert extractor_events[-1]["files_done"] == extractor_events[-1]["files_total"], \
+        "All files should be reported"
+    print("  ✓ Extractor reports through callbacks")
+    
+    events = []
+    reporter = ProgressReporter(events.append, interval=0, clock=lambda: now[0])
+    reporter.start(total_files=3, total_bytes=300)
+    reporter.batch_started(["a.py", "b.py"])
+    reporter.file_started("c.py")
+    now[0] += 1.0
+    reporter.file_finished("c.py", 100)
+    assert events[-1]["slowest_in_flight"]["path"] == "a.py", "Running batches are named by their first file"
+    reporter.batch_finished(["a.py", "b.py"], 200)
+    assert events[-1]["files_done"] == 3 and events[-1]["slowest_in_flight"] is None, \
+        "Finished batches should count every file"
+    print("  ✓ Batches of files are tracked as one unit")
+    
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(40):
+            (Path(tmp) / f"mod{i:02d}.py").write_text(f"def func{i}():\n    return {i}\n" + "x = 1\n" * i)
+        summary = lambda ctx: [(fc.path, fc.lines_of_code, [e.name for e in fc.entities]) for fc in ctx.files]
+        serial = CodebaseExtractor(tmp, progress=ProgressReporter(lambda event: None)).extract_full_context()
+        batch_events = []
+        parallel = CodebaseExtractor(tmp, jobs=2, detect_duplicates=False,
+                                     progress=ProgressReporter(batch_events.append, interval=0))
+        assert summary(parallel.extract_full_context()) == summary(serial), \
+            "Batched worker results should come back in file order"
+        assert batch_events[-1]["files_done"] == 40, "Every file of every batch should be counted"
+    print("  ✓ Worker batches are yielded in order")
+    
+    print("✓ Progress Events tests passed\n")
+
+
+def test_disk_backed_context():
+    """Test contexts whose files live in an on-disk segment store."""
+    print("Testing Disk-Backed Context...")
+    
+    import tempfile
+    from context_extractor import DiskBackedCodebaseContext
+    from utils import SegmentStore
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "project"
+        for package in ("core", "api"):
+            (root / package).mkdir(parents=True)
+            for i in range(5):
+                (root / package / f"mod_{i}.py").write_text(
+                    f"import os\n\nclass {package.title()}{i}:\n    def run(self):\n        return {i}\n"
+                )
+        (root / "api" / "copy_of_core.py").write_bytes((root / "core" / "mod_0.py").read_bytes())
+        
+        in_memory = CodebaseExtractor(str(root)).extract_full_context()
+        extractor = CodebaseExtractor(str(root), store_dir=str(Path(tmp) / "store"))
+        on_disk = extractor.extract_full_context()
+        assert isinstance(on_disk, DiskBackedCodebaseContext), "Should return a disk-backed context"
+        assert len(on_disk.files) == len(in_memory.files) == 11, "Should store every file"
+        assert on_disk.files[-1] == in_memory.files[-1], "Indexing should load the stored file"
+        assert list(on_disk.files) == in_memory.files, "Iteration should yield every file in order"
+        print("  ✓ Files are indexed and iterated from disk")
+        
+        assert isinstance(on_disk.duplicate_groups, SegmentStore), "Duplicate groups should be stored"
+        assert list(on_disk.duplicate_groups) == in_memory.duplicate_groups and in_memory.duplicate_groups, \
+            "Stored duplicate groups should match"
+        assert not isinstance(on_disk.dependency_graph, dict), "The graph should not be copied into memory"
+        assert dict(on_disk.dependency_graph.items()) == in_memory.dependency_graph, \
+            "The graph should be read from the stored imports"
+        assert on_disk.dependency_graph["core/mod_1.py"] == ["os"] and "missing.py" not in on_disk.dependency_graph
+        print("  ✓ Duplicate groups and imports are read from disk")
+        
+        for output_format in ("markdown", "json", "text", "yaml"):
+            expected = OutputFormatter._render(
+                lambda data, out: OutputFormatter.write(data, output_format, out), in_memory)
+            actual = OutputFormatter._render(
+                lambda data, out: OutputFormatter.write(data, output_format, out), on_disk)
+            assert actual == expected, f"{output_format} output should match the in-memory context"
+        compact = OutputFormatter._render(
+            lambda data, out: OutputFormatter.write_json(data, out, compact=True), on_disk)
+        assert compact == OutputFormatter._render(
+            lambda data, out: OutputFormatter.write_json(data, out, compact=True), in_memory), \
+            "Compact JSON should match the in-memory context"
+        print("  ✓ Formatters stream the same output")
+        on_disk.close()
+        
+        reopened = DiskBackedCodebaseContext.open(str(Path(tmp) / "store"))
+        assert reopened.total_files == 11 and reopened.files[3] == in_memory.files[3], \
+            "Reopened context should read the saved store"
+        assert list(reopened.duplicate_groups) == in_memory.duplicate_groups and \
+            dict(reopened.dependency_graph.items()) == in_memory.dependency_graph, \
+            "Reopened context should read the stored groups and imports"
+        reopened.close()
+        
+        for path in list((root / "core").iterdir())[1:]:
+            path.unlink()
+        smaller = CodebaseExtractor(str(root), store_dir=str(Path(tmp) / "store")).extract_full_context()
+        smaller.close()
+        reopened = DiskBackedCodebaseContext.open(str(Path(tmp) / "store"))
+        assert list(reopened.files) == CodebaseExtractor(str(root)).extract_full_context().files, \
+            "Reusing a store directory should not keep records of the earlier run"
+        reopened.close()
+        print("  ✓ Contexts reopen from disk and store directories can be reused")
+        
+        store = SegmentStore(str(Path(tmp) / "small"), segment_bytes=64, cache_size=2)
+        for i in range(20):
+            store.append({"value": i})
+        assert len(list(store.directory.glob("segment-*.bin"))) > 1, "Should roll over segments"
+        assert [store[i]["value"] for i in (0, 19, 5, -1)] == [0, 19, 5, 19], "Should read any record"
+        assert [record["value"] for record in store[2:5]] == [2, 3, 4], "Should support slices"
+        assert len(store._cache) <= 2, "LRU should stay bounded"
+        store.close()
+        
+        store = SegmentStore(str(Path(tmp) / "small"), segment_bytes=64)
+        store.append({"value": "new"})
+        store.close()
+        assert len(list(store.directory.glob("segment-*.bin"))) == 1, "Stale segments should be removed"
+        store = SegmentStore.open(str(Path(tmp) / "small"))
+        assert list(store) == [{"value": "new"}], "Reopening should read only the new records"
+        store.close()
+        print("  ✓ Segments roll over with a bounded LRU and are cleared on reuse")
+    
+    print("✓ Disk-Backed Context tests passed\n")
+
+
+def test_query_api():
+    """Test index-backed entity queries with pagination."""
+    print("Testing Query API...")
+    
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "core").mkdir()
+        (root / "web").mkdir()
+        for i in range(3):
+            (root / "core" / f"model_{i}.py").write_text(
+                f"class Model{i}:\n    def save(self):\n        pass\n\ndef load_{i}():\n    pass\n"
+            )
+        (root / "web" / "app.js").write_text("function save() {}\nclass View {}\n")
+        
+        extractor = CodebaseExtractor(str(root))
+        classes = extractor.query(language="Python", entity_type="class")
+        assert [r.entity.name for r in classes.results] == ["Model0", "Model1", "Model2"], \
+            "Should filter by language and type"
+        assert classes.next_cursor is None, "Single page should have no cursor"
+        
+        saves = extractor.query(name="SAVE")
+        assert {r.language for r in saves.results} == {"Python", "JavaScript"}, \
+            "Name lookup should be case-insensitive across languages"
+        assert [r.file for r in extractor.query(path_glob="web/*").results] == ["web/app.js"] * 2, \
+            "Should filter by path glob"
+        assert [r.entity.name for r in extractor.query(name="load_*").results] == \
+            ["load_0", "load_1", "load_2"], "Should support name wildcards"
+        print("  ✓ Filters narrow results")
+        
+        pages, cursor = [], None
+        while True:
+            page = extractor.query(path_glob="core/*", limit=5, cursor=cursor)
+            pages.append(page.results)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert [len(results) for results in pages] == [5, 5, 2], "Should paginate by limit"
+        streamed = list(extractor.iter_query(path_glob="core/*"))
+        assert streamed == [r for results in pages for r in results], \
+            "Pages should match the streamed results"
+        print("  ✓ Pages follow cursors without gaps")
+        
+        assert extractor.query(language="Rust").results == [], "Unknown language should match nothing"
+        try:
+            extractor.query(cursor="bogus")
+            assert False, "Invalid cursor should raise"
+        except ValueError:
+            pass
+        print("  ✓ Empty and invalid queries are handled")
+    
+    print("✓ Query API tests passed\n")
+
+
+def test_deferred_docstrings():
+    """Test docstring summaries with on-demand loading of full text and source."""
+    print("Testing Deferred Docstrings...")
+    
+    import codecs
+    import tempfile
+    from context_extractor import load_docstring, load_source
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        source = (
+            "import os\r\n\r\n"
+            "@staticmethod\r\n"
+            "def caf\u00e9(x):\r\n"
+            "    \"\"\"Brew a coffee \u2615.\r\n\r\n    Long description\r\n    spanning lines.\r\n    \"\"\"\r\n"
+            "    return x\r\n"
+        )
+        path = Path(tmp) / "brew.py"
+        path.write_bytes(source.encode("utf-8"))
+        
+        entity = PythonAnalyzer(str(path)).extract_entities()[0]
+        assert entity.docstring == "Brew a coffee \u2615.", "Should keep only the summary line"
+        assert load_docstring(entity) == "Brew a coffee \u2615.\n\nLong description\nspanning lines.", \
+            "Should load the full docstring from its byte range"
+        assert load_source(entity).startswith("@staticmethod\r\ndef caf\u00e9(x):"), \
+            "Source should start at the decorator"
+        assert load_source(entity).endswith("return x"), "Source should end with the body"
+        print("  ✓ Byte ranges survive CRLF and non-ASCII text")
+        
+        path.write_bytes(source.replace("\r\n", "\r").encode("utf-8"))
+        entity = PythonAnalyzer(str(path)).extract_entities()[0]
+        assert load_source(entity) == "@staticmethod\rdef caf\u00e9(x):\r" + \
+            source.split("(x):\r\n", 1)[1].replace("\r\n", "\r").rstrip("\r"), \
+            "Byte ranges should follow CR-only line endings"
+        print("  ✓ Byte ranges survive CR-only line endings")
+        
+        analyzer = PythonAnalyzer(str(path))
+        path.unlink()
+        entity = analyzer.extract_entities()[0]
+        path.write_bytes(source.replace("\r\n", "\r").encode("utf-8"))
+        assert load_source(entity).startswith("@staticmethod\rdef café(x):"), \
+            "Spans should come from the bytes read when the analyzer was created"
+        
+        one_liner = "def café(): \"Résumé à la carte.\"\n"
+        variants = {
+            "bom.py": codecs.BOM_UTF8 + one_liner.encode("utf-8"),
+            "latin.py": ("# -*- coding: latin-1 -*-\n" + one_liner).encode("latin-1"),
+            "broken.py": one_liner.encode("utf-8").replace(b"caf", b"c\xffaf"),
+        }
+        (Path(tmp) / "encodings").mkdir()
+        for name, data in variants.items():
+            (Path(tmp) / "encodings" / name).write_bytes(data)
+            entity = PythonAnalyzer(str(Path(tmp) / "encodings" / name)).extract_entities()[0]
+            assert entity.name == "café", f"{name} should parse"
+            assert load_source(entity) == one_liner.rstrip("\n"), f"{name} source span should match"
+            assert load_docstring(entity) == "Résumé à la carte.", f"{name} docstring span should match"
+        print("  ✓ Byte ranges survive a BOM, declared encodings and undecodable bytes")
+        
+        targeted = CodebaseExtractor(tmp, exclude_patterns=["*/encodings/*"]).extract_targeted_context(
+            "caf", include_source=True)
+        match = targeted["matches"][0]
+        assert match["docstring"].endswith("spanning lines.") and "return x" in match["source"], \
+            "Targeted mode should include source on request"
+        assert "source" not in CodebaseExtractor(tmp).extract_targeted_context("caf")["matches"][0], \
+            "Source should be omitted by default"
+        print("  ✓ Targeted mode loads source on request")
+    
+    print("✓ Deferred Docstrings tests passed\n")
+
+
+def test_workspace():
+    """Test multi-root workspaces with cross-root dependency edges."""
+    print("Testing Workspace...")
+    
+    import tempfile
+    from context_extractor import WorkspaceContext, WorkspaceExtractor
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "shared" / "common").mkdir(parents=True)
+        (tmp / "shared" / "common" / "__init__.py").write_text("")
+        (tmp / "shared" / "common" / "helpers.py").write_text("def helper():\n    return 1\n")
+        (tmp / "shared" / "index.js").write_text("function share() {}\n")
+        (tmp / "service" / "app").mkdir(parents=True)
+        (tmp / "service" / "app" / "main.py").write_text(
+            "from common.helpers import helper\nfrom .local import thing\n\ndef main():\n    helper()\n")
+        (tmp / "service" / "app" / "local.py").write_text("thing = 1\n")
+        (tmp / "web").mkdir()
+        (tmp / "web" / "client.js").write_text(
+            "import { share } from '../shared/index';\nconst s = require('shared');\n")
+        # The same file vendored in two roots is analyzed once
+        (tmp / "web" / "helpers.py").write_text("def helper():\n    return 1\n")
+        
+        roots = [str(tmp / "service"), str(tmp / "shared"), str(tmp / "web")]
+        extractor = WorkspaceExtractor(roots)
+        context = extractor.extract_full_context()
+        assert isinstance(context, WorkspaceContext), "Should return a workspace context"
+        assert {root.name: root.total_files for root in context.roots} == \
+            {"service": 2, "shared": 3, "web": 2}, "Should report per-root stats"
+        assert any(group.kind == "exact" and group.duplicates == ["web/helpers.py"]
+                   for group in context.duplicate_groups), "Identical files across roots should be grouped"
+        markdown = OutputFormatter.format_markdown(context)
+        assert "## Workspace Roots" in markdown and "**shared**" in markdown, "Markdown should list roots"
+        print("  ✓ Roots are analyzed in one run with per-root stats")
+        
+        graph = extractor.extract_dependency_graph()
+        edges = {(e["from"], e["to"]): e for e in graph["edges"]}
+        main_py = str(Path("service/app/main.py"))
+        assert edges[(main_py, "common.helpers.helper")]["resolved"] == str(Path("shared/common/helpers.py")), \
+            "Absolute Python imports should resolve into another root"
+        assert edges[(main_py, ".local.thing")]["cross_root"] is False, "Local imports stay within the root"
+        client = str(Path("web/client.js"))
+        assert edges[(client, "../shared/index")]["resolved"] == str(Path("shared/index.js")), \
+            "Relative imports should follow into sibling roots"
+        assert edges[(client, "shared")]["resolved"] == str(Path("shared/index.js")), \
+            "Bare specifiers naming a root should resolve to it"
+        assert {(e["from_root"], e["to_root"]): e["imports"] for e in graph["cross_root_edges"]} == \
+            {("service", "shared"): 1, ("web", "shared"): 2}, "Should count cross-root edges"
+        print("  ✓ Imports become cross-root edges")
+        
+        import pickle
+        parallel = WorkspaceExtractor(roots, jobs=2)
+        assert "_root_of" not in pickle.loads(pickle.dumps(parallel)).__dict__, \
+            "Workers should not receive the per-file root map"
+        summary = lambda ctx: sorted((fc.path, fc.duplicate_of, [e.name for e in fc.entities])
+                                     for fc in ctx.files)
+        assert summary(parallel.extract_full_context()) == summary(context), \
+            "Parallel workspace analysis should match serial analysis"
+        print("  ✓ Worker processes report workspace paths")
+    
+    print("✓ Workspace tests passed\n")
+
+
+def test_archive_input():
+    """Test analyzing zip and tar archives without extracting them."""
+    print("Testing Archive Input...")
+    
+    import tarfile
+    import tempfile
+    import zipfile
+    from context_extractor import ArchiveExtractor
+    from utils import ArchiveReader, ExcludeMatcher
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        project = tmp / "project"
+        (project / "pkg").mkdir(parents=True)
+        (project / "node_modules" / "dep").mkdir(parents=True)
+        (project / "pkg" / "core.py").write_text(
+            "from .util import helper\n\nclass Engine:\n    \"\"\"Runs things.\"\"\"\n    def run(self):\n        return helper()\n")
+        (project / "pkg" / "util.py").write_text("def helper():\n    return 1\n")
+        (project / "pkg" / "util_copy.py").write_text("def helper():\n    return 1\n")
+        (project / "node_modules" / "dep" / "index.js").write_text("function dep() {}\n")
+        
+        with zipfile.ZipFile(tmp / "project.zip", "w") as archive:
+            for path in sorted(project.rglob("*")):
+                archive.write(path, str(path.relative_to(tmp)))
+        with tarfile.open(tmp / "project.tar.gz", "w:gz") as archive:
+            archive.add(project, "project")
+        
+        expected = CodebaseExtractor(str(tmp), exclude_patterns=["*.zip", "*.tar.gz"]).extract_full_context()
+        summary = lambda context: sorted(
+            (fc.path, fc.lines_of_code, fc.duplicate_of, [e.name for e in fc.entities]) for fc in context.files)
+        
+        for name in ("project.zip", "project.tar.gz"):
+            extractor = CodebaseExtractor.for_target(str(tmp / name))
+            assert isinstance(extractor, ArchiveExtractor), "Archives should get an archive extractor"
+            context = extractor.extract_full_context()
+            assert summary(context) == summary(expected), f"{name} should match the extracted tree"
+            assert [(g.representative, g.duplicates) for g in context.duplicate_groups] == \
+                [(g.representative, g.duplicates) for g in expected.duplicate_groups], \
+                f"{name} should group duplicates"
+            entity = next(e for fc in context.files for e in fc.entities if e.name == "Engine")
+            assert entity.docstring == "Runs things.", "Analyzers should read member bytes"
+            match = extractor.extract_targeted_context("Engine", include_source=True)["matches"][0]
+            assert match["docstring"] == "Runs things." and match["source"].startswith("class Engine:"), \
+                f"{name} should load source from member bytes"
+        try:
+            CodebaseExtractor.for_target(str(tmp / "project.zip")).extract_summary()
+            assert False, "Summary mode should reject archives"
+        except ValueError:
+            pass
+        print("  ✓ Zip and tar archives match the extracted tree")
+        
+        reader = ArchiveReader(str(tmp / "project.zip"), ExcludeMatcher(["*/node_modules/*"]))
+        names = [name for name, _, _ in reader.members()]
+        assert names and not any("node_modules" in name for name in names), \
+            "Excluded members should be skipped by name"
+        assert [name for name, _ in reader.listing()] == names, "Zip listing should match the members"
+        print("  ✓ Exclude patterns apply to member names")
+    
+    print("✓ Archive Input tests passed\n")
+
+
+def test_git_revision():
+    """Test analyzing git revisions from the object store with a blob cache."""
+    print("Testing Git Revisions...")
+    
+    import shutil
+    import subprocess
+    import tempfile
+    from context_extractor import AnalysisBudget, GitRevisionExtractor
+    
+    if shutil.which("git") is None:
+        print("  - git not available, skipping")
+        print("✓ Git Revisions tests passed\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Path(tmp) / "repo"
+        (repo / "pkg").mkdir(parents=True)
+        (repo / "node_modules" / "dep").mkdir(parents=True)
+        git = lambda *args: subprocess.run(["git", "-C", str(repo), *args], check=True,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        git("init", "-q")
+        git("config", "user.email", "dev@example.com")
+        git("config", "user.name", "Dev")
+        
+        (repo / "pkg" / "core.py").write_text("from .util import helper\n\ndef main():\n    return helper()\n")
+        (repo / "pkg" / "util.py").write_text("def helper():\n    return 1\n")
+        (repo / "node_modules" / "dep" / "index.js").write_text("function dep() {}\n")
+        git("add", "-A")
+        git("commit", "-qm", "first")
+        expected = CodebaseExtractor(str(repo), exclude_patterns=["*/.git/*"]).extract_full_context()
+        
+        (repo / "pkg" / "extra.py").write_text("def extra():\n    pass\n")
+        git("add", "-A")
+        git("commit", "-qm", "second")
+        # Uncommitted edits must not leak into revision analysis
+        (repo / "pkg" / "util.py").write_text("def changed():\n    pass\n")
+        
+        # The cache directory and its parents are created on first use
+        cache_dir = str(Path(tmp) / "cache" / "revisions")
+        first = GitRevisionExtractor(str(repo), "HEAD~1", cache_dir=cache_dir)
+        context = first.extract_full_context()
+        first.close()
+        summary = lambda ctx: sorted((fc.path, fc.lines_of_code, [e.name for e in fc.entities])
+                                     for fc in ctx.files)
+        assert summary(context) == summary(expected), "Revision should match its checkout"
+        assert first.cache_hits == 0, "First run should analyze every blob"
+        print("  ✓ Revisions are read from the object store")
+        
+        second = GitRevisionExtractor(str(repo), "HEAD", cache_dir=cache_dir)
+        context = second.extract_full_context()
+        second.close()
+        assert second.cache_hits == 2, "Unchanged blobs should come from the cache"
+        assert [fc.path for fc in context.files if "extra" in fc.path] == [str(Path("pkg/extra.py"))], \
+            "New files should be analyzed"
+        assert not any("node_modules" in fc.path for fc in context.files), "Excluded trees should be pruned"
+        print("  ✓ Unchanged blobs reuse cached analyses")
+        
+        budgeted = GitRevisionExtractor(str(repo), "HEAD", cache_dir=cache_dir,
+                                        budget=AnalysisBudget(max_file_bytes=1))
+        context = budgeted.extract_full_context()
+        budgeted.close()
+        assert budgeted.cache_hits == 0, "Other budgets should not reuse cached analyses"
+        assert all(fc.degraded for fc in context.files), "The new budget should apply"
+        GitRevisionExtractor.CACHE_VERSION += 1
+        try:
+            bumped = GitRevisionExtractor(str(repo), "HEAD", cache_dir=cache_dir)
+            bumped.extract_full_context()
+            bumped.close()
+        finally:
+            GitRevisionExtractor.CACHE_VERSION -= 1
+        assert bumped.cache_hits == 0, "A new cache version should not reuse cached analyses"
+        print("  ✓ Cached analyses are keyed by version and budget")
+        
+        targeted = GitRevisionExtractor(str(repo), "HEAD", cache_dir=cache_dir)
+        match = targeted.extract_targeted_context("helper", include_source=True)["matches"][0]
+        targeted.close()
+        assert match["source"] == "def helper():\n    return 1", \
+            "Source should come from the revision, not the working tree"
+        print("  ✓ Targeted mode loads source from blobs")
+        
+        try:
+            GitRevisionExtractor(str(repo), "no-such-rev", cache_dir=cache_dir)
+            assert False, "Unknown revisions should raise"
+        except ValueError:
+            pass
+        print("  ✓ Unknown revisions are rejected")
+    
+    print("✓ Git Revisions tests passed\n")
+
+
 def run_all_tests():
     """Run all tests."""
     print("=" * 60)
@@ -209,6 +1113,22 @@ def run_all_tests():
         test_javascript_analyzer()
         test_codebase_extractor()
         test_output_formatters()
+        test_streaming_formatters()
+        test_context_encoder()
+        test_metrics_engine()
+        test_analysis_budget()
+        test_summary_sampling()
+        test_duplicate_detection()
+        test_near_duplicate_buckets()
+        test_module_index()
+        test_file_tree()
+        test_progress_events()
+        test_disk_backed_context()
+        test_query_api()
+        test_deferred_docstrings()
+        test_workspace()
+        test_archive_input()
+        test_git_revision()
         
         print("=" * 60)
         print("✓ ALL TESTS PASSED")
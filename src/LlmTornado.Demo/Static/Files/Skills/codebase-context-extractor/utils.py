@@ -4,21 +4,359 @@ Utility functions for the Codebase Context Extractor.
 """
 
 import os
+import ast
+import fnmatch
+import posixpath
+import re
+import sys
 import json
+import time
 import yaml
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, List, Any, Optional, Iterable, Iterator, TextIO, Tuple
 import hashlib
+import mmap
 import pickle
+import subprocess
+import tarfile
+import zipfile
+import zlib
 from datetime import datetime, timedelta
 
 
+class ExcludeMatcher:
+    """Matches paths against many fnmatch patterns with one compiled regex."""
+    
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        translated = [fnmatch.translate(os.path.normcase(p)) for p in self.patterns]
+        self._regex = re.compile('|'.join(translated)) if translated else None
+    
+    def matches(self, path: str) -> bool:
+        """Check whether a path matches any pattern."""
+        return bool(self._regex and self._regex.match(os.path.normcase(path)))
+
+
+class DirectoryWalker:
+    """
+    os.scandir-based directory walker that caches listings.
+    
+    Each directory is scanned at most once; excluded entries are dropped and
+    the rest sorted (directories first). The cached os.DirEntry objects keep
+    their own is_dir/stat results, so repeated walks, tree rendering and size
+    lookups do not hit the filesystem again. Listings are cached until
+    clear_cache(); extractors clear it at the start of every walk, so changes
+    to the tree are picked up like ModuleIndex.clear_cache() does for indexes.
+    """
+    
+    def __init__(self, exclude: Optional[ExcludeMatcher] = None):
+        self.exclude = exclude
+        self._listings: Dict[str, List[os.DirEntry]] = {}
+    
+    def clear_cache(self) -> None:
+        """Drop the cached listings, so the next walk scans the tree again."""
+        self._listings.clear()
+    
+    def listdir(self, directory: str) -> List[os.DirEntry]:
+        """Return the filtered, sorted entries of a directory."""
+        directory = str(directory)
+        listing = self._listings.get(directory)
+        if listing is not None:
+            return listing
+        
+        listing = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    # Directories are matched with a trailing separator so that
+                    # patterns like '*/node_modules/*' prune the whole subtree
+                    if self.exclude and self.exclude.matches(entry.path + os.sep if is_dir else entry.path):
+                        continue
+                    listing.append(entry)
+        except OSError:
+            pass
+        
+        listing.sort(key=lambda e: (not e.is_dir(), e.name))
+        self._listings[directory] = listing
+        return listing
+    
+    def walk_files(self, root: str) -> Iterator[os.DirEntry]:
+        """Yield every non-excluded file below root, depth-first in sorted order."""
+        stack = [str(root)]
+        while stack:
+            directory = stack.pop()
+            subdirectories = []
+            for entry in self.listdir(directory):
+                if entry.is_dir():
+                    # Like os.walk, list symlinked directories but do not follow them
+                    if not entry.is_symlink():
+                        subdirectories.append(entry.path)
+                else:
+                    yield entry
+            stack.extend(reversed(subdirectories))
+    
+    @staticmethod
+    def size(entry: os.DirEntry) -> int:
+        """Size of a file entry from its cached stat result."""
+        try:
+            return entry.stat().st_size
+        except OSError:
+            return 0
+
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.xz', '.txz', '.tar.bz2', '.tbz2')
+
+
+def is_archive(path: str) -> bool:
+    """Whether a path is a source archive that ArchiveReader can read."""
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+class ArchiveReader:
+    """
+    Single-pass reader of .zip and tar source archives.
+    
+    Members are visited in archive order and filtered by name before their
+    contents are read, and nothing is extracted to disk. Member paths are
+    matched against the exclude patterns as if the archive were a directory
+    (``<archive path>/<member>``), including each parent directory, so that
+    patterns prune subtrees just as DirectoryWalker does. Tar archives are
+    read as a stream, so compressed tarballs are decompressed exactly once.
+    """
+    
+    def __init__(self, path: str, exclude: Optional[ExcludeMatcher] = None):
+        self.path = str(path)
+        self.exclude = exclude
+        self._excluded_dirs: Dict[str, bool] = {}
+    
+    @property
+    def is_zip(self) -> bool:
+        return self.path.lower().endswith('.zip')
+    
+    def virtual_path(self, name: str) -> str:
+        """Filesystem-style path of a member below the archive path."""
+        return os.path.join(self.path, *name.split('/'))
+    
+    @staticmethod
+    def _normalize(name: str) -> Optional[str]:
+        """Normalized member path, or None for names outside the archive root."""
+        name = posixpath.normpath(name.replace('\\', '/').lstrip('/'))
+        if name in ('', '.', '..') or name.startswith('../'):
+            return None
+        return name
+    
+    def _excluded(self, name: str) -> bool:
+        if not self.exclude:
+            return False
+        directory = posixpath.dirname(name)
+        while directory:
+            excluded = self._excluded_dirs.get(directory)
+            if excluded is None:
+                excluded = self.exclude.matches(self.virtual_path(directory) + os.sep)
+                self._excluded_dirs[directory] = excluded
+            if excluded:
+                return True
+            directory = posixpath.dirname(directory)
+        return self.exclude.matches(self.virtual_path(name))
+    
+    def _accept(self, raw_name: str, wanted: Callable[[str], bool]) -> Optional[str]:
+        name = self._normalize(raw_name)
+        if name is None or self._excluded(name) or not wanted(name):
+            return None
+        return name
+    
+    def listing(self, wanted: Callable[[str], bool] = lambda name: True) -> Optional[List[Tuple[str, int]]]:
+        """
+        (member path, size) of the wanted files when the archive has a
+        central directory (zip), read without decompressing anything.
+        
+        Returns:
+            The listing, or None for tar archives, whose members are only
+            known by reading through the stream
+        """
+        if not self.is_zip:
+            return None
+        with zipfile.ZipFile(self.path) as archive:
+            listing = []
+            for info in archive.infolist():
+                name = None if info.is_dir() else self._accept(info.filename, wanted)
+                if name is not None:
+                    listing.append((name, info.file_size))
+            return listing
+    
+    def members(self, wanted: Callable[[str], bool] = lambda name: True) -> Iterator[Tuple[str, int, BinaryIO]]:
+        """
+        Yield (member path, size, binary file object) for each wanted regular file.
+        
+        Each file object is only valid until the next member is requested.
+        Excluded and unwanted members are skipped without being read.
+        """
+        if self.is_zip:
+            with zipfile.ZipFile(self.path) as archive:
+                for info in archive.infolist():
+                    name = None if info.is_dir() else self._accept(info.filename, wanted)
+                    if name is None:
+                        continue
+                    with archive.open(info) as member:
+                        yield name, info.file_size, member
+            return
+        
+        with tarfile.open(self.path, mode='r|*') as archive:
+            for info in archive:
+                name = self._accept(info.name, wanted) if info.isfile() else None
+                if name is None:
+                    continue
+                yield name, info.size, archive.extractfile(info)
+
+
+class _BlobStream:
+    """Binary reader over one object's contents in a ``cat-file --batch`` stream."""
+    
+    def __init__(self, pipe: BinaryIO, size: int):
+        self._pipe = pipe
+        self._remaining = size
+    
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._pipe.read(size)
+        self._remaining -= len(data)
+        if self._remaining == 0 or not data:
+            self._remaining = 0
+            self._pipe.read(1)  # newline terminating the object
+        return data
+    
+    def drain(self) -> None:
+        while self.read(1 << 20):
+            pass
+
+
+class GitObjectReader:
+    """
+    Reads trees and blobs of a local repository through one persistent
+    ``git cat-file --batch`` process, without a checkout.
+    
+    Trees are parsed directly, so excluded directories are pruned without
+    reading anything below them.
+    """
+    
+    SUBMODULE_MODE = b'160000'
+    SYMLINK_MODE = b'120000'
+    TREE_MODE = b'40000'
+    
+    def __init__(self, repo_path: str):
+        self.repo_path = str(repo_path)
+        self._process: Optional[subprocess.Popen] = None
+        self._current: Optional[_BlobStream] = None
+    
+    def _git(self, *args: str) -> str:
+        result = subprocess.run(['git', '-C', self.repo_path, *args],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            message = result.stderr.decode('utf-8', errors='replace').strip()
+            raise ValueError(f"git {' '.join(args)} failed: {message}")
+        return result.stdout.decode('utf-8').strip()
+    
+    def rev_parse(self, rev: str) -> str:
+        """Full object name of a revision's commit"""
+        if rev.startswith('-'):
+            raise ValueError(f"Invalid revision: {rev}")
+        try:
+            return self._git('rev-parse', '--verify', '--quiet', f'{rev}^{{commit}}')
+        except ValueError as e:
+            # --quiet leaves stderr empty when only the revision is unknown
+            if str(e).endswith('failed: '):
+                raise ValueError(f"Unknown revision: {rev}") from None
+            raise
+    
+    def git_dir(self) -> str:
+        """Absolute path of the repository's .git directory"""
+        return os.path.join(self.repo_path, self._git('rev-parse', '--git-dir'))
+    
+    def open(self, name: str) -> Tuple[str, int, BinaryIO]:
+        """
+        Start reading an object.
+        
+        Returns:
+            (type, size, stream); the stream is only valid until the next call
+        """
+        if self._process is None:
+            self._process = subprocess.Popen(['git', '-C', self.repo_path, 'cat-file', '--batch'],
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        if self._current is not None:
+            self._current.drain()
+        
+        self._process.stdin.write(name.encode('utf-8') + b'\n')
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().split()
+        if len(header) != 3:
+            raise ValueError(f"Object not found: {name}")
+        self._current = _BlobStream(self._process.stdout, int(header[2]))
+        return header[1].decode('ascii'), int(header[2]), self._current
+    
+    def read(self, name: str) -> Tuple[str, bytes]:
+        """(type, contents) of an object"""
+        kind, _, stream = self.open(name)
+        return kind, stream.read()
+    
+    def iter_tree(self, rev: str, prune: Optional[Callable[[str], bool]] = None
+                  ) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (path, blob name) of every regular file in a revision, depth-first
+        in git's tree order. Directories for which `prune(path)` is true are
+        skipped; submodules and symlinks are not followed.
+        """
+        root = self.rev_parse(rev)
+        _, data = self.read(f'{root}^{{tree}}')
+        hash_size = len(root) // 2
+        stack = [('', data)]
+        while stack:
+            prefix, data = stack.pop()
+            subtrees = []
+            position = 0
+            while position < len(data):
+                space = data.index(b' ', position)
+                nul = data.index(b'\0', space)
+                mode = data[position:space]
+                name = data[space + 1:nul].decode('utf-8', errors='surrogateescape')
+                object_name = data[nul + 1:nul + 1 + hash_size].hex()
+                position = nul + 1 + hash_size
+                
+                path = f'{prefix}{name}'
+                if mode == self.TREE_MODE:
+                    if not (prune and prune(path)):
+                        subtrees.append((path, object_name))
+                elif mode not in (self.SUBMODULE_MODE, self.SYMLINK_MODE):
+                    yield path, object_name
+            for path, object_name in reversed(subtrees):
+                stack.append((path + '/', self.read(object_name)[1]))
+    
+    def close(self) -> None:
+        """Stop the cat-file process"""
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+            self._current = None
+
+
 class CacheManager:
     """Manages caching of analysis results."""
     
     def __init__(self, cache_dir: str = ".context_cache", expiry_hours: int = 24):
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.expiry_hours = expiry_hours
     
     def _get_cache_key(self, target_path: str, mode: str) -> str:
@@ -67,6 +405,134 @@ class CacheManager:
             cache_file.unlink()
 
 
+class SegmentStore(Sequence):
+    """
+    Append-only, disk-backed sequence of pickled records.
+    
+    Records are appended to segment files of bounded size and read back on
+    demand through memory-mapped segments, with an LRU of recently used
+    records. Only the per-record offsets are kept in memory. Records read
+    from the store are snapshots; mutating them does not update the store.
+    
+    With ``clear`` (the default), segments and an index left in
+    ``directory`` by an earlier store are removed first, so a reused
+    directory never mixes records from different runs. ``open`` reads an
+    existing store instead.
+    """
+    
+    INDEX_FILE = 'index.pickle'
+    SEGMENT_PATTERN = 'segment-*.bin'
+    
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 cache_size: int = 256, clear: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if clear:
+            for stale in (*self.directory.glob(self.SEGMENT_PATTERN), self.directory / self.INDEX_FILE):
+                stale.unlink(missing_ok=True)
+        self.segment_bytes = segment_bytes
+        self.cache_size = cache_size
+        
+        self._segments = array('I')
+        self._offsets = array('Q')
+        self._lengths = array('Q')
+        self._segment_count = 0
+        
+        self._writer = None
+        self._writer_size = 0
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._cache: 'OrderedDict[int, Any]' = OrderedDict()
+    
+    @classmethod
+    def open(cls, directory: str, **kwargs) -> 'SegmentStore':
+        """Reopen a store written and flushed earlier."""
+        store = cls(directory, clear=False, **kwargs)
+        with open(store.directory / cls.INDEX_FILE, 'rb') as f:
+            store._segments, store._offsets, store._lengths, store._segment_count = pickle.load(f)
+        return store
+    
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:05d}.bin"
+    
+    def append(self, record: Any) -> int:
+        """Store a record and return its index."""
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._writer is None or (self._writer_size and
+                                    self._writer_size + len(data) > self.segment_bytes):
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = open(self._segment_path(self._segment_count), 'wb')
+            self._writer_size = 0
+            self._segment_count += 1
+        
+        self._segments.append(self._segment_count - 1)
+        self._offsets.append(self._writer_size)
+        self._lengths.append(len(data))
+        self._writer.write(data)
+        self._writer_size += len(data)
+        return len(self._offsets) - 1
+    
+    def _read(self, index: int) -> bytes:
+        segment, offset, length = self._segments[index], self._offsets[index], self._lengths[index]
+        if self._writer is not None and segment == self._segment_count - 1:
+            self._writer.flush()
+        
+        mapped = self._maps.get(segment)
+        if mapped is None or offset + length > len(mapped):
+            # (Re)map segments that were still growing when last mapped
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped[offset:offset + length]
+    
+    def __len__(self) -> int:
+        return len(self._offsets)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('SegmentStore index out of range')
+        
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        
+        record = pickle.loads(self._read(index))
+        self._cache[index] = record
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return record
+    
+    def __iter__(self) -> Iterator[Any]:
+        # Sequential scans bypass the LRU so they do not evict hot records
+        for index in range(len(self)):
+            cached = self._cache.get(index)
+            yield cached if cached is not None else pickle.loads(self._read(index))
+    
+    def flush(self) -> None:
+        """Flush pending writes and persist the index so the store can be reopened."""
+        if self._writer is not None:
+            self._writer.flush()
+        with open(self.directory / self.INDEX_FILE, 'wb') as f:
+            pickle.dump((self._segments, self._offsets, self._lengths, self._segment_count), f)
+    
+    def close(self) -> None:
+        """Flush and release file handles and memory maps."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+        self._cache.clear()
+
+
 class ConfigLoader:
     """Loads and manages configuration."""
     
@@ -93,30 +559,186 @@ class ConfigLoader:
         return config
 
 
+@dataclass
+class FileMetrics:
+    """Code metrics for a single file."""
+    complexity: int
+    comment_lines: int
+    maintainability_index: float
+
+
+class PythonComplexityVisitor(ast.NodeVisitor):
+    """
+    Single AST pass computing cyclomatic complexity for a module and each of
+    its functions, plus the number of lines taken by docstrings.
+    """
+    
+    def __init__(self):
+        self.total = 1
+        self.functions: Dict[ast.AST, int] = {}
+        self.docstring_lines = 0
+        self._stack: List[ast.AST] = []
+    
+    def _add(self, amount: int = 1) -> None:
+        self.total += amount
+        if self._stack:
+            self.functions[self._stack[-1]] += amount
+    
+    def _count_docstring(self, node: ast.AST) -> None:
+        body = getattr(node, 'body', None)
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            expr = body[0]
+            self.docstring_lines += (getattr(expr, 'end_lineno', expr.lineno) or expr.lineno) - expr.lineno + 1
+    
+    def visit_Module(self, node: ast.Module) -> None:
+        self._count_docstring(node)
+        self.generic_visit(node)
+    
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._count_docstring(node)
+        self.generic_visit(node)
+    
+    def visit_FunctionDef(self, node: ast.AST) -> None:
+        self._count_docstring(node)
+        self.functions[node] = 1
+        self._stack.append(node)
+        self.generic_visit(node)
+        self._stack.pop()
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def _visit_decision(self, node: ast.AST) -> None:
+        self._add()
+        self.generic_visit(node)
+    
+    visit_If = visit_IfExp = visit_For = visit_AsyncFor = visit_While = _visit_decision
+    visit_ExceptHandler = visit_Assert = visit_match_case = _visit_decision
+    
+    def visit_BoolOp(self, node: ast.BoolOp) -> None:
+        self._add(len(node.values) - 1)
+        self.generic_visit(node)
+    
+    def visit_comprehension(self, node: ast.comprehension) -> None:
+        self._add(1 + len(node.ifs))
+        self.generic_visit(node)
+
+
+class CFamilyScanner:
+    """
+    Single-pass tokenizer for C-family sources (C, C++, C#, Java, JavaScript,
+    TypeScript, Go, Rust, ...).
+    
+    Comments and string literals are recognised as whole tokens, so keywords
+    are only counted when they appear as real code, and both line and block
+    comments are counted. Decision points are attributed to the innermost
+    function whose body braces enclose them.
+    """
+    
+    DECISION_WORDS = frozenset({
+        'if', 'elif', 'elsif', 'for', 'foreach', 'while', 'until', 'unless',
+        'case', 'when', 'catch', 'except', 'and', 'or',
+    })
+    DECISION_OPERATORS = frozenset({'&&', '||', '??', '?'})
+    
+    TOKEN_PATTERN = re.compile(r'''
+        (?P<block>/\*.*?(?:\*/|\Z))
+      | (?P<line>//[^\n]*)
+      | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)
+      | (?P<word>[A-Za-z_]\w*)
+      | (?P<op>&&|\|\||\?\?|\?\.|[?{};])
+      | (?P<newline>\n)
+    ''', re.DOTALL | re.VERBOSE)
+    
+    def __init__(self, content: str):
+        self.content = content
+    
+    def scan(self, function_lines: Iterable[int] = ()) -> Tuple[int, int, Dict[int, int]]:
+        """
+        Scan the content once.
+        
+        Args:
+            function_lines: Start lines of functions whose complexity is wanted
+            
+        Returns:
+            Tuple of (file complexity, comment lines, {function line: complexity})
+        """
+        pending = sorted(set(function_lines), reverse=True)
+        per_function = {line: 1 for line in pending}
+        open_functions: List[Tuple[int, int]] = []  # (function line, brace depth)
+        waiting: Optional[int] = None
+        
+        total = 1
+        comment_lines = 0
+        line = 1
+        depth = 0
+        last_code_line = 0
+        
+        for match in self.TOKEN_PATTERN.finditer(self.content):
+            kind = match.lastgroup
+            
+            if kind == 'newline':
+                line += 1
+                continue
+            
+            if kind in ('block', 'line'):
+                if last_code_line != line:
+                    comment_lines += 1
+                if kind == 'block':
+                    spanned = match.group().count('\n')
+                    comment_lines += spanned
+                    line += spanned
+                continue
+            
+            last_code_line = line
+            while pending and pending[-1] <= line:
+                waiting = pending.pop()
+            
+            token = match.group()
+            if kind == 'string':
+                line += token.count('\n')
+                continue
+            
+            if token == '{':
+                depth += 1
+                if waiting is not None:
+                    open_functions.append((waiting, depth))
+                    waiting = None
+            elif token == '}':
+                if open_functions and open_functions[-1][1] == depth:
+                    open_functions.pop()
+                depth = max(0, depth - 1)
+            elif token == ';':
+                # Expression-bodied functions never open a brace
+                waiting = None
+            elif (kind == 'word' and token in self.DECISION_WORDS) or \
+                    (kind == 'op' and token in self.DECISION_OPERATORS):
+                total += 1
+                if open_functions:
+                    per_function[open_functions[-1][0]] += 1
+        
+        return total, comment_lines, per_function
+
+
 class MetricsCalculator:
     """Calculate code metrics."""
     
     @staticmethod
-    def calculate_complexity(content: str) -> int:
+    def calculate_complexity(content: str, language: Optional[str] = None) -> int:
         """
-        Calculate cyclomatic complexity (simplified).
-        Counts decision points in code.
+        Calculate cyclomatic complexity.
+        Python sources are measured from the AST; anything else (or Python
+        that fails to parse) is measured from a C-family token stream.
         """
-        complexity = 1  # Base complexity
-        
-        # Decision keywords that increase complexity
-        keywords = [
-            'if', 'elif', 'else',
-            'for', 'while',
-            'and', 'or',
-            'case', 'when',
-            '?',  # Ternary operator
-        ]
-        
-        for keyword in keywords:
-            complexity += content.count(keyword)
+        if language in (None, 'Python'):
+            try:
+                visitor = PythonComplexityVisitor()
+                visitor.visit(ast.parse(content))
+                return visitor.total
+            except SyntaxError:
+                pass
         
-        return complexity
+        return CFamilyScanner(content).scan()[0]
     
     @staticmethod
     def calculate_maintainability_index(loc: int, complexity: int, 
@@ -140,24 +762,343 @@ class MetricsCalculator:
     
     @staticmethod
     def count_comment_lines(content: str, language: str) -> int:
-        """Count comment lines in code."""
-        lines = content.splitlines()
-        comment_count = 0
-        
+        """Count comment lines in code, including multi-line comments."""
         if language == 'Python':
-            for line in lines:
-                stripped = line.strip()
-                if stripped.startswith('#'):
-                    comment_count += 1
-        elif language in ['JavaScript', 'TypeScript', 'Java', 'C', 'C++', 'C#', 'Go', 'Rust']:
-            for line in lines:
-                stripped = line.strip()
-                if stripped.startswith('//'):
-                    comment_count += 1
+            comment_count = sum(1 for line in content.splitlines() if line.lstrip().startswith('#'))
+            try:
+                visitor = PythonComplexityVisitor()
+                visitor.visit(ast.parse(content))
+                comment_count += visitor.docstring_lines
+            except SyntaxError:
+                pass
+            return comment_count
         
-        # TODO: Handle multi-line comments
+        return CFamilyScanner(content).scan()[1]
+    
+    @staticmethod
+    def build_metrics(loc: int, complexity: int, comment_lines: int) -> FileMetrics:
+        """Bundle metrics for a file."""
+        return FileMetrics(
+            complexity=complexity,
+            comment_lines=comment_lines,
+            maintainability_index=round(
+                MetricsCalculator.calculate_maintainability_index(loc, complexity, comment_lines), 2)
+        )
+
+
+_JSONC_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+def _load_jsonc(path: Path) -> Dict[str, Any]:
+    """Load a JSON-with-comments file such as tsconfig.json."""
+    try:
+        text = path.read_text(encoding='utf-8')
+    except OSError:
+        return {}
+    text = _JSONC_TOKEN.sub(lambda m: m.group() if m.group().startswith('"') else '', text)
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r'\1', text))
+    except ValueError:
+        return {}
+
+
+class ModuleIndex:
+    """
+    In-memory index of a project's files for resolving import specifiers.
+    
+    Built once from the collected file set; every lookup is answered from
+    the index without touching the filesystem and memoized per
+    (importer directory, specifier). Supports Python relative, package and
+    absolute imports, Node-style extension and `index` resolution, and
+    tsconfig/jsconfig `baseUrl` and `paths` aliases.
+    """
+    
+    NODE_EXTENSIONS = ('.ts', '.tsx', '.d.ts', '.js', '.jsx', '.mjs', '.cjs')
+    NODE_SOURCE_SUFFIXES = {'.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs'}
+    PYTHON_SOURCE_ROOTS = ('', 'src', 'lib')
+    SKIP_DIRECTORIES = {'.git', 'node_modules', '__pycache__', '.venv', 'venv'}
+    
+    _root_cache: Dict[str, 'ModuleIndex'] = {}
+    
+    def __init__(self, files: Iterable[str], tsconfig: Optional[Dict[str, Any]] = None):
+        self._original: Dict[str, str] = {}
+        for path in files:
+            self._original[str(path).replace('\\', '/')] = str(path)
+        self.files = set(self._original)
+        self._cache: Dict[Tuple[str, str, str], Optional[str]] = {}
+        
+        options = (tsconfig or {}).get('compilerOptions') or {}
+        base_url = options.get('baseUrl')
+        self.base_url = posixpath.normpath(base_url) if base_url else None
+        if self.base_url == '.':
+            self.base_url = ''
+        aliases = []
+        for pattern, targets in (options.get('paths') or {}).items():
+            prefix, _, suffix = pattern.partition('*')
+            aliases.append((prefix, suffix, '*' in pattern, list(targets)))
+        # TypeScript prefers the longest matching prefix
+        self.path_aliases = sorted(aliases, key=lambda alias: len(alias[0]), reverse=True)
+    
+    @classmethod
+    def from_root(cls, root_path: str, files: Optional[Iterable[str]] = None) -> 'ModuleIndex':
+        """
+        Build an index for a project root.
+        
+        Args:
+            root_path: Project root, where tsconfig.json/jsconfig.json is read from
+            files: Root-relative file paths; the root is walked when omitted
+        """
+        root = Path(root_path)
+        if files is None:
+            files = []
+            for current, dirs, filenames in os.walk(root):
+                dirs[:] = [d for d in dirs if d not in cls.SKIP_DIRECTORIES]
+                relative = Path(current).relative_to(root)
+                files.extend(str(relative / name) for name in filenames)
+        
+        tsconfig = {}
+        if root.is_dir():
+            for name in ('tsconfig.json', 'jsconfig.json'):
+                if (root / name).exists():
+                    tsconfig = _load_jsonc(root / name)
+                    break
+        return cls(files, tsconfig)
+    
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Drop the indexes cached by for_root, so changed trees are walked again."""
+        cls._root_cache.clear()
+    
+    @classmethod
+    def for_root(cls, root_path: str) -> 'ModuleIndex':
+        """
+        Return a cached index of a whole project root, walking it on first use.
+        
+        The cache lives until clear_cache(); extractors clear it whenever
+        they collect files, so it never outlives a walk of the tree.
+        """
+        key = str(Path(root_path))
+        if key not in cls._root_cache:
+            cls._root_cache[key] = cls.from_root(key)
+        return cls._root_cache[key]
+    
+    def resolve(self, specifier: str, importer: str) -> Optional[str]:
+        """
+        Resolve an import specifier to a file in the index.
+        
+        Args:
+            specifier: Import string as extracted by the analyzers
+            importer: Root-relative path of the importing file
+            
+        Returns:
+            Root-relative path of the imported file, or None for external or
+            unresolvable imports
+        """
+        importer = importer.replace('\\', '/')
+        directory = posixpath.dirname(importer)
+        suffix = posixpath.splitext(importer)[1].lower()
+        kind = 'python' if suffix == '.py' else 'node' if suffix in self.NODE_SOURCE_SUFFIXES else 'path'
+        
+        key = (directory, kind, specifier)
+        if key not in self._cache:
+            if kind == 'python':
+                resolved = self._resolve_python(specifier, directory)
+            elif kind == 'node':
+                resolved = self._resolve_node(specifier, directory)
+            else:
+                resolved = self._resolve_path(specifier, directory)
+            self._cache[key] = self._original.get(resolved) if resolved else None
+        return self._cache[key]
+    
+    def resolve_node_path(self, path: str) -> Optional[str]:
+        """
+        Resolve a root-relative path as Node resolves files: as given, with
+        an added extension, or as a directory's index file.
+        
+        Returns:
+            Root-relative path of the file, or None if nothing matches
+        """
+        resolved = self._resolve_node_path(path)
+        return self._original[resolved] if resolved else None
+    
+    def _package_root(self, directory: str) -> str:
+        """Directory containing the outermost package that encloses `directory`"""
+        while directory and posixpath.join(directory, '__init__.py') in self.files:
+            directory = posixpath.dirname(directory)
+        return directory
+    
+    def _resolve_python(self, specifier: str, directory: str) -> Optional[str]:
+        level = len(specifier) - len(specifier.lstrip('.'))
+        parts = [part for part in specifier[level:].split('.') if part]
+        
+        if level:
+            base = directory
+            for _ in range(level - 1):
+                if not base:
+                    return None
+                base = posixpath.dirname(base)
+            bases = [base]
+            if not parts:
+                init = posixpath.join(base, '__init__.py')
+                return init if init in self.files else None
+        else:
+            bases = []
+            # Absolute imports resolve against package roots only; Python 3
+            # has no implicit relative imports from the importer's package
+            for base in (self._package_root(directory),) + self.PYTHON_SOURCE_ROOTS:
+                if base not in bases:
+                    bases.append(base)
+        
+        # Try the full dotted name, then treat trailing parts as imported attributes
+        for end in range(len(parts), 0, -1):
+            relative = '/'.join(parts[:end])
+            for base in bases:
+                candidate = posixpath.join(base, relative)
+                for path in (candidate + '.py', candidate + '/__init__.py'):
+                    if path in self.files:
+                        return path
+        return None
+    
+    def _resolve_node(self, specifier: str, directory: str) -> Optional[str]:
+        if specifier in ('.', '..') or specifier.startswith(('./', '../')):
+            return self._resolve_node_path(posixpath.join(directory, specifier))
         
-        return comment_count
+        alias_base = self.base_url or ''
+        for prefix, suffix, wildcard, targets in self.path_aliases:
+            if wildcard:
+                if not (specifier.startswith(prefix) and specifier.endswith(suffix)
+                        and len(specifier) >= len(prefix) + len(suffix)):
+                    continue
+                matched = specifier[len(prefix):len(specifier) - len(suffix)]
+            elif specifier == prefix:
+                matched = ''
+            else:
+                continue
+            for target in targets:
+                resolved = self._resolve_node_path(posixpath.join(alias_base, target.replace('*', matched, 1)))
+                if resolved:
+                    return resolved
+        
+        if self.base_url is not None:
+            return self._resolve_node_path(posixpath.join(self.base_url, specifier))
+        return None
+    
+    def _resolve_node_path(self, path: str) -> Optional[str]:
+        path = posixpath.normpath(path)
+        if path == '.':
+            path = ''
+        if path.startswith('../') or path == '..':
+            return None
+        if path in self.files:
+            return path
+        for extension in self.NODE_EXTENSIONS:
+            if path + extension in self.files:
+                return path + extension
+        for extension in self.NODE_EXTENSIONS:
+            index = posixpath.join(path, 'index' + extension)
+            if index in self.files:
+                return index
+        return None
+    
+    def _resolve_path(self, specifier: str, directory: str) -> Optional[str]:
+        """Plain relative or root-relative lookup, e.g. C #include "..." paths"""
+        for base in (directory, ''):
+            path = posixpath.normpath(posixpath.join(base, specifier.strip()))
+            if path in self.files:
+                return path
+        return None
+
+
+class WorkspaceModuleIndex:
+    """
+    Resolves imports across the roots of a multi-root workspace.
+    
+    Workspace paths are prefixed with their root's name. Imports are
+    resolved in the importer's own root first. Failing that, absolute
+    Python imports and bare Node specifiers naming another root are looked
+    up in the other roots, and relative Node imports that climb out of
+    their root are followed into whichever root contains the target.
+    """
+    
+    def __init__(self, roots: Dict[str, str], indexes: Dict[str, ModuleIndex]):
+        self.roots = {name: os.path.abspath(path) for name, path in roots.items()}
+        self.indexes = indexes
+        self._cache: Dict[Tuple[str, str, str], Optional[str]] = {}
+    
+    @classmethod
+    def from_files(cls, roots: Dict[str, str], files: Iterable[str]) -> 'WorkspaceModuleIndex':
+        """
+        Build per-root indexes from workspace paths.
+        
+        Args:
+            roots: Root name -> directory
+            files: Workspace paths of the form "<root name>/<root-relative path>"
+        """
+        by_root: Dict[str, List[str]] = {name: [] for name in roots}
+        for path in files:
+            name, _, relative = str(path).replace('\\', '/').partition('/')
+            if name in by_root:
+                by_root[name].append(relative)
+        return cls(roots, {name: ModuleIndex.from_root(root, by_root[name])
+                           for name, root in roots.items()})
+    
+    def root_of(self, path: str) -> str:
+        """Name of the root a workspace path belongs to"""
+        return str(path).replace('\\', '/').partition('/')[0]
+    
+    def resolve(self, specifier: str, importer: str) -> Optional[str]:
+        """Resolve an import to a workspace path, or None if external"""
+        name, _, relative = importer.replace('\\', '/').partition('/')
+        index = self.indexes.get(name)
+        if index is None:
+            return None
+        resolved = index.resolve(specifier, relative)
+        if resolved:
+            return os.path.join(name, resolved)
+        
+        key = (name, posixpath.dirname(relative), specifier)
+        if key not in self._cache:
+            self._cache[key] = self._resolve_across(specifier, name, relative)
+        return self._cache[key]
+    
+    def _resolve_across(self, specifier: str, name: str, relative: str) -> Optional[str]:
+        suffix = posixpath.splitext(relative)[1].lower()
+        others = [other for other in self.indexes if other != name]
+        
+        if suffix == '.py':
+            if specifier.startswith('.'):
+                return None
+            for other in others:
+                # Resolve as if imported from the other root's top level
+                resolved = self.indexes[other].resolve(specifier, '__init__.py')
+                if resolved:
+                    return os.path.join(other, resolved)
+            return None
+        if suffix not in ModuleIndex.NODE_SOURCE_SUFFIXES:
+            return None
+        
+        if specifier in ('.', '..') or specifier.startswith(('./', '../')):
+            target = os.path.normpath(os.path.join(self.roots[name], posixpath.dirname(relative), specifier))
+            for other in others:
+                root = self.roots[other]
+                if target == root or target.startswith(root + os.sep):
+                    inner = os.path.relpath(target, root).replace(os.sep, '/')
+                    resolved = self.indexes[other].resolve_node_path(inner)
+                    if resolved:
+                        return os.path.join(other, resolved)
+            return None
+        
+        # Bare specifiers like "shared" or "@org/shared/util" naming another root
+        parts = specifier.split('/')
+        width = 2 if specifier.startswith('@') and len(parts) > 1 else 1
+        package = parts[width - 1]
+        for other in others:
+            if other == package:
+                resolved = self.indexes[other].resolve_node_path('/'.join(parts[width:]))
+                if resolved:
+                    return os.path.join(other, resolved)
+        return None
 
 
 class DependencyResolver:
@@ -169,6 +1110,9 @@ class DependencyResolver:
         """
         Resolve an import statement to actual file path.
         
+        Lookups go through a ModuleIndex of the project that is built on
+        first use and cached, so no filesystem calls are made per import.
+        
         Args:
             import_str: The import string (e.g., "./utils")
             file_path: Path of the file containing the import
@@ -180,21 +1124,13 @@ class DependencyResolver:
         file_path = Path(file_path)
         root_path = Path(root_path)
         
-        # Handle relative imports
-        if import_str.startswith('.'):
-            base_dir = file_path.parent
-            import_path = (base_dir / import_str).resolve()
-            
-            # Try different extensions
-            for ext in ['.py', '.js', '.ts', '/index.js', '/index.ts']:
-                candidate = Path(str(import_path) + ext)
-                if candidate.exists() and candidate.is_relative_to(root_path):
-                    return str(candidate.relative_to(root_path))
+        if file_path.is_absolute():
+            try:
+                file_path = file_path.relative_to(root_path)
+            except ValueError:
+                return None
         
-        # Handle absolute imports (simplified)
-        # This would need more sophisticated logic for real projects
-        
-        return None
+        return ModuleIndex.for_root(str(root_path)).resolve(import_str, str(file_path))
     
     @staticmethod
     def find_circular_dependencies(graph: Dict[str, List[str]]) -> List[List[str]]:
@@ -253,6 +1189,270 @@ class DependencyResolver:
         return [dep for dep in declared if dep not in used]
 
 
+def content_digest(file_path: Path, chunk_size: int = 1 << 20) -> Optional[str]:
+    """
+    Hash raw file contents for exact duplicate detection.
+    
+    Returns:
+        Hex digest, or None if the file cannot be read
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    """Hash in-memory contents the same way as content_digest"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+# Signature value of a MinHash bin that no shingle hashed into
+_EMPTY_BIN = 1 << 32
+
+
+def similarity_signature(text: str, bins: int = 64, shingle_size: int = 5,
+                         min_shingles: int = 64) -> Optional[Tuple[int, ...]]:
+    """
+    One-permutation MinHash signature over word shingles.
+    
+    Each shingle is hashed once; the hash picks a bin and the smallest
+    value per bin is kept, so the signature costs a single pass over the
+    text. Files too small to fingerprint reliably return None.
+    
+    Args:
+        text: File content
+        bins: Signature length
+        shingle_size: Number of consecutive words per shingle
+        min_shingles: Minimum shingles required for a signature
+    """
+    words = _WORD_PATTERN.findall(text)
+    shingle_count = len(words) - shingle_size + 1
+    if shingle_count < min_shingles:
+        return None
+    
+    signature = [_EMPTY_BIN] * bins
+    for i in range(shingle_count):
+        value = zlib.crc32(' '.join(words[i:i + shingle_size]).encode('utf-8'))
+        slot = value % bins
+        if value < signature[slot]:
+            signature[slot] = value
+    return tuple(signature)
+
+
+def signature_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimate Jaccard similarity from two signatures, ignoring bins empty in both"""
+    used = [(x, y) for x, y in zip(a, b) if x != _EMPTY_BIN or y != _EMPTY_BIN]
+    if not used:
+        return 0.0
+    return sum(1 for x, y in used if x == y) / len(used)
+
+
+class NearDuplicateIndex:
+    """
+    Locality-sensitive hashing index for grouping near-duplicate files.
+    
+    Signatures are split into bands; files sharing any band become
+    candidates, and candidates are confirmed by estimated similarity.
+    
+    Bands made only of empty bins are not indexed: small files leave many
+    bins empty and would otherwise all share those bands. Buckets of up to
+    `max_bucket` files compare every pair; larger buckets, such as a band
+    shared by many copies of one file, compare each member only against up
+    to `max_bucket` leaders, the first members that joined no earlier
+    leader. Comparisons stay linear in the bucket size.
+    """
+    
+    def __init__(self, bands: int = 16, threshold: float = 0.8, max_bucket: int = 64):
+        self.bands = bands
+        self.threshold = threshold
+        self.max_bucket = max_bucket
+        self._signatures: Dict[Any, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[Any]] = {}
+    
+    def add(self, key: Any, signature: Tuple[int, ...]) -> None:
+        """Add a file signature to the index."""
+        self._signatures[key] = signature
+        rows = max(1, len(signature) // self.bands)
+        for band in range(self.bands):
+            chunk = signature[band * rows:(band + 1) * rows]
+            if chunk and any(value != _EMPTY_BIN for value in chunk):
+                self._buckets.setdefault((band, chunk), []).append(key)
+    
+    def groups(self) -> List[Tuple[List[Any], float]]:
+        """
+        Group near-duplicate keys.
+        
+        Returns:
+            List of (keys in insertion order, lowest confirmed similarity)
+        """
+        parent = {key: key for key in self._signatures}
+        lowest: Dict[Any, float] = {}
+        
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+        
+        def link(a, b) -> bool:
+            """Join a and b if they are near duplicates; True when grouped"""
+            root_a, root_b = find(a), find(b)
+            # Pairs already joined through another band need no check
+            if root_a == root_b:
+                return True
+            similarity = signature_similarity(self._signatures[a], self._signatures[b])
+            if similarity < self.threshold:
+                return False
+            parent[root_b] = root_a
+            lowest[root_a] = min(similarity, lowest.get(root_a, 1.0), lowest.get(root_b, 1.0))
+            return True
+        
+        for members in self._buckets.values():
+            if len(members) <= self.max_bucket:
+                for i, a in enumerate(members):
+                    for b in members[i + 1:]:
+                        link(a, b)
+                continue
+            
+            leaders: List[Any] = []
+            for key in members:
+                if any(link(leader, key) for leader in leaders):
+                    continue
+                if len(leaders) < self.max_bucket:
+                    leaders.append(key)
+        
+        grouped: Dict[Any, List[Any]] = {}
+        for key in self._signatures:
+            grouped.setdefault(find(key), []).append(key)
+        return [(members, lowest.get(root, 1.0))
+                for root, members in grouped.items() if len(members) > 1]
+
+
+class ProgressReporter:
+    """
+    Structured, time-throttled progress reporting.
+    
+    Events are dicts passed to a sink: a callback in library use, or a JSON
+    lines writer via to_stream(). Each event carries files/s, bytes/s, an
+    ETA estimated from the remaining byte volume, and the slowest file still
+    in flight. Files analyzed in worker processes are tracked per batch,
+    named by the batch's first file, since the parent only sees batches
+    start and finish. Progress events are emitted at most once per
+    `interval` seconds, so per-file overhead is one clock read.
+    """
+    
+    def __init__(self, sink: Callable[[Dict[str, Any]], None], interval: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.sink = sink
+        self.interval = interval
+        self.clock = clock
+        self._in_flight: Dict[str, float] = {}
+        self._reset('analyze', 0, 0)
+    
+    @classmethod
+    def to_stream(cls, stream: TextIO, interval: float = 0.5) -> 'ProgressReporter':
+        """Report events as JSON lines on a text stream (e.g. os.fdopen(fd, 'w'))."""
+        def write(event: Dict[str, Any]) -> None:
+            stream.write(json.dumps(event, separators=(',', ':')) + '\n')
+            stream.flush()
+        return cls(write, interval)
+    
+    @classmethod
+    def human(cls, stream: TextIO = sys.stderr, interval: float = 2.0) -> 'ProgressReporter':
+        """Report progress as readable lines, e.g. on stderr."""
+        def write(event: Dict[str, Any]) -> None:
+            if event['event'] != 'progress':
+                return
+            eta = f", ETA {event['eta_s']:.0f}s" if event['eta_s'] is not None else ""
+            print(f"Progress: {event['files_done']}/{event['files_total'] or '?'} "
+                  f"({event['files_per_s']:.1f} files/s, {event['bytes_per_s'] / 1024:.0f} KB/s{eta})",
+                  file=stream)
+        return cls(write, interval)
+    
+    def _reset(self, phase: str, total_files: int, total_bytes: int) -> None:
+        self.phase = phase
+        self.files_total = total_files
+        self.bytes_total = total_bytes
+        self.files_done = 0
+        self.bytes_done = 0
+        self._in_flight.clear()
+        self._started = self._last_emit = self.clock()
+    
+    def start(self, total_files: int, total_bytes: int, phase: str = 'analyze') -> None:
+        """Begin a phase of work (totals of 0 mean unknown)."""
+        self._reset(phase, total_files, total_bytes)
+        self._emit('start', self._started)
+    
+    def file_started(self, path: str) -> None:
+        """Mark a file as in flight."""
+        self._in_flight[path] = self.clock()
+    
+    def file_finished(self, path: str, size: int) -> None:
+        """Mark a file as done and emit a progress event if the interval has passed."""
+        self._in_flight.pop(path, None)
+        self._advance(1, size)
+    
+    def batch_started(self, paths: List[str]) -> None:
+        """Mark a batch of files, analyzed one after another, as in flight."""
+        if paths:
+            self._in_flight[paths[0]] = self.clock()
+    
+    def batch_finished(self, paths: List[str], size: int) -> None:
+        """Mark a batch of files totalling `size` bytes as done."""
+        if paths:
+            self._in_flight.pop(paths[0], None)
+        self._advance(len(paths), size)
+    
+    def _advance(self, files: int, size: int) -> None:
+        self.files_done += files
+        self.bytes_done += size
+        now = self.clock()
+        if now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self._emit('progress', now)
+    
+    def finish(self) -> None:
+        """End the current phase."""
+        self._emit('finish', self.clock())
+    
+    def _emit(self, event: str, now: float) -> None:
+        elapsed = max(now - self._started, 1e-9)
+        bytes_per_s = self.bytes_done / elapsed
+        files_per_s = self.files_done / elapsed
+        
+        eta = None
+        if self.bytes_total and bytes_per_s:
+            eta = max(0.0, (self.bytes_total - self.bytes_done) / bytes_per_s)
+        elif files_per_s and self.files_total:
+            eta = max(0.0, (self.files_total - self.files_done) / files_per_s)
+        
+        slowest = None
+        if self._in_flight:
+            path, started = min(self._in_flight.items(), key=lambda item: item[1])
+            slowest = {'path': path, 'elapsed_s': round(now - started, 3)}
+        
+        self.sink({
+            'event': event,
+            'phase': self.phase,
+            'files_done': self.files_done,
+            'files_total': self.files_total,
+            'bytes_done': self.bytes_done,
+            'bytes_total': self.bytes_total,
+            'elapsed_s': round(elapsed, 3),
+            'files_per_s': round(files_per_s, 2),
+            'bytes_per_s': round(bytes_per_s, 1),
+            'eta_s': round(eta, 1) if eta is not None else None,
+            'slowest_in_flight': slowest,
+        })
+
+
 class ReportGenerator:
     """Generate various reports from context data."""
     
@@ -326,42 +1526,80 @@ class ReportGenerator:
         return '\n'.join(lines)
 
 
-def format_file_tree(root_path: str, max_depth: int = 3) -> str:
+def _format_size(size: float) -> str:
+    """Human-readable byte size."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:,.0f} {unit}" if unit == 'B' else f"{size:,.1f} {unit}"
+        size /= 1024
+    return f"{size:,.1f} TB"
+
+
+def iter_file_tree(root_path: str, max_depth: int = 3,
+                   walker: Optional[DirectoryWalker] = None,
+                   collapse_threshold: Optional[int] = None) -> Iterator[str]:
     """
-    Generate a visual tree representation of files.
+    Yield the lines of a visual tree representation of files.
     
     Args:
         root_path: Root directory to start from
         max_depth: Maximum depth to traverse
+        walker: Walker to list directories with; pass the extractor's walker
+            to apply its exclude patterns and share its scandir cache
+        collapse_threshold: Directories with more children than this are
+            summarized on one line instead of expanded (None, the default,
+            expands every directory)
         
-    Returns:
-        String representation of file tree
+    Yields:
+        One line of the tree at a time
     """
-    lines = [f"📁 {Path(root_path).name}"]
+    walker = walker or DirectoryWalker()
+    yield f"📁 {Path(root_path).name}"
     
-    def walk_dir(path: Path, prefix: str = "", depth: int = 0):
+    def walk_dir(path: str, prefix: str, depth: int) -> Iterator[str]:
         if depth >= max_depth:
             return
         
-        try:
-            items = sorted(path.iterdir(), key=lambda x: (not x.is_dir(), x.name))
-        except PermissionError:
-            return
-        
+        items = walker.listdir(path)
         for i, item in enumerate(items):
             is_last = i == len(items) - 1
             current_prefix = "└── " if is_last else "├── "
             next_prefix = "    " if is_last else "│   "
             
-            icon = "📁" if item.is_dir() else "📄"
-            lines.append(f"{prefix}{current_prefix}{icon} {item.name}")
+            if not item.is_dir():
+                yield f"{prefix}{current_prefix}📄 {item.name}"
+                continue
             
-            if item.is_dir():
-                walk_dir(item, prefix + next_prefix, depth + 1)
+            if depth + 1 < max_depth and collapse_threshold is not None:
+                children = walker.listdir(item.path)
+                if len(children) > collapse_threshold:
+                    files = [child for child in children if not child.is_dir()]
+                    size = sum(walker.size(child) for child in files)
+                    yield (f"{prefix}{current_prefix}📁 {item.name}/ … {len(children):,} entries "
+                           f"collapsed ({len(files):,} files, {len(children) - len(files):,} dirs, "
+                           f"{_format_size(size)})")
+                    continue
+            
+            yield f"{prefix}{current_prefix}📁 {item.name}"
+            if not item.is_symlink():
+                yield from walk_dir(item.path, prefix + next_prefix, depth + 1)
     
-    walk_dir(Path(root_path))
+    yield from walk_dir(str(root_path), "", 0)
+
+
+def format_file_tree(root_path: str, max_depth: int = 3,
+                     walker: Optional[DirectoryWalker] = None,
+                     collapse_threshold: Optional[int] = None) -> str:
+    """
+    Generate a visual tree representation of files.
     
-    return '\n'.join(lines)
+    See iter_file_tree for the arguments; prefer it for large trees, since
+    this joins every line into one string.
+    
+    Returns:
+        String representation of file tree
+    """
+    return '\n'.join(iter_file_tree(root_path, max_depth, walker, collapse_threshold))
 
 
 if __name__ == '__main__':
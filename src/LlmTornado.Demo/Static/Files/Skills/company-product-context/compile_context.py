@@ -9,6 +9,8 @@ import os
 from datetime import datetime
 from pathlib import Path
 
+from text_store import TextStore
+
 def load_json_files(directory):
     """Load all JSON files from directory."""
     data = {}
@@ -52,7 +54,43 @@ def extract_section_content(json_data, section_name):
     
     return content
 
-def compile_product_context(json_data, markdown_data):
+def open_text_store(data_dir, data):
+    """Open the full-text store of an extracted document, or return None."""
+    if not data_dir or not data.get('text_store'):
+        return None
+    
+    try:
+        return TextStore(os.path.join(data_dir, data['text_store']))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠ Error opening text store {data['text_store']}: {e}")
+        return None
+
+def collect_source_documents(json_data, data_dir):
+    """Describe each extracted document, with its opening page read from the text store."""
+    documents = []
+    
+    for key, data in json_data.items():
+        if '_extracted' not in key:
+            continue
+        
+        document = {
+            'key': key,
+            'source': data.get('metadata', {}).get('title') or key,
+            'pages': data.get('stats', {}).get('total_pages', 0),
+            'characters': data.get('stats', {}).get('total_chars', 0),
+            'text_store': data.get('text_store', '')
+        }
+        store = open_text_store(data_dir, data)
+        if store is not None:
+            with store:
+                document['opening_text'] = store.page_text(store.pages[0]) if store.pages else ''
+        else:
+            document['opening_text'] = data.get('full_text', '')
+        documents.append(document)
+    
+    return documents
+
+def compile_product_context(json_data, markdown_data, data_dir=None):
     """Compile comprehensive product context."""
     
     context = {
@@ -66,6 +104,7 @@ def compile_product_context(json_data, markdown_data):
                 'research_files': list(markdown_data.keys())
             }
         },
+        'source_documents': collect_source_documents(json_data, data_dir),
         'company_profile': {},
         'products_and_services': {},
         'business_model': {},
@@ -729,7 +768,7 @@ def main():
     
     # Compile context
     print("\n🔄 Compiling product context...")
-    context = compile_product_context(json_data, markdown_data)
+    context = compile_product_context(json_data, markdown_data, data_dir)
     
     # Save structured context
     context_file = '/tmp/product_context.json'
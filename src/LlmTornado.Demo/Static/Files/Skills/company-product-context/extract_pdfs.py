@@ -6,44 +6,192 @@ Extracts and structures information from company PDF documents.
 
 import os
 import re
+import hashlib
+import heapq
+import sqlite3
+import argparse
+import fnmatch
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
 from pathlib import Path
 import PyPDF2
 import json
 
-def extract_pdf_content(pdf_path):
-    """Extract text content from PDF file."""
-    text_content = []
-    metadata = {}
+from search_index import INDEX_FILE, SearchIndex, read_signature
+from text_store import FULL_TEXT_DIR, INDEX_SUFFIX, TextStoreWriter
+
+# Documents longer than this are split into page ranges of this size so a
+# single large report can be spread across several worker processes.
+PAGES_PER_TASK = 50
+
+# Parallel extraction keeps at most this many documents per worker in flight,
+# bounding the pages buffered while earlier documents are still running.
+MAX_DOCS_PER_JOB = 2
+
+# Preview mode: pages extracted per matching outline heading, and the pages
+# sampled from the start and end of documents without a usable outline.
+PREVIEW_PAGES_PER_HEADING = 5
+PREVIEW_HEAD_PAGES = 10
+PREVIEW_TAIL_PAGES = 5
+
+def read_pdf_metadata(pdf_reader):
+    """Read document metadata from an open PdfReader."""
+    if pdf_reader.metadata:
+        return {
+            'title': pdf_reader.metadata.get('/Title', ''),
+            'author': pdf_reader.metadata.get('/Author', ''),
+            'subject': pdf_reader.metadata.get('/Subject', ''),
+            'creator': pdf_reader.metadata.get('/Creator', ''),
+            'producer': pdf_reader.metadata.get('/Producer', ''),
+            'pages': len(pdf_reader.pages)
+        }
+    return {'pages': len(pdf_reader.pages)}
+
+def iter_outline(outline):
+    """Flatten a PyPDF2 outline into its destinations, in document order."""
+    for item in outline:
+        if isinstance(item, list):
+            yield from iter_outline(item)
+        else:
+            yield item
+
+def select_preview_pages(pdf_reader, preview):
+    """Choose the pages to extract in preview mode.
+    
+    Outline entries whose titles match a section keyword contribute the first
+    preview['pages_per_heading'] pages of their range (up to the next outline
+    entry). Without a usable outline, the first PREVIEW_HEAD_PAGES and last
+    PREVIEW_TAIL_PAGES pages are sampled. Returns (page_numbers, info) with
+    0-based page numbers and a description for the output metadata.
+    """
+    page_count = len(pdf_reader.pages)
+    classifier = SectionClassifier(preview.get('keywords'))
     
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Extract metadata
-            if pdf_reader.metadata:
-                metadata = {
-                    'title': pdf_reader.metadata.get('/Title', ''),
-                    'author': pdf_reader.metadata.get('/Author', ''),
-                    'subject': pdf_reader.metadata.get('/Subject', ''),
-                    'creator': pdf_reader.metadata.get('/Creator', ''),
-                    'producer': pdf_reader.metadata.get('/Producer', ''),
-                    'pages': len(pdf_reader.pages)
-                }
-            else:
-                metadata = {'pages': len(pdf_reader.pages)}
-            
-            # Extract text from all pages
-            for page_num, page in enumerate(pdf_reader.pages, 1):
-                try:
-                    text = page.extract_text()
-                    if text.strip():
-                        text_content.append({
-                            'page': page_num,
-                            'text': text
-                        })
-                except Exception as e:
-                    print(f"  ⚠ Error extracting page {page_num}: {e}")
-                    
+        outline = getattr(pdf_reader, 'outline', None)
+        if outline is None:
+            outline = pdf_reader.outlines
+        headings = sorted(
+            (pdf_reader.get_destination_page_number(dest), dest.title)
+            for dest in iter_outline(outline)
+        )
+    except Exception:
+        headings = []
+    headings = [(page, title) for page, title in headings if 0 <= page < page_count]
+    
+    selected = set()
+    matched = []
+    for idx, (page, title) in enumerate(headings):
+        section = classifier.match(title or '')
+        if section is None:
+            continue
+        end = headings[idx + 1][0] if idx + 1 < len(headings) else page_count
+        end = min(max(end, page + 1), page + preview['pages_per_heading'])
+        selected.update(range(page, end))
+        matched.append({'title': title, 'section': section, 'page': page + 1})
+    
+    if matched:
+        # Keep the cover page: it usually carries the company name
+        selected.add(0)
+        mode = 'outline'
+    else:
+        selected.update(range(min(PREVIEW_HEAD_PAGES, page_count)))
+        selected.update(range(max(page_count - PREVIEW_TAIL_PAGES, 0), page_count))
+        mode = 'sample'
+    
+    pages = sorted(selected)
+    return pages, {'mode': mode, 'pages': [page + 1 for page in pages], 'headings': matched}
+
+def open_pdf_part(pdf_path, start=0, stop=None, preview=None, failed=None):
+    """Open a PDF and return (metadata, page_count, pages) for pages [start, stop).
+    
+    Metadata and the page selection are read up front; pages is a generator
+    that extracts one page at a time and closes the file once it is
+    exhausted or closed. Metadata is only read for the part starting at
+    page 0. Pages that fail to extract are skipped and reported as
+    described in iter_pdf_pages().
+    
+    With preview options (see select_preview_pages), the whole document is
+    handled as one part, only the selected pages are extracted and the
+    selection is recorded under metadata['preview'].
+    """
+    file = open(pdf_path, 'rb')
+    try:
+        pdf_reader = PyPDF2.PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        metadata = read_pdf_metadata(pdf_reader) if start == 0 else None
+        
+        if preview:
+            page_indexes, metadata['preview'] = select_preview_pages(pdf_reader, preview)
+        else:
+            stop = page_count if stop is None else min(stop, page_count)
+            page_indexes = range(start, stop)
+    except BaseException:
+        file.close()
+        raise
+    
+    return metadata, page_count, iter_pdf_pages(file, pdf_reader, page_indexes, failed)
+
+def report_page_errors(failed):
+    """Print the (page, message) pairs collected for pages that failed to extract."""
+    for page_num, message in failed:
+        print(f"  ⚠ Error extracting page {page_num}: {message}")
+
+def iter_pdf_pages(file, pdf_reader, page_indexes, failed=None):
+    """Yield {'page', 'text'} for the non-empty pages among 0-based page_indexes.
+    
+    Pages whose text cannot be extracted are skipped. Their (page, message)
+    pairs are appended to failed when it is given, and printed otherwise.
+    """
+    with file:
+        for page_num in (idx + 1 for idx in page_indexes):
+            try:
+                text = pdf_reader.pages[page_num - 1].extract_text()
+            except Exception as e:
+                if failed is None:
+                    report_page_errors([(page_num, e)])
+                else:
+                    failed.append((page_num, str(e)))
+                continue
+            if text.strip():
+                yield {'page': page_num, 'text': text}
+
+def extract_pdf_part(pdf_path, start=0, stop=None, preview=None):
+    """Extract text from pages [start, stop) of a PDF file.
+    
+    Like open_pdf_part(), but for worker processes: returns
+    (metadata, page_count, pages, failed) with the pages as a list and the
+    (page, message) pairs of pages that failed to extract, so that nothing
+    is printed from the worker. Errors opening the file are raised.
+    """
+    failed = []
+    metadata, page_count, pages = open_pdf_part(pdf_path, start, stop, preview, failed)
+    return metadata, page_count, list(pages), failed
+
+def analyze_pdf_part(pdf_path, start=0, stop=None, preview=None):
+    """Extract a page range like extract_pdf_part() and analyze its pages.
+    
+    Returns (metadata, page_count, pages, failed, analyzer), where analyzer
+    is a CorpusAnalyzer covering only this range, for merging by the caller.
+    """
+    metadata, page_count, pages, failed = extract_pdf_part(pdf_path, start, stop, preview)
+    analyzer = CorpusAnalyzer()
+    filename = os.path.basename(pdf_path)
+    for page in pages:
+        analyzer.add_page(page['text'], {'file': filename, 'page': page['page']})
+    return metadata, page_count, pages, failed, analyzer
+
+def extract_pdf_content(pdf_path, preview=None, lazy=False, failed=None):
+    """Extract text content from PDF file.
+    
+    With lazy=True, 'content' is a generator extracting one page at a time
+    (see open_pdf_part) instead of a list. Page errors are collected in
+    failed when it is given, and printed otherwise.
+    """
+    try:
+        metadata, _, text_content = open_pdf_part(pdf_path, preview=preview, failed=failed)
     except Exception as e:
         print(f"  ✗ Error reading PDF {pdf_path}: {e}")
         return None
@@ -51,240 +199,977 @@ def extract_pdf_content(pdf_path):
     return {
         'filename': os.path.basename(pdf_path),
         'metadata': metadata,
-        'content': text_content
+        'content': text_content if lazy else list(text_content)
     }
 
-def extract_key_sections(text):
-    """Extract key sections from text based on common headers."""
-    sections = {
-        'company_overview': [],
-        'products_services': [],
-        'business_model': [],
-        'market_position': [],
-        'financials': [],
-        'technology': [],
-        'customers': [],
-        'strategy': [],
-        'other': []
-    }
+def matches_any(rel_path, patterns):
+    """Return True if a relative path or its final component matches a pattern."""
+    name = os.path.basename(rel_path)
+    return any(fnmatch.fnmatchcase(rel_path, pattern) or fnmatch.fnmatchcase(name, pattern)
+               for pattern in patterns)
+
+def find_pdf_files(input_dir, include=None, exclude=None, skip_dirs=()):
+    """Walk input_dir once and return the matching files, sorted.
+    
+    include and exclude are fnmatch patterns tested against both the file or
+    directory name and its '/'-separated path relative to input_dir; excluded
+    directories are not descended into. Directories in skip_dirs (such as the
+    output directory) are always pruned.
+    """
+    include = include or ['*.pdf']
+    exclude = exclude or []
+    skip_dirs = {os.path.realpath(path) for path in skip_dirs}
+    pdf_files = []
     
-    # Keywords for section identification
-    keywords = {
-        'company_overview': [
-            'about us', 'company overview', 'who we are', 'introduction', 
-            'history', 'our company', 'company profile', 'background',
-            'founded', 'established', 'headquarters'
-        ],
-        'products_services': [
-            'products', 'services', 'solutions', 'offerings', 'portfolio',
-            'what we do', 'our products', 'our services', 'product line',
-            'capabilities', 'features'
-        ],
-        'business_model': [
-            'business model', 'revenue model', 'how we work', 'operations',
-            'business operations', 'operating model', 'value chain'
-        ],
-        'market_position': [
-            'market', 'industry', 'competitive', 'position', 'landscape',
-            'market share', 'market leader', 'market opportunity',
-            'addressable market', 'tam', 'market size'
-        ],
-        'financials': [
-            'financial', 'revenue', 'earnings', 'profit', 'growth',
-            'income', 'balance sheet', 'cash flow', 'ebitda',
-            'quarterly results', 'annual results', 'financial performance'
-        ],
-        'technology': [
-            'technology', 'platform', 'infrastructure', 'technical', 
-            'innovation', 'architecture', 'tech stack', 'engineering',
-            'software', 'hardware', 'systems', 'r&d', 'research'
-        ],
-        'customers': [
-            'customers', 'clients', 'partners', 'case study', 'testimonial',
-            'user', 'customer success', 'client stories', 'references',
-            'implementations'
-        ],
-        'strategy': [
-            'strategy', 'vision', 'mission', 'goals', 'objectives', 
-            'roadmap', 'strategic', 'future', 'plans', 'priorities',
-            'initiatives', 'direction'
+    for root, dirs, files in os.walk(input_dir):
+        rel_root = os.path.relpath(root, input_dir)
+        rel_root = '' if rel_root == '.' else rel_root.replace(os.sep, '/') + '/'
+        
+        dirs[:] = [
+            d for d in dirs
+            if os.path.realpath(os.path.join(root, d)) not in skip_dirs
+            and not matches_any(rel_root + d, exclude)
         ]
-    }
+        for name in files:
+            rel_path = rel_root + name
+            if matches_any(rel_path, include) and not matches_any(rel_path, exclude):
+                pdf_files.append(Path(root) / name)
     
-    lines = text.split('\n')
-    current_section = 'other'
+    return sorted(pdf_files)
+
+def dedupe_pdf_files(pdf_files):
+    """Drop files that are the same file or have identical content.
     
-    for line in lines:
-        line_lower = line.lower().strip()
+    Files are first compared by device and inode (hard links, symlinks),
+    then by size, and only files whose size collides are hashed. Returns
+    (unique_files, duplicates) where duplicates lists (path, original) pairs.
+    """
+    unique = []
+    duplicates = []
+    inodes = {}
+    sizes = {}
+    digests = {}
+    
+    def digest_of(path):
+        if path not in digests:
+            digests[path] = file_digest(path)
+        return digests[path]
+    
+    for pdf_file in pdf_files:
+        try:
+            stat = os.stat(pdf_file)
+        except OSError:
+            unique.append(pdf_file)  # Reported when extraction fails
+            continue
         
-        # Check if line is a section header
-        if line_lower and len(line_lower) < 150:  # Potential header
-            for section, section_keywords in keywords.items():
-                if any(keyword in line_lower for keyword in section_keywords):
-                    if len(line_lower) < 100:  # Likely a header
-                        current_section = section
+        original = inodes.get((stat.st_dev, stat.st_ino))
+        if original is None:
+            for candidate in sizes.get(stat.st_size, []):
+                try:
+                    if digest_of(candidate) == digest_of(pdf_file):
+                        original = candidate
                         break
+                except OSError:
+                    break
+        
+        if original is not None:
+            duplicates.append((pdf_file, original))
+            continue
         
-        if line.strip():
-            sections[current_section].append(line)
+        inodes[(stat.st_dev, stat.st_ino)] = pdf_file
+        sizes.setdefault(stat.st_size, []).append(pdf_file)
+        unique.append(pdf_file)
     
-    return sections
+    return unique, duplicates
 
-def extract_entities(text):
-    """Extract named entities and key information from text."""
-    entities = {
-        'companies': set(),
-        'products': set(),
-        'technologies': set(),
-        'locations': set(),
-        'people': set()
-    }
+def output_stem(pdf_file, input_dir):
+    """Return the stem for a PDF's '<stem>_extracted.json' output.
     
-    # Technology keywords
-    tech_keywords = [
-        'AI', 'ML', 'API', 'SaaS', 'PaaS', 'IaaS', 'cloud', 'AWS', 'Azure',
-        'GCP', 'Kubernetes', 'Docker', 'blockchain', 'IoT', 'analytics',
-        'platform', 'mobile', 'web', 'database', 'CRM', 'ERP'
-    ]
+    The stem depends only on the file's path relative to input_dir, so a
+    file keeps its outputs whatever other files are present. Top-level files
+    keep their own stem and nested files are named after their relative
+    path, with directories joined by '__'. If that join cannot be split back
+    into the path (a name containing '__', or '_' next to a separator), a
+    short hash of the path is appended so the stem stays unique.
+    """
+    parts = pdf_file.relative_to(input_dir).with_suffix('').parts
+    stem = '__'.join(parts)
+    if stem.split('__') != list(parts):
+        path = '/'.join(parts).encode('utf-8')
+        stem += '-' + hashlib.sha256(path).hexdigest()[:8]
+    return stem
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def extraction_signature(digest, keywords=None, preview=None):
+    """Identify the output of extracting a PDF with the given settings.
+    
+    The signature is the file's content digest and the PyPDF2 version, plus
+    a hash of the section keywords and preview options when they are set,
+    since those change the sections and pages that are written.
+    """
+    signature = f"{digest}:pypdf2-{PyPDF2.__version__}"
+    settings = {name: value for name, value in (('keywords', keywords), ('preview', preview)) if value}
+    if settings:
+        encoded = json.dumps(settings, sort_keys=True).encode('utf-8')
+        signature += ':' + hashlib.sha256(encoded).hexdigest()[:16]
+    return signature
+
+class PageCache:
+    """Persistent cache of extracted PDF text keyed by content hash.
+    
+    Stored in SQLite with one row per document (its metadata) and one row per
+    non-empty page. Keys include the PyPDF2 version, so upgrading the parser
+    invalidates old entries. Documents are only written once every page range
+    has been extracted, so a cached document is always complete.
+    """
+    
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (key, page)
+            );
+        """)
+        self.hits = 0
+        self.misses = 0
+        self.pages_served = 0
     
-    # Look for capitalized phrases (potential companies/products)
-    cap_pattern = r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b'
-    potential_entities = re.findall(cap_pattern, text)
+    @staticmethod
+    def key(digest):
+        return f"{digest}:pypdf2-{PyPDF2.__version__}"
     
-    for entity in potential_entities:
-        if len(entity) > 3 and entity not in ['The', 'This', 'That', 'These', 'Those']:
-            entities['companies'].add(entity)
+    def load(self, digest):
+        """Return (metadata, pages) for a cached document, or None.
+        
+        pages is a generator reading the cached pages a batch at a time.
+        """
+        key = self.key(digest)
+        row = self.conn.execute(
+            'SELECT metadata FROM documents WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return json.loads(row[0]), self.iter_pages(key)
+    
+    def iter_pages(self, key, batch=64):
+        # Each batch is a fresh query, so no cursor stays open across writes
+        last = 0
+        while True:
+            rows = self.conn.execute(
+                'SELECT page, text FROM pages WHERE key = ? AND page > ? ORDER BY page LIMIT ?',
+                (key, last, batch)
+            ).fetchall()
+            for page, text in rows:
+                self.pages_served += 1
+                yield {'page': page, 'text': text}
+            if len(rows) < batch:
+                return
+            last = rows[-1][0]
+    
+    def storing(self, digest, metadata, pages, failed=()):
+        """Yield pages while caching them; the document is stored once they run out.
+        
+        A document abandoned part way, or with pages listed in failed once
+        its pages run out, is never recorded, so it cannot be served
+        incomplete.
+        """
+        key = self.key(digest)
+        self.conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+        for page in pages:
+            self.conn.execute(
+                'INSERT INTO pages (key, page, text) VALUES (?, ?, ?)',
+                (key, page['page'], page['text'])
+            )
+            yield page
+        with self.conn:
+            if failed:
+                self.conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+                return
+            self.conn.execute(
+                'INSERT OR REPLACE INTO documents (key, metadata) VALUES (?, ?)',
+                (key, json.dumps(metadata, ensure_ascii=False))
+            )
     
-    # Look for technology terms
-    for tech in tech_keywords:
-        if re.search(r'\b' + re.escape(tech) + r'\b', text, re.IGNORECASE):
-            entities['technologies'].add(tech)
+    def store(self, digest, metadata, pages):
+        """Cache the metadata and extracted pages of a document."""
+        for _ in self.storing(digest, metadata, pages):
+            pass
     
-    return {k: list(v) for k, v in entities.items()}
+    def close(self):
+        self.conn.close()
 
-def analyze_company_info(extracted_data):
-    """Analyze extracted data for key company information."""
-    analysis = {
-        'company_name': '',
-        'industry': '',
-        'products': [],
-        'technologies': [],
-        'key_terms': [],
-        'metrics': [],
-        'urls': [],
-        'emails': [],
-        'entities': {
-            'companies': [],
-            'products': [],
-            'technologies': []
+def iter_pdf_contents(pdf_files, jobs=1, pages_per_task=PAGES_PER_TASK, analyze=False, cache=None,
+                      preview=None):
+    """Yield extract_pdf_content() results for pdf_files, in order.
+    
+    Each document's 'content' is an iterable of pages to be consumed before
+    the next document is requested; the document's analysis and cache entry
+    are complete once it is exhausted. Serially, pages are extracted (or
+    read from the cache) one at a time as they are consumed, so only a
+    single page of text is held in memory.
+    
+    With jobs > 1 documents are extracted in a process pool, at most
+    MAX_DOCS_PER_JOB * jobs documents at a time. Page ranges are submitted
+    as workers free up, earliest document first: the first range of a
+    document reports its page count, after which the remaining ranges of a
+    large document are queued ahead of later documents. Parts are
+    reassembled in page order and documents are yielded in input order, so
+    the results are identical to a serial run. Page errors are collected by
+    the workers and printed here as each document is yielded.
+    
+    With analyze=True each document also carries an 'analysis' entry: a
+    CorpusAnalyzer over its pages, built inside the workers per page range
+    and merged in page order.
+    
+    With a PageCache, documents whose content hash is cached are served
+    without parsing, and newly extracted documents are added to it unless
+    some of their pages failed to extract. Files are hashed and looked up
+    only as they are reached (or enter the in-flight window), so cached
+    pages are read as they are consumed.
+    
+    With preview options each document is extracted as a single preview
+    part. Fully cached documents are still served from the cache, but
+    previews are never stored in it.
+    
+    Documents also carry a 'digest' entry (their content hash, or None if
+    the file could not be read) and a 'failed' list of page errors, complete
+    once the content is exhausted.
+    """
+    def lookup(pdf_file):
+        """Return (digest, cached data or None) for a file."""
+        try:
+            digest = file_digest(pdf_file)
+        except OSError:
+            return None, None
+        cached = cache.load(digest) if cache else None
+        if cached is None:
+            return digest, None
+        return digest, {
+            'filename': os.path.basename(str(pdf_file)),
+            'metadata': cached[0],
+            'content': cached[1]
         }
-    }
     
-    all_text = ''
-    for doc in extracted_data:
-        for page in doc['content']:
-            all_text += page['text'] + '\n'
+    def analyzed(analyzer, filename, pages):
+        for page in pages:
+            analyzer.add_page(page['text'], {'file': filename, 'page': page['page']})
+            yield page
+    
+    def reported(pages, failed):
+        yield from pages
+        report_page_errors(failed)
+    
+    def finish(data, digest, from_cache, failed=()):
+        """Cache fresh pages and analyze them as the caller consumes them."""
+        data['digest'] = digest
+        data['failed'] = failed
+        pages = data['content']
+        if cache and digest and not from_cache and not preview:
+            pages = cache.storing(digest, data['metadata'], pages, failed)
+        if analyze and 'analysis' not in data:
+            data['analysis'] = CorpusAnalyzer()
+            pages = analyzed(data['analysis'], data['filename'], pages)
+        data['content'] = pages
+        return data
+    
+    if jobs <= 1:
+        for pdf_file in pdf_files:
+            digest, data = lookup(pdf_file)
+            from_cache = data is not None
+            failed = []
+            if not from_cache:
+                data = extract_pdf_content(str(pdf_file), preview, lazy=True, failed=failed)
+                if data:
+                    data['content'] = reported(data['content'], failed)
+            yield finish(data, digest, from_cache, failed) if data else None
+        return
     
-    # Extract URLs
-    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    analysis['urls'] = list(set(re.findall(url_pattern, all_text)))
+    task = analyze_pdf_part if analyze else extract_pdf_part
+    if preview:
+        task = partial(task, preview=preview)
+    count = len(pdf_files)
     
-    # Extract emails
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    analysis['emails'] = list(set(re.findall(email_pattern, all_text)))
+    # Per-document state for the documents in the window [next_doc, admitted)
+    docs = {}
+    queue = []
+    next_doc = admitted = 0
     
-    # Extract potential metrics (numbers with units/context)
-    metrics_patterns = [
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = {}
+        while next_doc < count:
+            while admitted < min(count, next_doc + MAX_DOCS_PER_JOB * jobs):
+                digest, cached = lookup(pdf_files[admitted])
+                docs[admitted] = {'digest': digest, 'cached': cached, 'metadata': None,
+                                  'parts': {}, 'analyses': {}, 'failed': {},
+                                  'expected': None, 'error': None}
+                if cached is None:
+                    heapq.heappush(queue, (admitted, 0, 0))
+                admitted += 1
+            
+            while queue and len(pending) < jobs:
+                idx, part, start = heapq.heappop(queue)
+                future = executor.submit(task, str(pdf_files[idx]), start,
+                                         start + pages_per_task)
+                pending[future] = (idx, part)
+            
+            doc = docs[next_doc]
+            if doc['cached'] or doc['error'] or len(doc['parts']) == doc['expected']:
+                pdf_path = str(pdf_files[next_doc])
+                del docs[next_doc]
+                if doc['cached']:
+                    yield finish(doc['cached'], doc['digest'], True)
+                elif doc['error']:
+                    print(f"  ✗ Error reading PDF {pdf_path}: {doc['error']}")
+                    yield None
+                else:
+                    failed = [error for part in sorted(doc['failed'])
+                              for error in doc['failed'][part]]
+                    report_page_errors(failed)
+                    data = {
+                        'filename': os.path.basename(pdf_path),
+                        'metadata': doc['metadata'],
+                        'content': [page for part in sorted(doc['parts'])
+                                    for page in doc['parts'][part]]
+                    }
+                    if analyze:
+                        data['analysis'] = CorpusAnalyzer()
+                        for part in sorted(doc['analyses']):
+                            data['analysis'].merge(doc['analyses'][part])
+                    yield finish(data, doc['digest'], False, failed)
+                next_doc += 1
+                continue
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx, part = pending.pop(future)
+                doc = docs[idx]
+                if doc['error']:
+                    continue
+                try:
+                    doc_metadata, page_count, pages, failed, *analysis = future.result()
+                except Exception as e:
+                    doc['error'] = e
+                    continue
+                
+                doc['parts'][part] = pages
+                doc['failed'][part] = failed
+                if analysis:
+                    doc['analyses'][part] = analysis[0]
+                if part == 0:
+                    doc['metadata'] = doc_metadata
+                    starts = range(pages_per_task, 0 if preview else page_count, pages_per_task)
+                    doc['expected'] = 1 + len(starts)
+                    for part_num, start in enumerate(starts, 1):
+                        heapq.heappush(queue, (idx, part_num, start))
+
+# Keywords for section identification
+SECTION_KEYWORDS = {
+    'company_overview': [
+        'about us', 'company overview', 'who we are', 'introduction', 
+        'history', 'our company', 'company profile', 'background',
+        'founded', 'established', 'headquarters'
+    ],
+    'products_services': [
+        'products', 'services', 'solutions', 'offerings', 'portfolio',
+        'what we do', 'our products', 'our services', 'product line',
+        'capabilities', 'features'
+    ],
+    'business_model': [
+        'business model', 'revenue model', 'how we work', 'operations',
+        'business operations', 'operating model', 'value chain'
+    ],
+    'market_position': [
+        'market', 'industry', 'competitive', 'position', 'landscape',
+        'market share', 'market leader', 'market opportunity',
+        'addressable market', 'tam', 'market size'
+    ],
+    'financials': [
+        'financial', 'revenue', 'earnings', 'profit', 'growth',
+        'income', 'balance sheet', 'cash flow', 'ebitda',
+        'quarterly results', 'annual results', 'financial performance'
+    ],
+    'technology': [
+        'technology', 'platform', 'infrastructure', 'technical', 
+        'innovation', 'architecture', 'tech stack', 'engineering',
+        'software', 'hardware', 'systems', 'r&d', 'research'
+    ],
+    'customers': [
+        'customers', 'clients', 'partners', 'case study', 'testimonial',
+        'user', 'customer success', 'client stories', 'references',
+        'implementations'
+    ],
+    'strategy': [
+        'strategy', 'vision', 'mission', 'goals', 'objectives', 
+        'roadmap', 'strategic', 'future', 'plans', 'priorities',
+        'initiatives', 'direction'
+    ]
+}
+
+# Lines shorter than this that contain a section keyword start a new section
+HEADER_MAX_CHARS = 100
+
+# Number of characters of document text kept as 'full_text' in the output
+FULL_TEXT_PREVIEW_CHARS = 1000
+
+def compile_section_pattern(keyword_lists):
+    """Compile per-section keyword lists into one whole-word header pattern.
+    
+    The pattern is a single alternation between \\b anchors with one named
+    group 's<rank>' per section, in order, over that section's lowercased
+    keywords, longest first. Among the keywords starting at the position a
+    search stops at, the first listed section's group is the one that
+    matches.
+    """
+    alternatives = []
+    for rank, words in enumerate(keyword_lists):
+        words = sorted(dict.fromkeys(word.lower() for word in words if word), key=len, reverse=True)
+        if words:
+            alternatives.append('(?P<s%d>%s)' % (rank, '|'.join(map(re.escape, words))))
+    return re.compile(r'\b(?:%s)\b' % '|'.join(alternatives) if alternatives else r'(?!)')
+
+class SectionClassifier:
+    """Header-driven section state machine.
+    
+    Lines are fed one page at a time; every non-empty line is assigned to the
+    section opened by the most recent header line, starting in 'other'.
+    State carries across feed() calls, so a document can be classified page
+    by page without ever joining its text.
+    
+    Header lines are matched against all section keywords with one compiled
+    pattern (see compile_section_pattern), on whole words only. When a
+    header matches keywords of several sections, the section listed first
+    in the table wins. Patterns are cached per keyword table.
+    """
+    
+    _patterns = {}
+    
+    def __init__(self, keywords=None):
+        self.keywords = SECTION_KEYWORDS if keywords is None else keywords
+        self.sections = list(self.keywords) + ['other']
+        self.current_section = 'other'
+        
+        table = tuple((section, tuple(words)) for section, words in self.keywords.items())
+        self.pattern = self._patterns.get(table)
+        if self.pattern is None:
+            self.pattern = self._patterns[table] = compile_section_pattern(
+                words for _, words in table)
+    
+    def match(self, line):
+        """Return the section a header line opens, or None."""
+        line_lower = line.lower().strip()
+        
+        # Check if line is a section header
+        if not line_lower or len(line_lower) >= HEADER_MAX_CHARS:
+            return None
+        
+        # Search again from just after each match start, so keywords that
+        # begin inside a longer match of a later section are still found
+        best = None
+        search = self.pattern.search
+        match = search(line_lower)
+        while match:
+            rank = int(match.lastgroup[1:])
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+            match = search(line_lower, match.start() + 1)
+        return None if best is None else self.sections[best]
+    
+    def classify(self, line):
+        """Update the current section from a line and return it."""
+        section = self.match(line)
+        if section is not None:
+            self.current_section = section
+        return self.current_section
+    
+    def feed(self, text):
+        """Yield (section, line) for every non-empty line of text."""
+        for section, start, end in self.feed_spans(text):
+            yield section, text[start:end]
+    
+    def feed_spans(self, text):
+        """Like feed(), but yield (section, start, end) offsets into text."""
+        start = 0
+        for line in text.split('\n'):
+            end = start + len(line)
+            section = self.classify(line)
+            if line.strip():
+                yield section, start, end
+            start = end + 1
+
+def load_section_keywords(path):
+    """Load a section keyword table from a JSON file.
+    
+    The file maps section names to lists of keywords and replaces
+    SECTION_KEYWORDS; sections are tried in file order.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        keywords = json.load(f)
+    
+    if not isinstance(keywords, dict) or not all(
+            isinstance(words, list) and all(isinstance(word, str) for word in words)
+            for words in keywords.values()):
+        raise ValueError(f"{path}: expected an object mapping section names to keyword lists")
+    if 'other' in keywords:
+        raise ValueError(f"{path}: 'other' is reserved for unclassified content")
+    
+    return keywords
+
+def extract_key_sections(text, keywords=None):
+    """Extract key sections from text based on common headers."""
+    classifier = SectionClassifier(keywords)
+    sections = {section: [] for section in classifier.sections}
+    
+    for section, line in classifier.feed(text):
+        sections[section].append(line)
+    
+    return sections
+
+def write_extracted_json(output_file, metadata, pages, keywords=None, text_store=None,
+                         signature=None, failed=()):
+    """Classify pages into sections and write the per-document JSON.
+    
+    pages may be any iterable, such as the lazily extracted content from
+    iter_pdf_contents(); it is consumed once. Section text is spooled to
+    temporary files as each page is classified and copied into output_file
+    at the end, so the writer holds one page of text at a time. The JSON
+    matches json.dump(indent=2) of the metadata/sections/full_text/stats
+    document.
+    
+    With a text_store path, the complete text is also written there with
+    TextStoreWriter, labelled with the classified sections, and the JSON
+    gains a 'text_store' entry holding that path relative to the directory
+    of output_file.
+    
+    A signature (see extraction_signature()) is written as the first entry,
+    where SearchIndex.update() and later runs read it to skip unchanged
+    documents. It is left out if failed, a list of page errors filled in
+    while pages are extracted, is non-empty once they are consumed, so the
+    document is extracted again next run.
+    
+    Returns the 'stats' dictionary that was written.
+    """
+    classifier = SectionClassifier(keywords)
+    text_writer = TextStoreWriter(text_store) if text_store else None
+    spools = {}
+    preview = ''
+    total_chars = 0
+    total_pages = 0
+    
+    try:
+        for page in pages:
+            text = page['text']
+            if total_pages:
+                text_len = len(text) + 1
+                joined = '\n' + text
+            else:
+                text_len = len(text)
+                joined = text
+            total_pages += 1
+            total_chars += text_len
+            if len(preview) <= FULL_TEXT_PREVIEW_CHARS:
+                preview += joined[:FULL_TEXT_PREVIEW_CHARS + 1 - len(preview)]
+            page_start = text_writer.add_page(page['page'], text) if text_writer else 0
+            
+            for section, start, end in classifier.feed_spans(text):
+                line = text[start:end]
+                if text_writer:
+                    text_writer.mark_section(section, page_start + start)
+                escaped = json.dumps(line, ensure_ascii=False)[1:-1]
+                spool = spools.get(section)
+                if spool is None:
+                    spool = spools[section] = tempfile.TemporaryFile('w+', encoding='utf-8')
+                else:
+                    spool.write('\\n')
+                spool.write(escaped)
+        
+        found = [section for section in classifier.sections if section in spools]
+        stats = {
+            'total_pages': total_pages,
+            'total_chars': total_chars,
+            'sections_found': found
+        }
+        full_text = preview[:FULL_TEXT_PREVIEW_CHARS] + '...' if total_chars > FULL_TEXT_PREVIEW_CHARS else preview
+        
+        head = {'signature': signature} if signature and not failed else {}
+        head['metadata'] = metadata
+        head = json.dumps(head, indent=2, ensure_ascii=False)
+        tail = {'full_text': full_text}
+        if text_writer:
+            text_writer.close()
+            text_writer = None
+            tail['text_store'] = os.path.relpath(
+                text_store, os.path.dirname(os.path.abspath(output_file))
+            ).replace(os.sep, '/')
+        tail['stats'] = stats
+        tail = json.dumps(tail, indent=2, ensure_ascii=False)
+        
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(head[:-2] + ',\n  "sections": {')
+            for idx, section in enumerate(found):
+                f.write(',\n' if idx else '\n')
+                f.write(f'    {json.dumps(section)}: "')
+                spool = spools[section]
+                spool.seek(0)
+                shutil.copyfileobj(spool, f)
+                f.write('"')
+            f.write('\n  },' if found else '},')
+            f.write(tail[1:])
+    finally:
+        for spool in spools.values():
+            spool.close()
+        if text_writer:
+            text_writer.data_file.close()
+    
+    return stats
+
+# Technology keywords
+TECH_KEYWORDS = [
+    'AI', 'ML', 'API', 'SaaS', 'PaaS', 'IaaS', 'cloud', 'AWS', 'Azure',
+    'GCP', 'Kubernetes', 'Docker', 'blockchain', 'IoT', 'analytics',
+    'platform', 'mobile', 'web', 'database', 'CRM', 'ERP'
+]
+
+ENTITY_STOP_WORDS = {'The', 'This', 'That', 'These', 'Those'}
+
+# Patterns are compiled once at import and reused for every page
+URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+METRICS_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in [
         r'\$\s*\d+\.?\d*\s*(?:million|billion|trillion|M|B|T)',
         r'\d+\.?\d*\s*(?:million|billion|trillion)\s*(?:dollars|users|customers|employees)',
         r'\d+\.?\d*\s*(?:%|percent)',
         r'\d+\.?\d*[kKmMbBtT]\s*(?:users|customers|employees|revenue)',
     ]
+]
+# Capitalized phrases (potential companies/products)
+CAP_PATTERN = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b')
+# Technology terms, whole words and case-insensitive; longest first so that
+# overlapping keywords prefer the longer one
+TECH_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(tech) for tech in sorted(TECH_KEYWORDS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+TECH_NAMES = {tech.lower(): tech for tech in TECH_KEYWORDS}
+# Both in one pass. Capitalized phrases are tried first and scanned for
+# technology terms themselves, so "Cloud Platform" yields the phrase as well
+# as 'cloud' and 'platform'.
+ENTITY_PATTERN = re.compile(
+    r'(?P<phrase>' + CAP_PATTERN.pattern + r')|(?i:(?P<tech>' + TECH_PATTERN.pattern + r'))'
+)
+
+def extract_entities(text, stop_words=None):
+    """Extract named entities and key information from text."""
+    analyzer = CorpusAnalyzer()
+    analyzer.add_entities(text)
+    return analyzer.result(stop_words)['entities']
+
+def load_stop_words(path):
+    """Read entity stop words from a file, one per line; '#' starts a comment."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.split('#', 1)[0].strip() for line in f} - {''}
+
+class CorpusAnalyzer:
+    """Incremental URL, email, metric and entity aggregation.
     
-    for pattern in metrics_patterns:
-        analysis['metrics'].extend(re.findall(pattern, all_text, re.IGNORECASE))
+    Pages are consumed one at a time with add_page(), so the corpus is never
+    concatenated. Aggregates keep first-seen order and can be combined with
+    merge(); merging partial analyzers in document order gives the same
+    result as feeding every page to a single analyzer.
     
-    # Extract entities
-    entities = extract_entities(all_text)
-    analysis['entities'] = entities
+    Entities are counted, and the location of their first occurrence is
+    kept: the caller's location (file and page) plus the character offset
+    within the page. Stop words are applied in result(), so partial
+    analyzers built in worker processes need no configuration.
+    """
     
-    # Extract potential company name (from metadata or common patterns)
-    for doc in extracted_data:
-        if doc['metadata'].get('title'):
-            analysis['company_name'] = doc['metadata']['title']
-            break
+    ENTITY_TYPES = ['companies', 'products', 'technologies', 'locations', 'people']
     
-    return analysis
+    def __init__(self):
+        self.company_name = ''
+        self.urls = {}
+        self.emails = {}
+        self.metrics = [[] for _ in METRICS_PATTERNS]
+        self.entities = {entity_type: {} for entity_type in self.ENTITY_TYPES}
+    
+    def add_metadata(self, metadata):
+        """Use the first document title seen as the company name."""
+        if not self.company_name and metadata.get('title'):
+            self.company_name = metadata['title']
+    
+    @staticmethod
+    def count_entity(found, name, offset, location):
+        entry = found.get(name)
+        if entry is None:
+            found[name] = [1, dict(location or {}, offset=offset)]
+        else:
+            entry[0] += 1
+    
+    def add_entities(self, text, location=None):
+        """Count capitalized phrases and technology terms in text."""
+        companies = self.entities['companies']
+        technologies = self.entities['technologies']
+        
+        for match in ENTITY_PATTERN.finditer(text):
+            phrase = match.group('phrase')
+            if phrase is None:
+                self.count_entity(technologies, TECH_NAMES[match.group('tech').lower()],
+                                  match.start(), location)
+                continue
+            
+            if len(phrase) > 3:
+                self.count_entity(companies, phrase, match.start(), location)
+            for tech in TECH_PATTERN.finditer(phrase):
+                self.count_entity(technologies, TECH_NAMES[tech.group(0).lower()],
+                                  match.start() + tech.start(), location)
+    
+    def add_page(self, text, location=None):
+        """Update every aggregate with the text of one page.
+        
+        location, such as {'file': ..., 'page': ...}, is recorded with the
+        first occurrence of each entity.
+        """
+        for url in URL_PATTERN.findall(text):
+            self.urls.setdefault(url, None)
+        for email in EMAIL_PATTERN.findall(text):
+            self.emails.setdefault(email, None)
+        for found, pattern in zip(self.metrics, METRICS_PATTERNS):
+            found.extend(pattern.findall(text))
+        self.add_entities(text, location)
+    
+    def add_document(self, doc):
+        """Add the metadata and every page of an extracted document."""
+        self.add_metadata(doc['metadata'])
+        for page in doc['content']:
+            self.add_page(page['text'], {'file': doc['filename'], 'page': page['page']})
+    
+    def merge(self, other):
+        """Append the aggregates of an analyzer that saw later pages."""
+        if not self.company_name:
+            self.company_name = other.company_name
+        self.urls.update(other.urls)
+        self.emails.update(other.emails)
+        for found, other_found in zip(self.metrics, other.metrics):
+            found.extend(other_found)
+        for entity_type, values in other.entities.items():
+            found = self.entities[entity_type]
+            for name, (count, first_seen) in values.items():
+                if name in found:
+                    found[name][0] += count
+                else:
+                    found[name] = [count, first_seen]
+        return self
+    
+    def result(self, stop_words=None):
+        """Return the aggregates in the company_analysis.json layout.
+        
+        'entities' lists entity names in first-seen order; 'entity_stats'
+        maps them to their count and first occurrence, most frequent first.
+        stop_words defaults to ENTITY_STOP_WORDS.
+        """
+        stop_words = ENTITY_STOP_WORDS if stop_words is None else stop_words
+        entities = {
+            entity_type: [(name, entry) for name, entry in found.items() if name not in stop_words]
+            for entity_type, found in self.entities.items()
+        }
+        return {
+            'company_name': self.company_name,
+            'industry': '',
+            'products': [],
+            'technologies': [],
+            'key_terms': [],
+            'metrics': [metric for found in self.metrics for metric in found],
+            'urls': list(self.urls),
+            'emails': list(self.emails),
+            'entities': {k: [name for name, _ in v] for k, v in entities.items()},
+            'entity_stats': {
+                k: {
+                    name: {'count': count, 'first_seen': first_seen}
+                    for name, (count, first_seen) in sorted(v, key=lambda item: -item[1][0])
+                }
+                for k, v in entities.items() if v
+            }
+        }
+
+def analyze_company_info(extracted_data, stop_words=None):
+    """Analyze extracted data for key company information."""
+    analyzer = CorpusAnalyzer()
+    for doc in extracted_data:
+        analyzer.add_document(doc)
+    return analyzer.result(stop_words)
 
 def main():
+    parser = argparse.ArgumentParser(
+        description='Extract and structure information from company PDF documents'
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of worker processes for PDF extraction (default: 1)'
+    )
+    parser.add_argument(
+        '--section-keywords',
+        metavar='PATH',
+        help='JSON file mapping section names to header keywords (replaces the built-in table)'
+    )
+    parser.add_argument(
+        '--cache',
+        metavar='PATH',
+        help='Page cache database (default: <output dir>/.page_cache.sqlite3)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Extract every PDF without reading or updating the page cache'
+    )
+    parser.add_argument(
+        '--include',
+        action='append',
+        metavar='PATTERN',
+        help='Glob pattern for files to extract, matched against the name or relative path (default: *.pdf; repeatable)'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        metavar='PATTERN',
+        help='Glob pattern for files or directories to skip (repeatable)'
+    )
+    parser.add_argument(
+        '--preview',
+        action='store_true',
+        help='Extract only pages under outline headings that match section keywords '
+             '(or the first and last pages when there is no outline)'
+    )
+    parser.add_argument(
+        '--preview-pages',
+        type=int,
+        default=PREVIEW_PAGES_PER_HEADING,
+        metavar='N',
+        help=f'Pages to extract per matching outline heading in preview mode (default: {PREVIEW_PAGES_PER_HEADING})'
+    )
+    parser.add_argument(
+        '--stop-words',
+        metavar='PATH',
+        help='File of extra entity stop words, one per line'
+    )
+    parser.add_argument(
+        '--no-index',
+        action='store_true',
+        help='Do not update the search index after extraction'
+    )
+    args = parser.parse_args()
+    
+    keywords = None
+    if args.section_keywords:
+        try:
+            keywords = load_section_keywords(args.section_keywords)
+        except (OSError, ValueError) as e:
+            parser.error(f"Cannot load section keywords: {e}")
+    
+    stop_words = ENTITY_STOP_WORDS
+    if args.stop_words:
+        try:
+            stop_words = stop_words | load_stop_words(args.stop_words)
+        except OSError as e:
+            parser.error(f"Cannot load stop words: {e}")
+    
     input_dir = os.environ.get('INPUT_DIR', '/tmp')
     output_dir = '/tmp/extracted_data'
     os.makedirs(output_dir, exist_ok=True)
+    cache = None if args.no_cache else PageCache(
+        args.cache or os.path.join(output_dir, '.page_cache.sqlite3')
+    )
     
     print("=" * 70)
     print("PDF EXTRACTION FOR COMPANY PRODUCT CONTEXT")
     print("=" * 70)
     
-    # Find all PDF files
-    pdf_files = list(Path(input_dir).glob('*.pdf'))
-    pdf_files.extend(Path(input_dir).glob('**/*.pdf'))
-    pdf_files = list(set(pdf_files))  # Remove duplicates
+    # Find all PDF files in a single walk, skipping our own output
+    pdf_files = find_pdf_files(input_dir, args.include, args.exclude, skip_dirs=[output_dir])
+    pdf_files, duplicates = dedupe_pdf_files(pdf_files)
     
     if not pdf_files:
         print("\n⚠ No PDF files found in input directory")
         print(f"  Searched in: {input_dir}")
         return
     
-    print(f"\n✓ Found {len(pdf_files)} PDF file(s)\n")
+    print(f"\n✓ Found {len(pdf_files)} PDF file(s)")
+    for duplicate, original in duplicates:
+        print(f"  ⚠ Skipping {duplicate.relative_to(input_dir)} (same content as {original.relative_to(input_dir)})")
+    print()
     
-    extracted_data = []
+    analyzer = CorpusAnalyzer()
+    processed = 0
+    preview = {'keywords': keywords, 'pages_per_heading': args.preview_pages} if args.preview else None
+    contents = iter_pdf_contents(pdf_files, jobs=args.jobs, analyze=True, cache=cache, preview=preview)
     
     for idx, pdf_file in enumerate(pdf_files, 1):
-        print(f"[{idx}/{len(pdf_files)}] Processing: {pdf_file.name}")
+        print(f"[{idx}/{len(pdf_files)}] Processing: {pdf_file.relative_to(input_dir)}")
         print("-" * 70)
         
-        data = extract_pdf_content(str(pdf_file))
+        data = next(contents)
         
         if data:
-            extracted_data.append(data)
-            
-            # Extract sections from content
-            all_text = '\n'.join([page['text'] for page in data['content']])
-            sections = extract_key_sections(all_text)
-            
-            # Count non-empty sections
-            non_empty_sections = [k for k, v in sections.items() if v]
+            processed += 1
+            analyzer.add_metadata(data['metadata'])
             
-            # Save individual file data
-            output_file = output_dir + f"/{pdf_file.stem}_extracted.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'metadata': data['metadata'],
-                    'sections': {k: '\n'.join(v) for k, v in sections.items() if v},
-                    'full_text': all_text[:1000] + '...' if len(all_text) > 1000 else all_text,
-                    'stats': {
-                        'total_pages': len(data['content']),
-                        'total_chars': len(all_text),
-                        'sections_found': non_empty_sections
-                    }
-                }, f, indent=2, ensure_ascii=False)
-            
-            print(f"  ✓ Extracted {len(data['content'])} pages")
-            print(f"  ✓ Found {len(non_empty_sections)} content sections")
-            print(f"  ✓ Total characters: {len(all_text):,}")
-            print(f"  ✓ Saved to: {os.path.basename(output_file)}")
+            # Classify sections page by page while writing individual file data;
+            # the document's analysis is complete once its pages are written
+            stem = output_stem(pdf_file, input_dir)
+            output_file = output_dir + f"/{stem}_extracted.json"
+            text_store = os.path.join(output_dir, FULL_TEXT_DIR, stem)
+            signature = extraction_signature(data['digest'], keywords, preview) if data['digest'] else None
+            if signature and read_signature(output_file) == signature and os.path.exists(text_store + INDEX_SUFFIX):
+                # Output is current; the pages are still read for the analysis
+                for _ in data['content']:
+                    pass
+                analyzer.merge(data['analysis'])
+                print(f"  ✓ Unchanged, kept: {os.path.basename(output_file)}")
+            else:
+                stats = write_extracted_json(output_file, data['metadata'], data['content'], keywords,
+                                             text_store, signature, data['failed'])
+                analyzer.merge(data['analysis'])
+                
+                print(f"  ✓ Extracted {stats['total_pages']} pages")
+                if 'preview' in data['metadata']:
+                    info = data['metadata']['preview']
+                    print(f"  ✓ Preview ({info['mode']}): read {len(info['pages'])} of {data['metadata']['pages']} pages")
+                print(f"  ✓ Found {len(stats['sections_found'])} content sections")
+                print(f"  ✓ Total characters: {stats['total_chars']:,}")
+                print(f"  ✓ Saved to: {os.path.basename(output_file)}")
         else:
             print(f"  ✗ Failed to extract data")
         
         print()
     
     # Analyze all extracted data
-    if extracted_data:
+    if processed:
         print("=" * 70)
         print("ANALYZING EXTRACTED DATA")
         print("=" * 70)
         
-        analysis = analyze_company_info(extracted_data)
+        analysis = analyzer.result(stop_words)
         
         analysis_file = output_dir + '/company_analysis.json'
         with open(analysis_file, 'w', encoding='utf-8') as f:
@@ -307,12 +1192,34 @@ def main():
             print(f"\n  Sample metrics:")
             for metric in analysis['metrics'][:5]:
                 print(f"    - {metric}")
+        
+        tech_stats = analysis['entity_stats'].get('technologies', {})
+        if tech_stats:
+            print(f"\n  Top technologies:")
+            for tech, stat in list(tech_stats.items())[:5]:
+                print(f"    - {tech}: {stat['count']} mention(s), first in "
+                      f"{stat['first_seen'].get('file', '?')} p.{stat['first_seen'].get('page', '?')}")
+    
+    # Bring the search index up to date with the documents now on disk
+    if not args.no_index:
+        index = SearchIndex(os.path.join(output_dir, INDEX_FILE))
+        try:
+            index_counts = index.update(output_dir)
+        finally:
+            index.close()
     
     print("\n" + "=" * 70)
     print("EXTRACTION COMPLETE")
     print("=" * 70)
-    print(f"✓ Processed {len(extracted_data)} PDF file(s)")
+    print(f"✓ Processed {processed} PDF file(s)")
+    if cache:
+        print(f"✓ Page cache: {cache.hits} hit(s), {cache.misses} miss(es), "
+              f"{cache.pages_served:,} page(s) served from cache")
+        cache.close()
     print(f"✓ Output directory: {output_dir}")
+    if not args.no_index:
+        print(f"✓ Search index: {index_counts['added']} added, {index_counts['updated']} updated, "
+              f"{index_counts['removed']} removed, {index_counts['unchanged']} unchanged")
     print(f"✓ Ready for context compilation\n")
 
 if __name__ == '__main__':
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Search Index for Company Product Context
+BM25 full-text search with phrase queries over the pages of extracted
+documents, returning passages with document, page and section references.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from text_store import FULL_TEXT_DIR, INDEX_SUFFIX, TextStore
+
+INDEX_FILE = 'search_index.sqlite3'
+
+# Passages are runs of lines within one page and section, up to this many words
+PASSAGE_WORDS = 80
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+SIGNATURE_PATTERN = re.compile(r'\{\s*"signature": "([^"\\]*)"')
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def parse_query(query):
+    """Split a query into bare terms and quoted phrases (lists of terms)."""
+    terms = []
+    phrases = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) > 1:
+                phrases.append(tokens)
+            else:
+                terms.extend(tokens)
+        else:
+            terms.extend(tokenize(word))
+    return terms, phrases
+
+def read_signature(json_file):
+    """Return the extraction signature recorded in an _extracted.json file.
+    
+    write_extracted_json() writes it as the first entry, so only the start
+    of the file is read. Returns None if the file is missing or unsigned.
+    """
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            head = f.read(512)
+    except OSError:
+        return None
+    match = SIGNATURE_PATTERN.match(head)
+    return match.group(1) if match else None
+
+def iter_passages(store):
+    """Yield (page, section, start, end, text) passages from a text store.
+    
+    Lines of a page are grouped until PASSAGE_WORDS words or a section
+    change; offsets are character offsets into the document text.
+    """
+    for page in store.pages:
+        page_start, _ = store.page_index[page]
+        text = store.page_text(page)
+        start = end = words = 0
+        section = None
+        lines = []
+        offset = page_start
+        
+        for line in text.split('\n'):
+            line_start, offset = offset, offset + len(line) + 1
+            count = len(tokenize(line))
+            if not count:
+                continue
+            
+            line_section = store.section_at(line_start)
+            if lines and (line_section != section or words + count > PASSAGE_WORDS):
+                yield page, section, start, end, '\n'.join(lines)
+                lines = []
+            if not lines:
+                start, words, section = line_start, 0, line_section
+            lines.append(line)
+            end = line_start + len(line)
+            words += count
+        
+        if lines:
+            yield page, section, start, end, '\n'.join(lines)
+
+class SearchIndex:
+    """On-disk inverted index over the text stores of an extraction run.
+    
+    Stored in SQLite: one row per document (with the extraction signature
+    from its JSON), one per passage, and one posting per (term, passage)
+    holding the term frequency and token positions. update() re-indexes only
+    documents whose signature changed, so adding documents is incremental.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                text_store TEXT NOT NULL,
+                signature TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS passages (
+                id INTEGER PRIMARY KEY,
+                doc TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                section TEXT,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS passages_doc ON passages (doc);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                passage INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                positions TEXT NOT NULL,
+                PRIMARY KEY (term, passage)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_passage ON postings (passage);
+        """)
+        self.stores = {}
+    
+    def remove_document(self, key):
+        self.conn.execute(
+            'DELETE FROM postings WHERE passage IN (SELECT id FROM passages WHERE doc = ?)', (key,)
+        )
+        self.conn.execute('DELETE FROM passages WHERE doc = ?', (key,))
+        self.conn.execute('DELETE FROM documents WHERE key = ?', (key,))
+    
+    def add_document(self, key, source, text_store, signature):
+        """(Re-)index one document from its text store."""
+        with self.conn, TextStore(os.path.join(self.base_dir, text_store)) as store:
+            self.remove_document(key)
+            self.conn.execute(
+                'INSERT INTO documents (key, source, text_store, signature) VALUES (?, ?, ?, ?)',
+                (key, source, text_store, signature)
+            )
+            for page, section, start, end, text in iter_passages(store):
+                tokens = tokenize(text)
+                passage = self.conn.execute(
+                    'INSERT INTO passages (doc, page, section, start, end, length) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, page, section, start, end, len(tokens))
+                ).lastrowid
+                
+                positions = {}
+                for position, token in enumerate(tokens):
+                    positions.setdefault(token, []).append(position)
+                self.conn.executemany(
+                    'INSERT INTO postings (term, passage, tf, positions) VALUES (?, ?, ?, ?)',
+                    [(term, passage, len(found), ' '.join(map(str, found)))
+                     for term, found in positions.items()]
+                )
+    
+    def update(self, data_dir):
+        """Bring the index in line with the documents in data_dir.
+        
+        Documents are compared by the signature at the top of their JSON,
+        which is derived from the PDF content digest, so unchanged documents
+        are skipped without reading their text stores. Documents without a
+        signature are re-indexed on every update.
+        
+        Returns a dict counting 'added', 'updated', 'removed' and 'unchanged'
+        documents. Documents without a text store are skipped.
+        """
+        counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        indexed = dict(self.conn.execute('SELECT key, signature FROM documents'))
+        seen = set()
+        
+        for json_file in sorted(Path(data_dir).glob('*_extracted.json')):
+            key = json_file.stem
+            stem = key[:-len('_extracted')]
+            store_path = os.path.join(data_dir, FULL_TEXT_DIR, stem)
+            if not os.path.exists(store_path + INDEX_SUFFIX):
+                continue
+            
+            signature = read_signature(json_file)
+            seen.add(key)
+            if signature and indexed.get(key) == signature:
+                counts['unchanged'] += 1
+                continue
+            
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            source = data.get('metadata', {}).get('title') or key
+            text_store = os.path.relpath(store_path, self.base_dir).replace(os.sep, '/')
+            self.add_document(key, source, text_store, signature or '')
+            counts['updated' if key in indexed else 'added'] += 1
+        
+        with self.conn:
+            for key in set(indexed) - seen:
+                self.remove_document(key)
+                counts['removed'] += 1
+        
+        return counts
+    
+    def postings(self, term):
+        return {
+            passage: (tf, positions)
+            for passage, tf, positions in self.conn.execute(
+                'SELECT passage, tf, positions FROM postings WHERE term = ?', (term,)
+            )
+        }
+    
+    def passage_lengths(self, passages):
+        lengths = {}
+        passages = list(passages)
+        for i in range(0, len(passages), 900):
+            batch = passages[i:i + 900]
+            lengths.update(self.conn.execute(
+                f"SELECT id, length FROM passages WHERE id IN ({','.join('?' * len(batch))})", batch
+            ))
+        return lengths
+    
+    def read_passage(self, text_store, start, end):
+        store = self.stores.get(text_store)
+        if store is None:
+            store = self.stores[text_store] = TextStore(os.path.join(self.base_dir, text_store))
+        return store.read(start, end)
+    
+    def search(self, query, k=5):
+        """Return the top-k passages for a query, best first.
+        
+        Bare terms are scored with BM25. Quoted phrases contribute their terms
+        to the score and restrict results to passages containing the phrase.
+        Each result is a dict with score, document, source, page, section and
+        text.
+        """
+        terms, phrases = parse_query(query)
+        query_terms = list(dict.fromkeys(terms + [term for phrase in phrases for term in phrase]))
+        if not query_terms:
+            return []
+        
+        passage_count, total_length = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM passages'
+        ).fetchone()
+        if not passage_count:
+            return []
+        avg_length = total_length / passage_count
+        
+        postings = {term: self.postings(term) for term in query_terms}
+        
+        if phrases:
+            candidates = None
+            for phrase in phrases:
+                matching = {
+                    passage for passage in set.intersection(*(set(postings[term]) for term in phrase))
+                    if self.contains_phrase(passage, phrase, postings)
+                }
+                candidates = matching if candidates is None else candidates & matching
+        else:
+            candidates = set().union(*(set(found) for found in postings.values()))
+        if not candidates:
+            return []
+        
+        lengths = self.passage_lengths(candidates)
+        scores = {}
+        for term in query_terms:
+            found = postings[term]
+            if not found:
+                continue
+            idf = math.log(1 + (passage_count - len(found) + 0.5) / (len(found) + 0.5))
+            for passage, (tf, _) in found.items():
+                if passage not in candidates:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[passage] / avg_length)
+                scores[passage] = scores.get(passage, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        
+        results = []
+        for passage, score in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0])):
+            doc, page, section, start, end, source, text_store = self.conn.execute(
+                'SELECT p.doc, p.page, p.section, p.start, p.end, d.source, d.text_store '
+                'FROM passages p JOIN documents d ON d.key = p.doc WHERE p.id = ?', (passage,)
+            ).fetchone()
+            results.append({
+                'score': round(score, 4),
+                'document': doc,
+                'source': source,
+                'page': page,
+                'section': section,
+                'text': self.read_passage(text_store, start, end)
+            })
+        return results
+    
+    @staticmethod
+    def contains_phrase(passage, phrase, postings):
+        """Check term positions for the phrase appearing consecutively."""
+        positions = [set(map(int, postings[term][passage][1].split())) for term in phrase]
+        return any(
+            all(first + offset in positions[offset] for offset in range(1, len(phrase)))
+            for first in positions[0]
+        )
+    
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+        self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build and query a BM25 search index over extracted PDF text'
+    )
+    parser.add_argument(
+        '--data-dir',
+        default='/tmp/extracted_data',
+        help='Extraction output directory (default: /tmp/extracted_data)'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    subparsers.add_parser('build', help='Index new and changed documents, drop removed ones')
+    
+    query_parser = subparsers.add_parser('query', help='Search the index')
+    query_parser.add_argument('query', help='Search terms; use "double quotes" for phrases')
+    query_parser.add_argument('-k', type=int, default=5, help='Number of passages to return (default: 5)')
+    query_parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    
+    args = parser.parse_args()
+    index = SearchIndex(os.path.join(args.data_dir, INDEX_FILE))
+    
+    try:
+        if args.command == 'build':
+            counts = index.update(args.data_dir)
+            print(f"✓ Search index updated: {counts['added']} added, {counts['updated']} updated, "
+                  f"{counts['removed']} removed, {counts['unchanged']} unchanged")
+            return
+        
+        started = time.perf_counter()
+        results = index.search(args.query, args.k)
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        if args.json:
+            print(json.dumps(results, indent=2, ensure_ascii=False))
+            return
+        
+        for rank, result in enumerate(results, 1):
+            section = f" ({result['section']})" if result['section'] else ''
+            print(f"[{rank}] {result['score']:.2f}  {result['source']} — {result['document']} p.{result['page']}{section}")
+            print(f"    {' '.join(result['text'].split())[:300]}")
+            print()
+        print(f"✓ {len(results)} result(s) in {elapsed:.1f} ms")
+    finally:
+        index.close()
+
+if __name__ == '__main__':
+    main()
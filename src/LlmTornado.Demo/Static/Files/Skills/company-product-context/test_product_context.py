@@ -0,0 +1,656 @@
+#!/usr/bin/env python3
+"""
+Test script for the Company Product Context skill.
+Builds small PDFs on the fly and checks the extraction pipeline.
+"""
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from extract_pdfs import (
+    ENTITY_STOP_WORDS,
+    CorpusAnalyzer,
+    PageCache,
+    SectionClassifier,
+    analyze_company_info,
+    compile_section_pattern,
+    dedupe_pdf_files,
+    extract_entities,
+    extract_key_sections,
+    extract_pdf_content,
+    extraction_signature,
+    file_digest,
+    find_pdf_files,
+    iter_pdf_contents,
+    load_stop_words,
+    output_stem,
+    write_extracted_json
+)
+from search_index import SearchIndex, read_signature
+from text_store import FULL_TEXT_DIR, TextStore, TextStoreWriter
+
+
+def write_pdf(path, pages, title="Test Document", outline=()):
+    """Write a minimal PDF with one line of text per entry of each page.
+    
+    outline is a list of (title, 0-based page) bookmarks, in order.
+    """
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", None]
+    page_ids = []
+    for lines in pages:
+        ops = [b"BT /F1 11 Tf 14 TL 50 780 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(b"(" + escaped.encode("latin-1") + b") Tj T*")
+        stream = b"\n".join(ops + [b"ET"])
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 1 0 R >> >> >>" % len(objects))
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page for page in page_ids), len(page_ids))
+    catalog = b"<< /Type /Catalog /Pages 2 0 R >>"
+    if outline:
+        root = len(objects) + 1
+        items = range(root + 1, root + 1 + len(outline))
+        objects.append(b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>" % (
+            items[0], items[-1], len(outline)))
+        for idx, (heading, page) in enumerate(outline):
+            links = (b" /Prev %d 0 R" % items[idx - 1] if idx else b"") + \
+                    (b" /Next %d 0 R" % items[idx + 1] if idx + 1 < len(outline) else b"")
+            objects.append(b"<< /Title (" + heading.encode("latin-1") + b") /Parent %d 0 R "
+                           b"/Dest [%d 0 R /Fit]%s >>" % (root, page_ids[page], links))
+        catalog = b"<< /Type /Catalog /Pages 2 0 R /Outlines %d 0 R >>" % root
+    objects.append(b"<< /Title (" + title.encode("latin-1") + b") >>")
+    objects.append(catalog)
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, len(objects), len(objects) - 1, xref)
+    Path(path).write_bytes(bytes(out))
+
+
+def sample_pages(count, lines=6, seed=0):
+    """Pages alternating between section headers, with numbered body lines."""
+    headers = ["About Us", "Our Products", "Business Model", "Market Opportunity"]
+    return [
+        [headers[(page + seed) % len(headers)]] +
+        [f"Acme Widget Pro page {page} line {line} revenue $ {line}.5 million" for line in range(lines)]
+        for page in range(count)
+    ]
+
+
+def read_documents(documents):
+    """Consume iter_pdf_contents() like the CLI, each document's pages before the next."""
+    result = []
+    for doc in documents:
+        if doc:
+            doc['content'] = list(doc['content'])
+        result.append(doc)
+    return result
+
+
+def test_parallel_extraction():
+    """Test that parallel extraction matches a serial run."""
+    print("Testing Parallel Extraction...")
+    
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_pdf(tmp / "report.pdf", sample_pages(12), title="Annual Report")
+        write_pdf(tmp / "deck.pdf", sample_pages(3, seed=1), title="Deck")
+        (tmp / "broken.pdf").write_bytes(b"not a pdf")
+        files = [tmp / "report.pdf", tmp / "broken.pdf", tmp / "deck.pdf"]
+        
+        serial = read_documents(iter_pdf_contents(files, jobs=1, analyze=True))
+        parallel = read_documents(iter_pdf_contents(files, jobs=2, pages_per_task=5, analyze=True))
+        
+        assert serial[1] is None and parallel[1] is None, "Unreadable files should yield None"
+        assert [page['page'] for page in serial[0]['content']] == list(range(1, 13)), \
+            "Every page should be extracted"
+        strip = lambda docs: [doc and {key: doc[key] for key in ('filename', 'metadata', 'content')}
+                              for doc in docs]
+        assert strip(parallel) == strip(serial), "Page ranges should be reassembled in order"
+        print("  ✓ Split documents reassemble to the serial result")
+        
+        results = lambda docs: [doc['analysis'].result() for doc in docs if doc]
+        assert results(parallel) == results(serial), "Merged analyses should match the serial ones"
+        print("  ✓ Per-range analyses merge to the serial result")
+        
+        for num in range(6):
+            write_pdf(tmp / f"memo{num}.pdf", sample_pages(2 + num * 2, seed=num), title=f"Memo {num}")
+        files += sorted(tmp.glob("memo*.pdf"))
+        serial = read_documents(iter_pdf_contents(files, jobs=1))
+        parallel = read_documents(iter_pdf_contents(files, jobs=2, pages_per_task=3))
+        assert strip(parallel) == strip(serial), "Documents beyond the in-flight window should follow in order"
+        print("  ✓ More documents than the in-flight window stay in input order")
+    
+    print("✓ Parallel Extraction tests passed\n")
+
+
+def test_streaming_extraction():
+    """Test page-at-a-time extraction, classification and JSON writing."""
+    print("Testing Streaming Extraction...")
+    
+    import json
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_pdf(tmp / "report.pdf", sample_pages(8, lines=12), title="Annual Report")
+        
+        doc = extract_pdf_content(str(tmp / "report.pdf"), lazy=True)
+        assert not isinstance(doc["content"], list), "Lazy content should be a generator"
+        assert next(doc["content"])["page"] == 1, "Pages should be extracted on demand"
+        doc["content"].close()
+        pages = extract_pdf_content(str(tmp / "report.pdf"))["content"]
+        assert [page["page"] for page in pages] == list(range(1, 9)), "Eager content should list every page"
+        print("  ✓ Pages are extracted one at a time")
+        
+        # The streamed writer must match dumping the fully joined document
+        text = "\n".join(page["text"] for page in pages)
+        sections = {name: "\n".join(lines) for name, lines in extract_key_sections(text).items() if lines}
+        expected = json.dumps({
+            "metadata": {"title": "Annual Report"},
+            "sections": sections,
+            "full_text": text[:1000] + "..." if len(text) > 1000 else text,
+            "stats": {"total_pages": 8, "total_chars": len(text), "sections_found": list(sections)}
+        }, indent=2, ensure_ascii=False)
+        doc = extract_pdf_content(str(tmp / "report.pdf"), lazy=True)
+        write_extracted_json(str(tmp / "out.json"), {"title": "Annual Report"}, doc["content"])
+        assert (tmp / "out.json").read_text(encoding="utf-8") == expected, \
+            "Streamed sections should match classifying the joined text"
+        print("  ✓ Streamed JSON matches whole-document classification")
+        
+        cache = PageCache(str(tmp / "pages.sqlite3"))
+        doc = next(iter_pdf_contents([tmp / "report.pdf"], cache=cache, analyze=True))
+        for _ in zip(range(3), doc["content"]):
+            pass
+        doc["content"].close()
+        assert cache.load(file_digest(tmp / "report.pdf")) is None, \
+            "Partly read documents should not be cached"
+        assert len(doc["analysis"].result()["metrics"]) < len(read_documents(
+            iter_pdf_contents([tmp / "report.pdf"], analyze=True))[0]["analysis"].result()["metrics"]), \
+            "Analysis should follow the pages consumed"
+        cache.close()
+        print("  ✓ Cache entries and analysis are built as pages are consumed")
+    
+    print("✓ Streaming Extraction tests passed\n")
+
+
+def test_corpus_analyzer():
+    """Test that merged per-range analyzers match a single serial pass."""
+    print("Testing Corpus Analyzer...")
+    
+    import tempfile
+    
+    pages = [
+        "Acme Widget Pro runs on AWS and Azure, see https://acme.example/pricing",
+        "Contact sales@acme.example about the Cloud Platform, up 25% this year",
+        "Acme Widget Pro reached $ 12.5 million and 3 million customers on AWS",
+        "Write to sales@acme.example or visit https://acme.example/pricing again",
+        "The Cloud Platform API serves 40k users; Acme Widget Pro grew 10 percent",
+    ]
+    location = lambda page: {"file": "report.pdf", "page": page}
+    
+    serial = CorpusAnalyzer()
+    serial.add_metadata({"title": "Acme Corp"})
+    for page, text in enumerate(pages, 1):
+        serial.add_page(text, location(page))
+    
+    for size in (1, 2, 3):
+        parts = []
+        for start in range(0, len(pages), size):
+            part = CorpusAnalyzer()
+            for page in range(start + 1, min(start + size, len(pages)) + 1):
+                part.add_page(pages[page - 1], location(page))
+            parts.append(part)
+        merged = CorpusAnalyzer()
+        merged.add_metadata({"title": "Acme Corp"})
+        for part in parts:
+            merged.merge(part)
+        assert merged.result() == serial.result(), f"Ranges of {size} pages should merge to the serial result"
+    result = serial.result()
+    assert result["urls"] == ["https://acme.example/pricing"] and result["emails"] == ["sales@acme.example"], \
+        "URLs and emails should be deduplicated in first-seen order"
+    assert result["entity_stats"]["companies"]["Acme Widget Pro"]["first_seen"]["page"] == 1, \
+        "Merged entities should keep the earliest occurrence"
+    print("  ✓ Page ranges merge to the serial result")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for num in range(3):
+            write_pdf(tmp / f"doc{num}.pdf", [[text] for text in pages[num:]] * 2, title=f"Doc {num}")
+        files = sorted(tmp.glob("doc*.pdf"))
+        expected = analyze_company_info(read_documents(iter_pdf_contents(files)))
+        for jobs, pages_per_task in ((1, 50), (2, 3), (3, 1)):
+            merged = CorpusAnalyzer()
+            for doc in read_documents(iter_pdf_contents(files, jobs=jobs, pages_per_task=pages_per_task,
+                                                         analyze=True)):
+                merged.add_metadata(doc["metadata"])
+                merged.merge(doc["analysis"])
+            assert merged.result() == expected, f"jobs={jobs} should match analyzing the documents serially"
+    print("  ✓ Per-document analyses from workers match analyze_company_info()")
+    
+    print("✓ Corpus Analyzer tests passed\n")
+
+
+def test_section_keywords():
+    """Test whole-word keyword matching and section transitions."""
+    print("Testing Section Keywords...")
+    
+    pattern = compile_section_pattern([["tam", "market", "market size"], ["size", "market"], []])
+    assert [(match.group(), match.lastgroup) for match in pattern.finditer("market size, tam_x size")] == \
+        [("market size", "s0"), ("size", "s1")], "Longest keywords should win, whole words only"
+    assert pattern.match("market").lastgroup == "s0", "Earlier sections should win at the same position"
+    assert compile_section_pattern([[], []]).search("anything") is None, "Empty tables match nothing"
+    print("  ✓ Keywords compile to one whole-word pattern with a group per section")
+    
+    classifier = SectionClassifier({"market": ["tam", "market size"], "products": ["products", "market"]})
+    assert classifier.match("Our TAM") == "market", "Headers should match case-insensitively"
+    assert classifier.match("Stamp collection") is None, "Keywords should not match inside words"
+    assert classifier.match("Products and market size") == "market", "The first listed section should win"
+    nested = SectionClassifier({"size": ["size"], "market": ["market size"]})
+    assert nested.match("Market size") == "size", "Keywords inside longer matches should still count"
+    assert classifier.match("products " + "x" * 100) is None, "Long lines are not headers"
+    print("  ✓ Headers match whole words with first-listed precedence")
+    
+    text = "Intro line\nOur Products\nWidget\n\nstamp duty\nMarket Size\nHuge"
+    sections = extract_key_sections(text, classifier.keywords)
+    assert sections == {"market": ["Market Size", "Huge"], "products": ["Our Products", "Widget", "stamp duty"],
+                        "other": ["Intro line"]}, "Lines should follow the most recent header"
+    
+    paged = SectionClassifier(classifier.keywords)
+    lines = [pair for page in text.split("\n\n") for pair in paged.feed(page)]
+    assert [section for section, _ in lines] == ["other", "products", "products", "products", "market", "market"], \
+        "Section state should carry across pages"
+    print("  ✓ Sections carry across lines and pages")
+    
+    print("✓ Section Keywords tests passed\n")
+
+
+def test_page_cache():
+    """Test content-addressed page caching and invalidation."""
+    print("Testing Page Cache...")
+    
+    import tempfile
+    import extract_pdfs
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_pdf(tmp / "report.pdf", sample_pages(4), title="Annual Report")
+        files = [tmp / "report.pdf"]
+        cache = PageCache(str(tmp / "cache" / "pages.sqlite3"))
+        
+        fresh = read_documents(iter_pdf_contents(files, cache=cache))
+        assert (cache.hits, cache.misses) == (0, 1), "First run should miss"
+        cached = read_documents(iter_pdf_contents(files, cache=cache))
+        assert (cache.hits, cache.pages_served) == (1, 4), "Second run should be served from the cache"
+        assert cached == fresh, "Cached documents should match fresh extraction"
+        print("  ✓ Unchanged files are served from the cache")
+        
+        (tmp / "renamed.pdf").write_bytes((tmp / "report.pdf").read_bytes())
+        read_documents(iter_pdf_contents([tmp / "renamed.pdf"], cache=cache))
+        assert cache.hits == 2, "Entries should be keyed by content, not path"
+        write_pdf(tmp / "report.pdf", sample_pages(5), title="Annual Report")
+        read_documents(iter_pdf_contents(files, cache=cache))
+        assert (cache.hits, cache.misses) == (2, 2), "Changed content should miss"
+        print("  ✓ Entries are keyed by content")
+        
+        version = extract_pdfs.PyPDF2.__version__
+        try:
+            extract_pdfs.PyPDF2.__version__ = version + ".post1"
+            read_documents(iter_pdf_contents(files, cache=cache))
+            assert cache.misses == 3, "A parser upgrade should invalidate entries"
+        finally:
+            extract_pdfs.PyPDF2.__version__ = version
+        read_documents(iter_pdf_contents(files, cache=cache))
+        assert cache.hits == 3, "Entries of the current parser version should remain"
+        print("  ✓ PyPDF2 version changes invalidate entries")
+        
+        write_pdf(tmp / "memo.pdf", sample_pages(3, seed=2), title="Memo")
+        page_class = extract_pdfs.PyPDF2.PageObject
+        extract_text = page_class.extract_text
+        def failing(page, *args, **kwargs):
+            text = extract_text(page, *args, **kwargs)
+            if "page 1 " in text:
+                raise ValueError("bad content stream")
+            return text
+        try:
+            page_class.extract_text = failing
+            partial = read_documents(iter_pdf_contents([tmp / "memo.pdf"], cache=cache))
+        finally:
+            page_class.extract_text = extract_text
+        assert [page['page'] for page in partial[0]['content']] == [1, 3], "Failed pages should be skipped"
+        assert cache.load(file_digest(tmp / "memo.pdf")) is None, \
+            "Documents with failed pages should not be cached"
+        read_documents(iter_pdf_contents([tmp / "memo.pdf"], cache=cache))
+        assert cache.load(file_digest(tmp / "memo.pdf")) is not None, "A clean extraction should be cached"
+        print("  ✓ Documents with failed pages are not cached")
+        cache.close()
+    
+    print("✓ Page Cache tests passed\n")
+
+
+def test_preview_extraction():
+    """Test outline-driven page selection and head/tail sampling in preview mode."""
+    print("Testing Preview Extraction...")
+    
+    import tempfile
+    import extract_pdfs
+    
+    preview = {"keywords": None, "pages_per_heading": 3}
+    pages_of = lambda doc: [page["page"] for page in doc["content"]]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        outline = [("Introduction", 0), ("Products and Services", 3), ("Financial Statements", 10),
+                   ("Legal Notes", 20), ("Market Overview", 24), ("Appendix", 25)]
+        write_pdf(tmp / "report.pdf", sample_pages(30), title="Annual Report", outline=outline)
+        doc = extract_pdf_content(str(tmp / "report.pdf"), preview)
+        info = doc["metadata"]["preview"]
+        assert info["mode"] == "outline", "Matching outline headings should drive the selection"
+        assert [(heading["title"], heading["section"], heading["page"]) for heading in info["headings"]] == [
+            ("Introduction", "company_overview", 1), ("Products and Services", "products_services", 4),
+            ("Financial Statements", "financials", 11), ("Market Overview", "market_position", 25)], \
+            "Only headings matching a section keyword should be listed"
+        assert info["pages"] == [1, 2, 3, 4, 5, 6, 11, 12, 13, 25], \
+            "Each heading should contribute its first pages, up to the next heading"
+        assert pages_of(doc) == info["pages"], "Only the selected pages should be extracted"
+        print("  ✓ Outline headings select the pages of matching sections")
+        
+        write_pdf(tmp / "deck.pdf", sample_pages(30, seed=1), title="Deck",
+                  outline=[("Cover", 0), ("Appendix", 12)])
+        write_pdf(tmp / "memo.pdf", sample_pages(8, seed=2), title="Memo")
+        write_pdf(tmp / "plain.pdf", sample_pages(30, seed=3), title="Plain")
+        for name in ("deck.pdf", "plain.pdf"):
+            info = extract_pdf_content(str(tmp / name), preview)["metadata"]["preview"]
+            assert info["mode"] == "sample" and info["headings"] == [], f"{name} has no usable outline"
+            assert info["pages"] == list(range(1, extract_pdfs.PREVIEW_HEAD_PAGES + 1)) + \
+                list(range(31 - extract_pdfs.PREVIEW_TAIL_PAGES, 31)), "Head and tail pages should be sampled"
+        assert pages_of(extract_pdf_content(str(tmp / "memo.pdf"), preview)) == list(range(1, 9)), \
+            "Short documents should be sampled once per page"
+        print("  ✓ Documents without a usable outline sample their head and tail")
+        
+        files = [tmp / name for name in ("report.pdf", "deck.pdf", "memo.pdf", "plain.pdf")]
+        cache = PageCache(str(tmp / "pages.sqlite3"))
+        serial = read_documents(iter_pdf_contents(files, cache=cache, preview=preview))
+        parallel = read_documents(iter_pdf_contents(files, jobs=2, pages_per_task=5, preview=preview))
+        assert parallel == serial, "Previews should be extracted as one part per document"
+        assert cache.load(file_digest(tmp / "report.pdf")) is None, "Previews should not be cached"
+        cache.close()
+        print("  ✓ Previews match across serial and parallel runs and skip the cache")
+    
+    print("✓ Preview Extraction tests passed\n")
+
+
+def test_pdf_discovery():
+    """Test single-walk discovery, content dedupe and unique output names."""
+    print("Testing PDF Discovery...")
+    
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for directory in ("a", "b", "drafts", "out"):
+            (tmp / directory).mkdir()
+        write_pdf(tmp / "a" / "report.pdf", sample_pages(2), title="Report A")
+        write_pdf(tmp / "b" / "report.pdf", sample_pages(2, seed=1), title="Report B")
+        (tmp / "a__report.pdf").write_bytes((tmp / "a" / "report.pdf").read_bytes())
+        (tmp / "drafts" / "draft.pdf").write_bytes((tmp / "b" / "report.pdf").read_bytes())
+        (tmp / "out" / "old.pdf").write_bytes(b"%PDF")
+        (tmp / "notes.txt").write_text("not a pdf")
+        
+        found = find_pdf_files(tmp, exclude=["drafts"], skip_dirs=[tmp / "out"])
+        assert found == [tmp / "a" / "report.pdf", tmp / "a__report.pdf", tmp / "b" / "report.pdf"], \
+            "Excluded and skipped directories should be pruned"
+        assert find_pdf_files(tmp, include=["b/*.pdf"]) == [tmp / "b" / "report.pdf"], \
+            "Include patterns should match relative paths"
+        print("  ✓ Include, exclude and skipped directories apply in one walk")
+        
+        (tmp / "b" / "link.pdf").symlink_to(tmp / "b" / "report.pdf")
+        unique, duplicates = dedupe_pdf_files(find_pdf_files(tmp, exclude=["out"]))
+        assert unique == [tmp / "a" / "report.pdf", tmp / "b" / "link.pdf"], \
+            "Only the first file of each content should be kept"
+        assert sorted(duplicates) == sorted([
+            (tmp / "a__report.pdf", tmp / "a" / "report.pdf"),
+            (tmp / "b" / "report.pdf", tmp / "b" / "link.pdf"),
+            (tmp / "drafts" / "draft.pdf", tmp / "b" / "link.pdf"),
+        ]), "Copies and links should be reported with their original"
+        print("  ✓ Links and byte-identical copies are deduplicated")
+        
+        stems = [output_stem(pdf_file, tmp) for pdf_file in found]
+        assert stems[0] == "a__report" and stems[2] == "b__report", \
+            "Nested files should be named after their relative path"
+        assert stems[1].startswith("a__report-") and len(set(stems)) == 3, \
+            "Names that look like a joined path should get a hash"
+        assert output_stem(tmp / "b" / "report.pdf", tmp) == "b__report", \
+            "Names should not depend on the other files"
+        assert output_stem(tmp / "report.pdf", tmp) == "report", "Top-level files should keep their stem"
+        assert output_stem(tmp / "a_" / "b.pdf", tmp) != output_stem(tmp / "a" / "_b.pdf", tmp), \
+            "Underscores next to separators should not collide"
+        print("  ✓ Output names never collide")
+    
+    print("✓ PDF Discovery tests passed\n")
+
+
+def test_entity_extraction():
+    """Test entity counts, first occurrences and stop words."""
+    print("Testing Entity Extraction...")
+    
+    import tempfile
+    
+    first = "This quarter Acme Cloud Platform moved to AWS. Acme Cloud Platform now ships AI tools."
+    second = "Contact Jane Smith about the API.\nJane Smith runs the Acme Cloud Platform team."
+    analyzer = CorpusAnalyzer()
+    analyzer.add_page(first, {"file": "report.pdf", "page": 1})
+    analyzer.add_page(second, {"file": "report.pdf", "page": 2})
+    result = analyzer.result()
+    
+    companies = result["entity_stats"]["companies"]
+    assert companies["Acme Cloud Platform"] == {
+        "count": 3, "first_seen": {"file": "report.pdf", "page": 1, "offset": first.index("Acme")}}, \
+        "Phrases should be counted with their first location"
+    assert companies["Jane Smith"]["first_seen"] == {
+        "file": "report.pdf", "page": 2, "offset": second.index("\nJane Smith") + 1}, \
+        "Offsets should be relative to the page of the first occurrence"
+    assert list(companies)[0] == "Acme Cloud Platform", "Stats should list the most frequent first"
+    assert result["entities"]["companies"] == ["Acme Cloud Platform", "Contact Jane Smith", "Jane Smith"], \
+        "Entity lists should keep first-seen order without default stop words"
+    print("  ✓ Entities are counted with their first page and offset")
+    
+    technologies = result["entity_stats"]["technologies"]
+    assert technologies["cloud"] == {
+        "count": 3, "first_seen": {"file": "report.pdf", "page": 1, "offset": first.index("Cloud")}}, \
+        "Technology terms inside capitalized phrases should be counted"
+    assert technologies["platform"]["first_seen"]["offset"] == first.index("Platform"), \
+        "Terms inside phrases should report their own offset"
+    assert technologies["AWS"]["first_seen"]["offset"] == first.index("AWS") and \
+        technologies["API"]["first_seen"]["page"] == 2, "Standalone terms should be matched too"
+    assert result["entities"]["technologies"] == ["cloud", "platform", "AWS", "AI", "API"], \
+        "Technologies should use their canonical spelling in first-seen order"
+    print("  ✓ Technologies are found inside and outside capitalized phrases")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "stop_words.txt"
+        path.write_text("# noisy phrases\nContact Jane Smith\n\n  platform  # generic\n", encoding="utf-8")
+        stop_words = load_stop_words(str(path))
+    assert stop_words == {"Contact Jane Smith", "platform"}, "Comments and blank lines should be ignored"
+    filtered = analyzer.result(ENTITY_STOP_WORDS | stop_words)
+    assert "Contact Jane Smith" not in filtered["entities"]["companies"] and \
+        "Contact Jane Smith" not in filtered["entity_stats"]["companies"], "Stop-listed phrases should be dropped"
+    assert "platform" not in filtered["entities"]["technologies"], "Stop words should apply to technologies"
+    assert filtered["entity_stats"]["companies"]["Jane Smith"]["count"] == 1, \
+        "Stop words should not change the other counts"
+    assert extract_entities(second, stop_words)["companies"] == ["Jane Smith", "Acme Cloud Platform"], \
+        "extract_entities() should apply the given stop words"
+    print("  ✓ Stop words filter entities without changing other counts")
+    
+    print("✓ Entity Extraction tests passed\n")
+
+
+def test_text_store():
+    """Test chunked full-text storage with page and section lookups."""
+    print("Testing Text Store...")
+    
+    import json
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pages = {1: "first page \u00e9t\u00e9", 2: "second page", 4: "fourth page " * 5}
+        with TextStoreWriter(str(tmp / "doc"), chunk_chars=16) as writer:
+            for page, text in pages.items():
+                start = writer.add_page(page, text)
+                writer.mark_section("intro" if page == 1 else "body", start)
+            writer.mark_section("body", start + 3)
+        
+        document = "\n".join(pages.values())
+        with TextStore(str(tmp / "doc")) as store:
+            assert len(store.chunks) > 1, "Text should span several chunks"
+            assert store.read() == document, "Reading everything should return the document text"
+            assert store.read(10, 40) == document[10:40], "Ranges should cross chunk boundaries"
+            assert store.page_text(4) == pages[4], "Single pages should be readable"
+            assert store.read_pages(2, 4) == pages[2] + "\n" + pages[4], "Page ranges should skip missing pages"
+            assert store.read_pages(3) == "", "Pages without text should read as empty"
+            print("  ✓ Pages and ranges read back across chunks")
+            
+            assert store.sections == [["intro", 0], ["body", len(pages[1]) + 1]], \
+                "Repeated section marks should collapse"
+            assert store.section_at(0) == "intro" and store.section_at(len(pages[1])) == "intro"
+            assert store.section_at(len(pages[1]) + 1) == "body" and store.section_at(len(document)) == "body"
+            print("  ✓ Offsets map to their section")
+        
+        metadata = {"title": "Report", "pages": 3}
+        extracted = [{"page": 1, "text": "About Us\nWe make widgets"},
+                     {"page": 3, "text": "Our Products\nWidget Pro"}]
+        stats = write_extracted_json(str(tmp / "report_extracted.json"), metadata, extracted,
+                                     text_store=str(tmp / "fulltext" / "report"))
+        data = json.loads((tmp / "report_extracted.json").read_text())
+        assert data["text_store"] == "fulltext/report", "JSON should point at its text store"
+        with TextStore(str(tmp / "fulltext" / "report")) as store:
+            assert store.pages == [1, 3], "Only pages with text should be stored"
+            assert store.read_pages(1, 3) == "\n".join(page["text"] for page in extracted)
+            assert [store.section_at(store.page_index[page][0]) for page in (1, 3)] == list(data["sections"]), \
+                "Stored sections should match the JSON"
+            assert store.total_chars == stats["total_chars"], "Store and stats should agree on length"
+        print("  ✓ Extraction output carries a labelled text store")
+    
+    print("✓ Text Store tests passed\n")
+
+
+def test_search_index():
+    """Test BM25 ranking, phrase queries and incremental index updates."""
+    print("Testing Search Index...")
+    
+    import tempfile
+    
+    def write_document(data_dir, stem, title, pages, signature=None, failed=()):
+        write_extracted_json(str(data_dir / f"{stem}_extracted.json"), {"title": title},
+                             [{"page": page, "text": text} for page, text in pages.items()],
+                             text_store=str(data_dir / FULL_TEXT_DIR / stem),
+                             signature=signature, failed=failed)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        write_document(data_dir, "cloud", "Cloud Report", {
+            1: "About Us\nWe sell cloud storage and cloud backup to cloud native teams",
+            2: "Market Opportunity\nThe market size is large"}, extraction_signature("c" * 64))
+        write_document(data_dir, "deck", "Sales Deck", {
+            1: "Our Products\nA desktop app with optional cloud sync for small offices and shops",
+            3: "Notes\nSize of the market is unknown"}, extraction_signature("d" * 64))
+        assert read_signature(data_dir / "deck_extracted.json") == extraction_signature("d" * 64), \
+            "The signature should be readable from the start of the JSON"
+        assert extraction_signature("d" * 64, preview={"pages_per_heading": 1}) != extraction_signature("d" * 64), \
+            "Extraction settings should change the signature"
+        index = SearchIndex(str(data_dir / "index.sqlite3"))
+        
+        counts = index.update(data_dir)
+        assert counts == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}, "Should index new documents"
+        results = index.search("cloud", k=5)
+        assert [(r["document"], r["page"]) for r in results] == [("cloud_extracted", 1), ("deck_extracted", 1)], \
+            "Passages with more occurrences should rank first"
+        assert results[0]["source"] == "Cloud Report" and results[0]["section"] == "company_overview", \
+            "Results should carry their source and section"
+        assert "cloud storage" in results[0]["text"], "Results should include the passage text"
+        assert len(index.search("cloud", k=1)) == 1, "Results should be limited to k"
+        print("  ✓ BM25 ranks passages by term weight")
+        
+        phrase = index.search('"market size"')
+        assert [(r["document"], r["page"]) for r in phrase] == [("cloud_extracted", 2)], \
+            "Phrases should require consecutive terms"
+        assert {r["document"] for r in index.search("market size")} == {"cloud_extracted", "deck_extracted"}, \
+            "Bare terms should match in any order"
+        assert index.search('"size market"') == [] and index.search("zebra") == [], "Misses should return nothing"
+        print("  ✓ Phrase queries match consecutive terms only")
+        
+        assert index.update(data_dir)["unchanged"] == 2, "Unchanged documents should be skipped"
+        write_document(data_dir, "deck", "Sales Deck", {1: "Our Products\nA zebra themed desktop app"},
+                       extraction_signature("e" * 64))
+        write_document(data_dir, "memo", "Memo", {1: "Customers\nCloud customers renew yearly"},
+                       extraction_signature("f" * 64), failed=[(2, "bad page")])
+        assert read_signature(data_dir / "memo_extracted.json") is None, \
+            "Documents with failed pages should not be signed"
+        (data_dir / "cloud_extracted.json").unlink()
+        counts = index.update(data_dir)
+        assert counts == {"added": 1, "updated": 1, "removed": 1, "unchanged": 0}, \
+            "Changed, new and removed documents should be detected"
+        assert index.update(data_dir) == {"added": 0, "updated": 1, "removed": 0, "unchanged": 1}, \
+            "Unsigned documents should be re-indexed on every update"
+        assert [r["document"] for r in index.search("zebra")] == ["deck_extracted"], "Updates should be searchable"
+        assert [r["document"] for r in index.search("cloud")] == ["memo_extracted"], \
+            "Removed and replaced passages should be gone"
+        print("  ✓ Incremental updates add, update and remove documents")
+        index.close()
+    
+    print("✓ Search Index tests passed\n")
+
+
+def run_all_tests():
+    """Run all tests."""
+    print("=" * 60)
+    print("Running Company Product Context Tests")
+    print("=" * 60)
+    print()
+    
+    try:
+        test_parallel_extraction()
+        test_streaming_extraction()
+        test_corpus_analyzer()
+        test_section_keywords()
+        test_page_cache()
+        test_preview_extraction()
+        test_pdf_discovery()
+        test_entity_extraction()
+        test_text_store()
+        test_search_index()
+        
+        print("=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+        return 0
+    
+    except AssertionError as e:
+        print(f"\n✗ TEST FAILED: {e}")
+        return 1
+    except Exception as e:
+        print(f"\n✗ ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_all_tests())
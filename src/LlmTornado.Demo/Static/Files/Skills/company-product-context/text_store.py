@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Full-Text Store for Company Product Context
+Keeps the complete extracted text of each document in compressed chunks with
+a page and character offset index, so consumers can read any page range
+without re-running PDF extraction.
+"""
+
+import bisect
+import json
+import os
+import zlib
+
+# Characters of text per compressed chunk
+CHUNK_CHARS = 64 * 1024
+
+# Subdirectory of the extraction output directory holding the text stores
+FULL_TEXT_DIR = 'fulltext'
+
+DATA_SUFFIX = '.chunks'
+INDEX_SUFFIX = '.index.json'
+
+class TextStoreWriter:
+    """Write a document's pages to a chunked, zlib-compressed text store.
+    
+    Pages are joined with '\\n', so character offsets match the text of the
+    document as a single string. Chunks hold a fixed number of characters,
+    which makes mapping an offset to its chunk a division. The index is
+    written last, so a store without an index is incomplete.
+    
+    Section labels can be attached with mark_section(); each label applies
+    from its offset up to the next one.
+    """
+    
+    def __init__(self, path, chunk_chars=CHUNK_CHARS):
+        self.path = path
+        self.chunk_chars = chunk_chars
+        self.chunks = []
+        self.pages = []
+        self.sections = []
+        self.total_chars = 0
+        self.buffer = ''
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.data_file = open(path + DATA_SUFFIX, 'wb')
+        self.offset = 0
+    
+    def add_page(self, page, text):
+        """Append the text of one page, in page order, and return its starting offset."""
+        if self.pages:
+            self.write('\n')
+        start = self.total_chars
+        self.pages.append([page, start, len(text)])
+        self.write(text)
+        return start
+    
+    def mark_section(self, section, offset):
+        """Label the text from offset onwards with a section name."""
+        if not self.sections or self.sections[-1][0] != section:
+            self.sections.append([section, offset])
+    
+    def write(self, text):
+        self.buffer += text
+        self.total_chars += len(text)
+        while len(self.buffer) >= self.chunk_chars:
+            self.flush_chunk(self.buffer[:self.chunk_chars])
+            self.buffer = self.buffer[self.chunk_chars:]
+    
+    def flush_chunk(self, text):
+        data = zlib.compress(text.encode('utf-8'))
+        self.data_file.write(data)
+        self.chunks.append([self.offset, len(data)])
+        self.offset += len(data)
+    
+    def close(self):
+        """Flush the last chunk and write the index. Returns the index."""
+        if self.buffer:
+            self.flush_chunk(self.buffer)
+            self.buffer = ''
+        self.data_file.close()
+        
+        index = {
+            'version': 1,
+            'chunk_chars': self.chunk_chars,
+            'total_chars': self.total_chars,
+            'chunks': self.chunks,
+            'pages': self.pages,
+            'sections': self.sections
+        }
+        tmp_path = self.path + INDEX_SUFFIX + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.path + INDEX_SUFFIX)
+        return index
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+class TextStore:
+    """Random-access reader for a store written by TextStoreWriter.
+    
+    Only the chunks overlapping a requested range are read and decompressed;
+    the most recently used chunk is kept for sequential page reads.
+    """
+    
+    def __init__(self, path):
+        with open(path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        
+        self.path = path
+        self.chunk_chars = index['chunk_chars']
+        self.total_chars = index['total_chars']
+        self.chunks = index['chunks']
+        self.page_index = {page: (start, length) for page, start, length in index['pages']}
+        self.pages = [page for page, _, _ in index['pages']]
+        self.sections = index.get('sections', [])
+        self.section_starts = [start for _, start in self.sections]
+        self.data_file = open(path + DATA_SUFFIX, 'rb')
+        self.cached_chunk = (None, '')
+    
+    def chunk(self, number):
+        if self.cached_chunk[0] != number:
+            offset, length = self.chunks[number]
+            self.data_file.seek(offset)
+            text = zlib.decompress(self.data_file.read(length)).decode('utf-8')
+            self.cached_chunk = (number, text)
+        return self.cached_chunk[1]
+    
+    def read(self, start=0, end=None):
+        """Return the characters [start, end) of the document text."""
+        end = self.total_chars if end is None else min(end, self.total_chars)
+        start = max(start, 0)
+        if start >= end:
+            return ''
+        
+        parts = []
+        for number in range(start // self.chunk_chars, (end - 1) // self.chunk_chars + 1):
+            chunk_start = number * self.chunk_chars
+            parts.append(self.chunk(number)[max(start - chunk_start, 0):end - chunk_start])
+        return ''.join(parts)
+    
+    def page_text(self, page):
+        """Return the text of one page; KeyError if it has no stored text."""
+        start, length = self.page_index[page]
+        return self.read(start, start + length)
+    
+    def read_pages(self, first, last=None):
+        """Return the text of the stored pages numbered first..last, joined by '\\n'."""
+        last = first if last is None else last
+        lo = bisect.bisect_left(self.pages, first)
+        hi = bisect.bisect_right(self.pages, last)
+        if lo >= hi:
+            return ''
+        start = self.page_index[self.pages[lo]][0]
+        end_start, end_length = self.page_index[self.pages[hi - 1]]
+        return self.read(start, end_start + end_length)
+    
+    def section_at(self, offset):
+        """Return the section label covering an offset, or None."""
+        idx = bisect.bisect_right(self.section_starts, offset) - 1
+        return self.sections[idx][0] if idx >= 0 else None
+    
+    def close(self):
+        self.data_file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()